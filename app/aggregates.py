@@ -0,0 +1,208 @@
+import bisect
+import calendar
+import time
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # numpy не обязателен и не входит в requirements.txt: без него reset() считает обычным циклом
+    np = None
+
+NO_TS = -1  # received_at отсутствует или не распознан
+DAY_SEC = 86400
+
+
+def parse_received_at(value):
+    """
+    'YYYY-MM-DD HH:MM:SS' -> (секунды, True). Время считается "как есть", без часового пояса.
+    Другие ISO-форматы -> (секунды, False); время со смещением приводится к UTC. Нераспознанные -> (NO_TS, False).
+    """
+    if not value:
+        return NO_TS, False
+    try:
+        if len(value) == 19 and value[4] == '-' and value[10] == ' ':
+            return calendar.timegm((int(value[:4]), int(value[5:7]), int(value[8:10]),
+                                    int(value[11:13]), int(value[14:16]), int(value[17:19]), 0, 0, 0)), True
+        return calendar.timegm(datetime.fromisoformat(value).utctimetuple()), False
+    except (TypeError, ValueError):
+        return NO_TS, False
+
+
+def format_ts(ts, fmt='%Y-%m-%d %H:%M:%S'):
+    return time.strftime(fmt, time.gmtime(ts))
+
+
+def bucket_labels(received_at):
+    """
+    received_at -> (минута 'YYYY-MM-DD HH:MM', день 'YYYY-MM-DD') — ключи per_minute/per_day; (None, None) без времени.
+    """
+    ts, _ = parse_received_at(received_at if isinstance(received_at, str) else None)
+    if ts == NO_TS:
+        return None, None
+    return format_ts(ts, '%Y-%m-%d %H:%M'), format_ts(ts, '%Y-%m-%d')
+
+
+def prefix_range(prefix):
+    """
+    Префикс received_at ('YYYY', 'YYYY-MM', 'YYYY-MM-DD', ... до секунд) -> полуинтервал [lo, hi) в секундах.
+    None, если префикс не разбирается.
+    """
+    try:
+        n = len(prefix)
+        year = int(prefix[:4])
+        if n == 4:
+            return calendar.timegm((year, 1, 1, 0, 0, 0)), calendar.timegm((year + 1, 1, 1, 0, 0, 0))
+        month = int(prefix[5:7])
+        if n == 7 and prefix[4] == '-':
+            if month == 12:
+                return calendar.timegm((year, 12, 1, 0, 0, 0)), calendar.timegm((year + 1, 1, 1, 0, 0, 0))
+            return calendar.timegm((year, month, 1, 0, 0, 0)), calendar.timegm((year, month + 1, 1, 0, 0, 0))
+        steps = {10: DAY_SEC, 13: 3600, 16: 60, 19: 1}
+        if n not in steps:
+            return None
+        lo, canonical = parse_received_at(prefix + '2000-01-01 00:00:00'[n:])
+        if not canonical:
+            return None
+        return lo, lo + steps[n]
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class TimeBucketAggregates:
+    """
+    Агрегаты по логам, обновляемые при добавлении и удалении записи:
+    количество, суммарная длительность и размер по минутам, по дням и в целом.
+    Ключи бакетов — целые номера минут/дней от эпохи, строки формируются только в ответе.
+    Не потокобезопасен — вызывается под общим lock из api.py.
+    """
+    def __init__(self):
+        self.minutes = {}  # номер минуты -> [count, duration, size]
+        self.days = {}  # номер дня -> [count, duration, size]
+        self._minute_keys = []  # отсортированные ключи self.minutes для выборки по диапазону
+        self.total_count = 0
+        self.total_duration = 0.0
+        self.total_size = 0
+
+    def reset(self, ts, duration, size, alive):
+        """
+        Пересчитывает агрегаты по колонкам LogStore целиком (при загрузке индекса).
+        Основной путь — цикл по записям; если numpy установлен отдельно, тот же пересчёт
+        выполняется векторно (_reset_numpy) с тем же результатом.
+        """
+        self.__init__()
+        if np is not None and len(ts):
+            self._reset_numpy(ts, duration, size, alive)
+            return
+        for i in range(len(ts)):
+            if alive[i]:
+                self.add(ts[i], duration[i], size[i])
+
+    def _reset_numpy(self, ts, duration, size, alive):
+        mask = np.frombuffer(bytes(alive), dtype=np.uint8).astype(bool)
+        ts_col = np.frombuffer(ts, dtype=np.int64)[mask]
+        dur_col = np.frombuffer(duration, dtype=np.float64)[mask]
+        size_col = np.frombuffer(size, dtype=np.int64)[mask]
+        self.total_count = int(mask.sum())
+        self.total_duration = float(dur_col.sum())
+        self.total_size = int(size_col.sum())
+        has_ts = ts_col != NO_TS
+        for target, step in ((self.minutes, 60), (self.days, DAY_SEC)):
+            keys, inverse = np.unique(ts_col[has_ts] // step, return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(keys))
+            durations = np.bincount(inverse, weights=dur_col[has_ts], minlength=len(keys))
+            sizes = np.bincount(inverse, weights=size_col[has_ts], minlength=len(keys))
+            for k, c, d, s in zip(keys.tolist(), counts.tolist(), durations.tolist(), sizes.tolist()):
+                target[k] = [c, d, int(s)]
+        self._minute_keys = sorted(self.minutes)
+
+    def export(self):
+        return {
+            'minutes': [[k] + v for k, v in self.minutes.items()],
+            'days': [[k] + v for k, v in self.days.items()],
+            'totals': [self.total_count, self.total_duration, self.total_size],
+        }
+
+    def load(self, state):
+        """
+        Восстанавливает агрегаты из export() без пересчёта по записям.
+        """
+        self.__init__()
+        self.minutes = {k: [c, d, s] for k, c, d, s in state['minutes']}
+        self.days = {k: [c, d, s] for k, c, d, s in state['days']}
+        self._minute_keys = sorted(self.minutes)
+        self.total_count, self.total_duration, self.total_size = state['totals']
+
+    def add(self, ts, duration, size):
+        self.total_count += 1
+        self.total_duration += duration
+        self.total_size += size
+        if ts == NO_TS:
+            return
+        minute = ts // 60
+        bucket = self.minutes.get(minute)
+        if bucket is None:
+            bucket = self.minutes[minute] = [0, 0.0, 0]
+            bisect.insort(self._minute_keys, minute)
+        bucket[0] += 1
+        bucket[1] += duration
+        bucket[2] += size
+        day = self.days.setdefault(ts // DAY_SEC, [0, 0.0, 0])
+        day[0] += 1
+        day[1] += duration
+        day[2] += size
+
+    def remove(self, ts, duration, size):
+        self.total_count -= 1
+        self.total_duration -= duration
+        self.total_size -= size
+        if ts == NO_TS:
+            return
+        minute = ts // 60
+        bucket = self.minutes.get(minute)
+        if bucket is not None:
+            bucket[0] -= 1
+            bucket[1] -= duration
+            bucket[2] -= size
+            if bucket[0] <= 0:
+                del self.minutes[minute]
+                i = bisect.bisect_left(self._minute_keys, minute)
+                if i < len(self._minute_keys) and self._minute_keys[i] == minute:
+                    del self._minute_keys[i]
+        day_key = ts // DAY_SEC
+        day = self.days.get(day_key)
+        if day is not None:
+            day[0] -= 1
+            day[1] -= duration
+            day[2] -= size
+            if day[0] <= 0:
+                del self.days[day_key]
+
+    def per_minute(self, start=None, end=None):
+        """
+        Количество логов по минутам; start/end — префиксы 'YYYY-MM-DD HH:MM' или 'YYYY-MM-DD' (включительно).
+        Нераспознанный start или end — ValueError, а не диапазон без границы.
+        """
+        start_range = prefix_range(start) if start else None
+        end_range = prefix_range(end) if end else None
+        if (start and start_range is None) or (end and end_range is None):
+            raise ValueError(f'некорректная граница диапазона: start={start!r}, end={end!r}')
+        lo = bisect.bisect_left(self._minute_keys, start_range[0] // 60) if start_range else 0
+        hi = bisect.bisect_left(self._minute_keys, end_range[1] // 60) if end_range else len(self._minute_keys)
+        result = {}
+        last_day, day_str = None, ''
+        for k in self._minute_keys[lo:hi]:
+            day, minute = divmod(k, 1440)
+            if day != last_day:
+                last_day, day_str = day, format_ts(day * DAY_SEC, '%Y-%m-%d')
+            result[f'{day_str} {minute // 60:02d}:{minute % 60:02d}'] = self.minutes[k][0]
+        return result
+
+    def per_day(self):
+        return {format_ts(k * DAY_SEC, '%Y-%m-%d'): v[0] for k, v in sorted(self.days.items())}
+
+    def totals(self):
+        return {
+            'total_files': self.total_count,
+            'total_duration': self.total_duration,
+            'total_size': self.total_size,
+        }
@@ -1,30 +1,105 @@
 from fastapi import FastAPI, Request, Body, Query
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
 from datetime import datetime
-from .gdrive_logger import GDriveLogger
+from .storage_backend import get_storage, storage_available, storage_stats
 from .constants import *
+from .ingest_queue import IngestQueue
+from .ingest_wal import IngestWAL
+from .log_bundle import BundleWriter
+from .index_writer import IndexWriter
+from .log_store import LogStore, compact_columns
+from .store_snapshot import SnapshotWriter, read_snapshot, write_snapshot
+from .text_cache import TextCache, text_key
+from .search_index import SearchIndex
+from .event_broadcaster import EventBroadcaster
+from .aggregates import bucket_labels, prefix_range
+from .export import EXPORT_FIELDS, EXPORT_FORMATS, format_available, encode_export, gzip_chunks
+from . import metrics
+from .async_io import run_storage, http_client, close_http_client, run_command
+from .static_assets import StaticAssets
+from .replica import WriterElection, WriterSocketServer, ReplicaFollower, WriterProxyMiddleware
+from starlette.routing import Route
 import threading
-import os
+import time
 import importlib.util
 import sys
-import subprocess
-import requests
 import base64
+import httpx
+import json
+import uuid
 
 app = FastAPI()
-app.mount('/static', StaticFiles(directory='app/static'), name='static')
+# Писатель выбирается при старте (см. конец модуля). В процессе-читателе запросы на изменение
+# store, журнала и очереди приёма пересылаются писателю
+election = WriterElection()
+WRITER_ROUTES = {
+    ('POST', '/log'), ('POST', '/logs/batch'), ('DELETE', '/log'), ('GET', '/ingest_status'), ('GET', '/runpod_status'),
+    ('GET', '/search'),
+}
+if MULTIPROCESS_MODE:
+    app.add_middleware(WriterProxyMiddleware, election=election, routes=WRITER_ROUTES)
+app.add_middleware(metrics.RequestMetricsMiddleware)
 
-# Проверка наличия credentials.json
-CREDENTIALS_EXISTS = os.path.exists(GOOGLE_CREDENTIALS_FILE)
-ERROR_MESSAGE = None if CREDENTIALS_EXISTS else 'Файл credentials.json не найден. Работа невозможна.'
+# Хранилище логов выбирается STORAGE_BACKEND; для Google Drive нужен credentials.json
+STORAGE_AVAILABLE = storage_available()
+ERROR_MESSAGE = None if STORAGE_AVAILABLE else 'Файл credentials.json не найден. Работа невозможна.'
 
-logger = None  # Не инициализируем сразу
+# Страницы и файлы app/static в памяти, с ETag и заранее сжатыми вариантами
+static_assets = StaticAssets()
 
-log_stats = []
-log_files = []  # Для хранения информации о логах
-lock = threading.Lock()
+def with_error_banner(html):
+    if STORAGE_AVAILABLE:
+        return html
+    return html.replace('</body>', f'<div style="color:red;font-weight:bold;">{ERROR_MESSAGE}</div></body>')
+
+static_assets.add_page('/', 'index.html', with_error_banner)
+static_assets.add_page('/settings', 'settings.html')
+
+@app.get('/static/{path:path}')
+async def static_file(request: Request, path: str):
+    return static_assets.file_response(request, path)
+
+store = LogStore()  # Метаданные логов в памяти с индексами и счётчиками для /stats, /histogram, /summary
+lock = metrics.TimedLock('store')  # время ожидания — в /metrics
+# События об изменениях store для /events; публикуются под lock, в том же порядке, что и изменения
+events = EventBroadcaster()
+
+def aggregate_delta(entry, sign):
+    """
+    Изменение счётчиков /stats, /histogram и /summary от добавления (sign=1) или удаления (sign=-1) записи.
+    """
+    minute, day = bucket_labels(entry.get('received_at'))
+    return {
+        'minute': minute,
+        'day': day,
+        'count': sign,
+        'duration': sign * entry.get('duration', 0.0),
+        'size': sign * entry.get('size', 0),
+    }
+
+def snapshot_headers():
+    # Токен последнего события, уже учтённого в ответе; вызывать под lock
+    return {'X-Event-Id': events.last_token()}
+
+def load_text_from_drive(entry):
+    if not election.is_writer:
+        # Читатель не обращается к хранилищу сам: текст отдаёт писатель
+        return replica_follower.fetch_text(entry)
+    if not entry.get('file_id'):
+        return None
+    text = get_storage().load_log_text(entry['file_id'])
+    # Текст, которого не было локально, заодно попадает в поисковый индекс
+    search_index.add(text_key(entry), text)
+    return text
+
+# Тексты логов хранятся отдельно от метаданных: LRU в памяти, локальный диск, Google Drive
+text_cache = TextCache(load_text_from_drive)
+# Полнотекстовый поиск по текстам логов для /search
+search_index = SearchIndex()
+# Принятые логи до попадания в индекс на Google Drive; журнал открывает только писатель (start_writer)
+wal = None
 
 class LogData(BaseModel):
     filename: str
@@ -35,16 +110,10 @@ class LogData(BaseModel):
     process_time: float
     text: str
 
-@app.post('/log')
-async def log_file(data: LogData):
-    global logger
-    if not CREDENTIALS_EXISTS:
-        return JSONResponse(content={"error": ERROR_MESSAGE}, status_code=500)
-    if logger is None:
-        try:
-            logger = GDriveLogger()
-        except Exception as e:
-            return JSONResponse(content={"error": f"Ошибка инициализации GDriveLogger: {e}"}, status_code=500)
+def new_log_entry(data: LogData):
+    """
+    LogData -> (запись для store без текста, текст). Присваивает local_id, выгрузка на Google Drive идёт в фоне.
+    """
     log_entry = data.dict()
     # Приведение типов для числовых полей (на всякий случай)
     for key in ["duration", "queue_time", "process_time"]:
@@ -56,140 +125,785 @@ async def log_file(data: LogData):
         log_entry["size"] = int(log_entry["size"])
     except Exception:
         log_entry["size"] = 0
-    # Сохраняем лог в Google Drive и получаем file_id
-    file_id = None
-    def log_and_get_id():
-        nonlocal file_id
-        file_id = logger.log_and_return_id(log_entry)
-    t = threading.Thread(target=log_and_get_id)
-    t.start()
-    t.join()
-    log_entry['file_id'] = file_id
-    # Добавляем в индекс
-    logger.add_log_to_index(log_entry)
+    log_entry['local_id'] = uuid.uuid4().hex
+    log_entry['file_id'] = None
+    # В store остаются только метаданные, текст уходит в text_cache и в очередь на выгрузку
+    text = log_entry.pop('text')
+    return log_entry, text
+
+async def accept_log_entries(items):
+    """
+    Принимает пачку [(запись, текст)]: журнал на диске (один fsync на пачку в пуле потоков,
+    параллельные запросы тоже делят fsync), затем очередь выгрузки и store.
+    Возвращает список флагов: False — очередь переполнена, запись не принята.
+    Ошибка записи журнала (OSError) пробрасывается.
+    """
+    keys = [e['local_id'] for e, _ in items]
+    # Пока запись уже в журнале, но ещё не в очереди, повторная выгрузка из журнала (replay_wal) её не берёт
+    ingest_queue.reserve(keys)
+    try:
+        await run_in_threadpool(wal.append_many, [(e['local_id'], e, text) for e, text in items])
+        for log_entry, text in items:
+            text_cache.put(log_entry['local_id'], text)
+        accepted = []
+        with lock:
+            # Воркер проставит file_id через store под этим же lock, поэтому запись
+            # попадает в store до того, как он успеет её обработать
+            for log_entry, text in items:
+                ok = ingest_queue.submit(log_entry['local_id'], (log_entry, text))
+                if ok:
+                    store.add(log_entry)
+                    events.publish('log_added', {'entry': log_entry, 'delta': aggregate_delta(log_entry, 1)})
+                accepted.append(ok)
+        await run_in_threadpool(lambda: [search_index.add(e['local_id'], text)
+                                         for (e, text), ok in zip(items, accepted) if ok])
+        rejected = [e['local_id'] for (e, _), ok in zip(items, accepted) if not ok]
+        if rejected:
+            await run_in_threadpool(wal.drop_many, rejected)
+    finally:
+        ingest_queue.release(keys)
+    return accepted
+
+def queue_full_response():
+    return JSONResponse(
+        content={"error": "Очередь приёма переполнена, повторите запрос позже"},
+        status_code=503,
+        headers={"Retry-After": str(INGEST_RETRY_AFTER_SEC)}
+    )
+
+@app.post('/log')
+async def log_file(data: LogData):
+    if not STORAGE_AVAILABLE:
+        return JSONResponse(content={"error": ERROR_MESSAGE}, status_code=500)
+    try:
+        await run_storage(get_storage)
+    except Exception as e:
+        return JSONResponse(content={"error": f"Ошибка инициализации хранилища: {e}"}, status_code=500)
+    log_entry, text = new_log_entry(data)
+    # Ответ отправляется только после записи в журнал на диске
+    try:
+        accepted, = await accept_log_entries([(log_entry, text)])
+    except OSError as e:
+        return JSONResponse(content={"error": f"Не удалось записать лог в журнал: {e}"}, status_code=500)
+    if not accepted:
+        return queue_full_response()
+    return JSONResponse(content={'status': 'accepted', 'local_id': log_entry['local_id']}, status_code=202)
+
+def validate_log_item(item):
+    """
+    Элемент пачки -> (запись, текст) или строка с ошибкой валидации.
+    """
+    if not isinstance(item, dict):
+        return 'ожидался JSON-объект'
+    try:
+        return new_log_entry(LogData(**item))
+    except ValidationError as e:
+        return '; '.join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+async def iter_ndjson(request):
+    """
+    Построчно разбирает тело application/x-ndjson по мере получения; пустые строки пропускаются.
+    """
+    buffer = b''
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+@app.post('/logs/batch')
+async def log_batch(request: Request):
+    """
+    Пачка логов: JSON-массив (application/json) или поток NDJSON (application/x-ndjson), по объекту LogData на строку.
+    Каждый элемент проверяется отдельно; в results для каждого элемента (по порядку, index с 0) —
+    accepted с local_id, invalid с ошибкой валидации или rejected, если очередь переполнена
+    (такие элементы можно отправить повторно). NDJSON принимается кусками по LOGS_BATCH_CHUNK записей.
+    """
+    if not STORAGE_AVAILABLE:
+        return JSONResponse(content={"error": ERROR_MESSAGE}, status_code=500)
+    try:
+        await run_storage(get_storage)
+    except Exception as e:
+        return JSONResponse(content={"error": f"Ошибка инициализации хранилища: {e}"}, status_code=500)
+    results = []
+    chunk = []  # [(index, запись, текст)]
+
+    async def flush_chunk():
+        accepted = await accept_log_entries([(e, text) for _, e, text in chunk])
+        for (index, e, _), ok in zip(chunk, accepted):
+            if ok:
+                results.append({'index': index, 'status': 'accepted', 'local_id': e['local_id']})
+            else:
+                results.append({'index': index, 'status': 'rejected', 'error': 'очередь приёма переполнена'})
+        chunk.clear()
+
+    def add_item(index, item):
+        validated = validate_log_item(item)
+        if isinstance(validated, str):
+            results.append({'index': index, 'status': 'invalid', 'error': validated})
+        else:
+            chunk.append((index,) + validated)
+
+    try:
+        if request.headers.get('content-type', '').startswith(('application/x-ndjson', 'application/jsonl')):
+            index = 0
+            async for line in iter_ndjson(request):
+                try:
+                    item = json.loads(line)
+                except ValueError as e:
+                    results.append({'index': index, 'status': 'invalid', 'error': f'некорректный JSON: {e}'})
+                else:
+                    add_item(index, item)
+                index += 1
+                if len(chunk) >= LOGS_BATCH_CHUNK:
+                    await flush_chunk()
+        else:
+            try:
+                items = json.loads(await request.body())
+            except ValueError as e:
+                return JSONResponse(content={"error": f"Некорректный JSON: {e}"}, status_code=400)
+            if not isinstance(items, list):
+                return JSONResponse(content={"error": "Ожидался JSON-массив"}, status_code=400)
+            if len(items) > LOGS_BATCH_MAX_ITEMS:
+                return JSONResponse(
+                    content={"error": f"Не больше {LOGS_BATCH_MAX_ITEMS} логов за запрос, используйте NDJSON"},
+                    status_code=413
+                )
+            for index, item in enumerate(items):
+                add_item(index, item)
+                if len(chunk) >= LOGS_BATCH_CHUNK:
+                    await flush_chunk()
+        if chunk:
+            await flush_chunk()
+    except OSError as e:
+        # Записи, принятые до ошибки, уже в results; остальные клиент отправит повторно
+        results.sort(key=lambda r: r['index'])
+        return JSONResponse(content={"error": f"Не удалось записать лог в журнал: {e}", "results": results},
+                            status_code=500)
+    results.sort(key=lambda r: r['index'])
+    counts = {status: sum(1 for r in results if r['status'] == status) for status in ('accepted', 'invalid', 'rejected')}
+    if counts['rejected'] and not counts['accepted']:
+        return JSONResponse(content=dict(counts, results=results), status_code=503,
+                            headers={"Retry-After": str(INGEST_RETRY_AFTER_SEC)})
+    return JSONResponse(content=dict(counts, results=results), status_code=202 if counts['accepted'] else 400)
+
+def ship_log_entry(item):
+    """
+    Фоновая выгрузка лога: файл на Google Drive (с текстом) и запись в индекс (без текста).
+    При STORAGE_LAYOUT = 'bundles' лог уходит в буфер пачки, которая выгружается целиком.
+    Если выгрузить не удалось (или буфер пачек заполнен), лог остаётся в журнале и будет выгружен повторно.
+    """
+    log_entry, text = item
+    if STORAGE_LAYOUT == 'bundles':
+        return bundle_writer.add(log_entry, text)
+    file_id = get_storage().log_and_return_id(dict(log_entry, text=text))
+    if file_id is None:
+        return False
+    log_shipped(log_entry, file_id, wal.mark_shipped(log_entry['local_id'], file_id))
+    return True
+
+def bundle_shipped(records):
+    marked = wal.mark_shipped_many([(log_entry['local_id'], file_id) for log_entry, file_id in records])
+    for (log_entry, file_id), in_wal in zip(records, marked):
+        log_shipped(log_entry, file_id, in_wal)
+
+def log_shipped(log_entry, file_id, in_wal):
+    """
+    Лог выгружен на Google Drive и отмечен в журнале (in_wal=False — его уже удалили из журнала):
+    file_id в store и запись в индекс.
+    """
+    local_id = log_entry['local_id']
+    if not in_wal:
+        # Лог удалили, пока он выгружался
+        get_storage().delete_log_file(file_id)
+        return
     with lock:
-        log_stats.append({
-            'received_at': log_entry['received_at'],
-            'filename': log_entry['filename'],
-            'file_id': file_id
-        })
-        log_files.append(log_entry)
-    return {'status': 'ok'}
+        stored = store.set_file_id(local_id, file_id)
+        if stored is not None:
+            events.publish('log_updated', {'local_id': local_id, 'file_id': file_id})
+    if stored is None:
+        # Лог удалён после выгрузки; файл на Google Drive удалил DELETE /log
+        wal.mark_done([local_id])
+        return
+    # Добавляем в индекс (пачкой, вместе с другими изменениями); из журнала лог уйдёт после записи индекса
+    index_writer.add(stored)
+
+def index_flushed(ops):
+    wal.mark_done([op['entry']['local_id'] for op in ops if op['op'] == 'add' and op['entry'].get('local_id')])
+
+index_writer = IndexWriter(get_storage, on_flush=index_flushed)
+bundle_writer = BundleWriter(get_storage, bundle_shipped)
+ingest_queue = IngestQueue(
+    ship_log_entry,
+    on_change=lambda stats: events.publish('queue', {'depth': stats['depth'], 'lag': stats['lag']})
+)
+# Очередь писателя по его событиям queue — для /summary в процессе-читателе
+writer_queue = {'depth': 0, 'lag': 0.0}
+
+@app.on_event('shutdown')
+async def close_outbound_http():
+    await close_http_client()
+
+@app.on_event('shutdown')
+def flush_pending_index_updates():
+    if not election.is_writer:
+        return
+    ingest_queue.join()
+    bundle_writer.flush()
+    index_writer.flush()
+    if STORAGE_AVAILABLE:
+        snapshot_writer.save()
 
 @app.get('/stats')
-async def get_stats():
-    if not CREDENTIALS_EXISTS:
+async def get_stats(start: str = None, end: str = None):
+    if not STORAGE_AVAILABLE:
         return JSONResponse(content={"error": ERROR_MESSAGE}, status_code=500)
-    stats = {}
-    with lock:
-        for entry in log_stats:
-            t = entry['received_at'][:16]
-            stats[t] = stats.get(t, 0) + 1
-    return JSONResponse(content=stats)
+    # start/end: 'YYYY-MM-DD HH:MM' или 'YYYY-MM-DD', включительно
+    try:
+        with lock:
+            stats = store.aggregates.per_minute(start, end)
+            headers = snapshot_headers()
+    except ValueError:
+        return JSONResponse(content={"error": "Некорректный start или end"}, status_code=400)
+    return JSONResponse(content=stats, headers=headers)
 
 @app.get('/histogram')
 async def get_histogram():
-    if not CREDENTIALS_EXISTS:
+    if not STORAGE_AVAILABLE:
         return JSONResponse(content={"error": ERROR_MESSAGE}, status_code=500)
-    histogram = {}
     with lock:
-        for entry in log_stats:
-            day = entry['received_at'][:10]
-            histogram[day] = histogram.get(day, 0) + 1
-    return JSONResponse(content=histogram)
+        histogram = store.aggregates.per_day()
+        headers = snapshot_headers()
+    return JSONResponse(content=histogram, headers=headers)
 
 @app.get('/logs')
-async def get_logs(filename: str = None, date: str = None):
-    if not CREDENTIALS_EXISTS:
+async def get_logs(filename: str = None, date: str = None, cursor: str = None,
+                   offset: int = Query(0, ge=0), limit: int = Query(None, ge=1, le=LOGS_PAGE_MAX_LIMIT),
+                   order: str = Query('asc', pattern='^(asc|desc)$'),
+                   sort: str = Query('received_at', pattern='^(received_at|filename|duration|size)$'),
+                   include_text: bool = False):
+    """
+    Без limit/cursor возвращает список всех подходящих логов (как раньше).
+    С limit — страницу {"items", "next_cursor", "total"} в порядке received_at.
+    sort=filename|duration|size — порядок по этой колонке среди всех совпадений (только offset, без cursor).
+    include_text=true добавляет поле text из локального кэша (без обращения к Google Drive).
+    """
+    if not STORAGE_AVAILABLE:
         return JSONResponse(content={"error": ERROR_MESSAGE}, status_code=500)
-    with lock:
-        filtered = log_files
-        if filename:
-            filtered = [l for l in filtered if filename in l['filename']]
-        if date:
-            filtered = [l for l in filtered if l['received_at'].startswith(date)]
+    if sort != 'received_at' and cursor is not None:
+        return JSONResponse(content={"error": "cursor поддерживается только для sort=received_at"}, status_code=400)
+    paginated = limit is not None or cursor is not None
+    if paginated and limit is None:
+        limit = LOGS_PAGE_DEFAULT_LIMIT
+    try:
+        with lock:
+            if sort == 'received_at':
+                items, next_cursor, total = store.query(
+                    filename=filename, date=date, cursor=cursor, offset=offset,
+                    limit=limit, descending=(order == 'desc')
+                )
+            else:
+                items, total = store.sorted_page(sort, filename=filename, date=date, offset=offset,
+                                                 limit=limit, descending=(order == 'desc'))
+                next_cursor = None
+            headers = snapshot_headers()
+    except (ValueError, TypeError):
+        return JSONResponse(content={"error": "Некорректный cursor"}, status_code=400)
+    if include_text:
+        # Тексты читаются с локального диска, поэтому вне цикла событий
+        items = await run_in_threadpool(lambda: [dict(l, text=text_cache.get(l, fetch=False)) for l in items])
     # Возвращаем file_id для фронта
-    return JSONResponse(content=filtered)
+    if not paginated:
+        return JSONResponse(content=items, headers=headers)
+    return JSONResponse(content={"items": items, "next_cursor": next_cursor, "total": total}, headers=headers)
+
+def export_pages(lo, hi, filename, include_text):
+    """
+    Страницы записей для /export: store просматривается по EXPORT_CHUNK_ROWS строк под lock,
+    между страницами lock отпускается. Тексты — только из локального кэша.
+    """
+    after = None
+    while True:
+        with lock:
+            rows, after = store.scan(lo, hi, filename, after, EXPORT_CHUNK_ROWS)
+        if include_text:
+            for row in rows:
+                row['text'] = text_cache.read_local(row)
+        yield rows
+        if after is None:
+            return
+
+@app.get('/export')
+async def export_logs(format: str = Query('ndjson', pattern='^(ndjson|csv|columns|parquet)$'),
+                      start: str = None, end: str = None, filename: str = None,
+                      include_text: bool = False, gzip: bool = False):
+    """
+    Потоковая выгрузка логов в порядке received_at: ndjson, csv, columns (колонки по страницам в NDJSON)
+    или parquet (нужен pyarrow). start/end — 'YYYY-MM-DD HH:MM' или 'YYYY-MM-DD' (включительно),
+    filename — подстрока имени, include_text — поле text из локального кэша, gzip — сжатие на лету.
+    """
+    if not STORAGE_AVAILABLE:
+        return JSONResponse(content={"error": ERROR_MESSAGE}, status_code=500)
+    if not format_available(format):
+        return JSONResponse(content={"error": "Для format=parquet нужен пакет pyarrow"}, status_code=400)
+    start_range = prefix_range(start) if start else None
+    end_range = prefix_range(end) if end else None
+    if (start and start_range is None) or (end and end_range is None):
+        return JSONResponse(content={"error": "Некорректный start или end"}, status_code=400)
+    fields = EXPORT_FIELDS + ('text',) if include_text else EXPORT_FIELDS
+    chunks = encode_export(export_pages(start_range[0] if start_range else None, end_range[1] if end_range else None,
+                                        filename, include_text), format, fields)
+    media_type, extension = EXPORT_FORMATS[format]
+    name = f'logs_export.{extension}'
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        media_type, name = 'application/gzip', name + '.gz'
+    # Генератор синхронный: Starlette выполняет его в пуле потоков, не блокируя цикл событий
+    return StreamingResponse(chunks, media_type=media_type,
+                             headers={'Content-Disposition': f'attachment; filename="{name}"'})
 
 @app.get('/log_text')
 async def get_log_text(filename: str, received_at: str):
-    if not CREDENTIALS_EXISTS:
+    if not STORAGE_AVAILABLE:
         return JSONResponse(content={"error": ERROR_MESSAGE}, status_code=500)
     with lock:
-        for l in log_files:
-            if l['filename'] == filename and l['received_at'] == received_at:
-                return JSONResponse(content={"text": l['text']})
+        l = store.get_by_name(filename, received_at)
+        l = dict(l) if l is not None else None
+    if l is not None:
+        # Промах по памяти идёт на диск и в хранилище — в пуле потоков хранилища
+        text = text_cache.peek(l)
+        if text is None:
+            text = await run_storage(text_cache.get, l)
+        if text is not None:
+            return JSONResponse(content={"text": text})
     return JSONResponse(content={"error": "Лог не найден"}, status_code=404)
 
 @app.get('/summary')
 async def get_summary():
-    if not CREDENTIALS_EXISTS:
+    if not STORAGE_AVAILABLE:
         return JSONResponse(content={"error": ERROR_MESSAGE}, status_code=500)
     with lock:
-        total_files = len(log_files)
-        total_duration = sum(l.get('duration', 0) for l in log_files)
-        total_size = sum(l.get('size', 0) for l in log_files)
-    return JSONResponse(content={
-        "total_files": total_files,
-        "total_duration": total_duration,
-        "total_size": total_size
-    })
+        summary = store.aggregates.totals()
+        headers = snapshot_headers()
+    queue_stats = ingest_queue.stats() if election.is_writer else writer_queue
+    summary["queue_depth"] = queue_stats['depth']
+    summary["queue_lag"] = queue_stats['lag']
+    return JSONResponse(content=summary, headers=headers)
+
+@app.get('/events')
+async def get_events(request: Request, last_event_id: str = None):
+    """
+    Поток изменений (text/event-stream): log_added, log_updated, log_deleted, queue и reset.
+    Переподключение с Last-Event-ID (или ?last_event_id= из заголовка X-Event-Id ответов
+    /stats, /histogram, /logs, /summary) досылает пропущенные события; reset — перечитать состояние целиком.
+    """
+    if not STORAGE_AVAILABLE:
+        return JSONResponse(content={"error": ERROR_MESSAGE}, status_code=500)
+    sub, backlog = events.subscribe(request.headers.get('last-event-id') or last_event_id)
+    return StreamingResponse(
+        events.stream(sub, backlog),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.get('/search')
+async def search_logs(q: str, offset: int = Query(0, ge=0),
+                      limit: int = Query(SEARCH_PAGE_DEFAULT_LIMIT, ge=1, le=LOGS_PAGE_MAX_LIMIT)):
+    """
+    Поиск по текстам логов: {"items": записи /logs с полем score, "total"} по убыванию релевантности (BM25).
+    Слова запроса нормализуются так же, как тексты (регистр, ё/е, окончания); достаточно любого из них.
+    """
+    if not STORAGE_AVAILABLE:
+        return JSONResponse(content={"error": ERROR_MESSAGE}, status_code=500)
+
+    def find_entry(key):
+        with lock:
+            return store.get_by_local_id(key) or store.get_by_file_id(key)
+
+    def run_search():
+        hits, total = search_index.search(q, offset, limit, keep=lambda key: find_entry(key) is not None)
+        items = []
+        for key, score in hits:
+            entry = find_entry(key)
+            if entry is not None:
+                items.append(dict(entry, score=round(score, 4)))
+        return items, total
+
+    items, total = await run_in_threadpool(run_search)
+    return JSONResponse(content={"items": items, "total": total})
+
+@app.get('/ingest_status')
+async def get_ingest_status():
+    return JSONResponse(content=dict(
+        ingest_queue.stats(), wal=wal.stats(), bundles=bundle_writer.stats(), storage=STORAGE_BACKEND, drive=storage_stats()
+    ))
+
+metrics.gauge('logerapi_store_records', 'Логов в store', lambda: len(store))
+metrics.gauge('logerapi_ingest_queue_depth', 'Логов в очереди выгрузки', lambda: ingest_queue.stats()['depth'])
+metrics.gauge('logerapi_ingest_queue_lag_seconds', 'Возраст самой старой записи очереди',
+              lambda: ingest_queue.stats()['lag'])
+metrics.gauge('logerapi_ingest_processed_total', 'Логов выгружено очередью', lambda: ingest_queue.stats()['processed'],
+              kind='counter')
+metrics.gauge('logerapi_ingest_failed_total', 'Неудачных попыток выгрузки', lambda: ingest_queue.stats()['failed'],
+              kind='counter')
+metrics.gauge('logerapi_index_pending_ops', 'Изменений индекса, ожидающих записи', lambda: index_writer.pending_count())
+metrics.gauge('logerapi_bundle_buffered', 'Логов в буфере пачки', lambda: bundle_writer.stats()['buffered'])
+metrics.gauge('logerapi_text_cache_bytes', 'Текстов в памяти (LRU), байт', lambda: text_cache.stats()['bytes'])
+metrics.gauge('logerapi_search_docs', 'Текстов в поисковом индексе', lambda: len(search_index))
+metrics.gauge('logerapi_events_subscribers', 'Подписчиков /events', lambda: events.subscribers_count())
+metrics.gauge('logerapi_writer', '1 — процесс-писатель, 0 — читатель', lambda: int(election.is_writer))
+
+@app.get('/metrics')
+async def get_metrics():
+    """
+    Метрики в текстовом формате Prometheus.
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type='text/plain; version=0.0.4')
 
 @app.get('/', response_class=HTMLResponse)
-async def index():
-    with open('app/static/index.html', encoding='utf-8') as f:
-        html = f.read()
-    if not CREDENTIALS_EXISTS:
-        html = html.replace('</body>', f'<div style="color:red;font-weight:bold;">{ERROR_MESSAGE}</div></body>')
-    return HTMLResponse(html)
-
-# --- Инициализация состояния из Google Drive ---
-def initialize_state_from_gdrive():
-    global logger, log_files, log_stats
-    if not CREDENTIALS_EXISTS:
+async def index(request: Request):
+    return static_assets.page_response(request, '/')
+
+# --- Инициализация состояния: локальный снимок сразу, сверка с Google Drive в фоне ---
+# Курсор индекса на Google Drive (modifiedTime), до которого изменения есть в store.
+# До первой сверки это курсор из снимка, после — курсор хранилища.
+sync_state = {'index_cursor': None, 'reconciled': False, 'restored_rows': 0}
+
+def current_index_cursor():
+    if not sync_state['reconciled']:
+        return sync_state['index_cursor']
+    return get_storage().index_cursor
+
+def capture_store_snapshot(saved_version):
+    # Курсор читается до копирования store: всё, что он покрывает, уже есть в копии
+    cursor = current_index_cursor()
+    with lock:
+        if store.version == saved_version:
+            return None
+        return store.version, store.export_columns(), {'index_cursor': cursor}
+
+snapshot_writer = SnapshotWriter(capture_store_snapshot, compact_columns, companions=[search_index.save])
+
+def restore_store_snapshot():
+    """
+    Загружает локальный снимок store, чтобы /logs и графики работали сразу после старта.
+    """
+    try:
+        columns, state = read_snapshot(STORE_SNAPSHOT_PATH)
+    except FileNotFoundError:
         return
+    except Exception as e:
+        print(f"[Snapshot ERROR]: Не удалось прочитать снимок хранилища: {e}")
+        return
+    with lock:
+        store.load_columns(columns)
+        sync_state['restored_rows'] = len(store)
+        snapshot_writer.mark_saved(store.version)
+    sync_state['index_cursor'] = state.get('index_cursor')
+
+def restore_search_index():
     try:
-        if logger is None:
-            logger = GDriveLogger()
-        # Проверка и синхронизация индекс-файла
-        logger.ensure_index_consistency()
-        # Загружаем только индекс-файл
-        index = logger.load_index()
-        files = []
-        stats = []
-        for entry in index:
-            files.append(entry)
-            if 'received_at' in entry and 'filename' in entry:
-                stats.append({'received_at': entry['received_at'], 'filename': entry['filename'], 'file_id': entry.get('file_id')})
+        search_index.load(SEARCH_INDEX_PATH)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[Search ERROR]: Не удалось прочитать поисковый индекс, он будет собран заново: {e}")
+
+def index_local_texts():
+    """
+    Добавляет в поисковый индекс тексты из локального кэша, которых в нём ещё нет
+    (первый запуск с поиском, потерянный или отставший от снимка файл индекса).
+    """
+    with lock:
+        entries = store.entries()
+    added = 0
+    for entry in entries:
+        key = text_key(entry)
+        if key and not search_index.has(key) and search_index.add(key, text_cache.read_local(entry)):
+            added += 1
+    if added:
+        print(f"[Search]: В поисковый индекс добавлено {added} текстов из локального кэша")
+
+def forget_log(file_id=None, local_id=None):
+    """
+    Убирает лог из store и локального кэша текстов. Возвращает удалённую запись или None.
+    """
+    with lock:
+        entry = store.remove_by_file_id(file_id) if file_id else store.remove_by_local_id(local_id)
+        if entry is not None:
+            events.publish('log_deleted', {'entry': entry, 'delta': aggregate_delta(entry, -1)})
+    if entry is not None:
+        text_cache.discard(entry)
+        search_index.remove(text_key(entry))
+    return entry
+
+def apply_index_ops_to_store(ops):
+    """
+    Применяет к store операции дельта-сегмента индекса; уже известные записи пропускаются.
+    """
+    for op in ops:
+        if op.get('op') == 'add':
+            entry = dict(op.get('entry') or {})
+            text = entry.pop('text', None)
+            with lock:
+                if store.has(entry.get('local_id'), entry.get('file_id')):
+                    continue
+                store.add(entry)
+                events.publish('log_added', {'entry': entry, 'delta': aggregate_delta(entry, 1)})
+            text_cache.seed(text_key(entry), text)
+            search_index.add(text_key(entry), text)
+        elif op.get('op') == 'remove':
+            forget_log(op.get('file_id'))
+
+def merge_index_into_store(index, prune_below):
+    """
+    Сливает полный индекс с Google Drive со store. Записи, принятые после старта, сохраняются;
+    восстановленные из снимка (seq < prune_below) записи, которых нет в индексе, удаляются.
+    Пустой индекс, из-за которого удалились бы все восстановленные записи, не сливается
+    (скорее сбой, чем удаление всех логов): тогда возвращает False.
+    """
+    with lock:
+        suspicious = not index and bool(store.stale_file_ids(set(), prune_below))
+    if suspicious:
+        print("[Google Drive ERROR]: Индекс пуст, а в store есть записи из снимка: сверка пропущена, записи не удаляются")
+        return False
+    # Старые записи индекса содержат текст: переносим его в локальный кэш
+    for entry in index:
+        text = entry.pop('text', None)
+        text_cache.seed(text_key(entry), text)
+        search_index.add(text_key(entry), text)
+    known = {entry.get('file_id') for entry in index if entry.get('file_id')}
+    stale = []
+    with lock:
+        if len(store) == 0:
+            store.reset(index)
+        else:
+            for entry in index:
+                if not store.has(entry.get('local_id'), entry.get('file_id')):
+                    store.add(entry)
+            stale = [store.remove_by_file_id(file_id) for file_id in store.stale_file_ids(known, prune_below)]
+        events.publish('reset', {})
+    # Текст и поисковый документ лежат под text_key записи (обычно local_id), а не под file_id
+    for entry in stale:
+        text_cache.discard(entry)
+        search_index.remove(text_key(entry))
+    return True
+
+def reconcile_index_with_drive():
+    """
+    Сверка store с индексом на Google Drive по курсору modifiedTime: скачиваются только новые
+    дельта-сегменты. Без курсора или если logs_index.json перезаписан другим процессом —
+    один раз загружается весь индекс и сливается со store.
+    """
+    logger = get_storage()
+    cursor = current_index_cursor()
+    changes = logger.list_index_changes(cursor) if cursor else None
+    if changes is None or changes['base_changed']:
+        index, new_cursor, segments = logger.load_index_with_cursor()
+        index_writer.note_existing_segments(segments)
+        if not merge_index_into_store(index, 0 if sync_state['reconciled'] else sync_state['restored_rows']):
+            # Курсор не двигаем: при следующей сверке индекс загрузится целиком ещё раз
+            return
+    else:
+        for segment in changes['segments']:
+            apply_index_ops_to_store(logger.load_index_delta(segment['id']))
+        new_cursor = changes['cursor']
+    logger.advance_index_cursor(new_cursor)
+    sync_state['reconciled'] = True
+
+def recover_wal_backlog():
+    """
+    Возвращает в работу логи из журнала, не дошедшие до индекса до перезапуска:
+    невыгруженные снова ставятся в очередь, выгруженные — добавляются в индекс.
+    """
+    recovered = 0
+    for local_id in wal.pending_ids():
+        record = wal.read(local_id)
+        state = wal.state(local_id)
+        if record is None or state is None:
+            continue
+        entry, text = record
+        entry = dict(entry, file_id=state['file_id'])
+        text_cache.seed(local_id, text)
+        search_index.add(local_id, text)
         with lock:
-            log_files = files
-            log_stats = stats
+            if not store.has(local_id):
+                store.add(entry)
+                events.publish('log_added', {'entry': entry, 'delta': aggregate_delta(entry, 1)})
+            elif state['file_id']:
+                store.set_file_id(local_id, state['file_id'])
+        if state['file_id']:
+            index_writer.add(entry)
+        else:
+            ingest_queue.submit(local_id, (entry, text))
+        recovered += 1
+    if recovered:
+        print(f'[WAL]: Из журнала восстановлено {recovered} логов')
+        # Выгруженные записи попадают в индекс до первой сверки, чтобы она их не удалила
+        index_writer.flush()
+
+def replay_wal():
+    """
+    Периодически ставит в очередь логи из журнала, выгрузка которых не удалась.
+    """
+    while True:
+        time.sleep(WAL_REPLAY_INTERVAL_SEC)
+        try:
+            for local_id in wal.pending_ids(shipped=False):
+                if ingest_queue.contains(local_id) or bundle_writer.contains(local_id):
+                    continue
+                # Состояние проверяется после очереди: воркер отмечает выгрузку раньше, чем уходит из очереди
+                state = wal.state(local_id)
+                record = wal.read(local_id) if state is not None and not state['file_id'] else None
+                if record is None:
+                    continue
+                entry, text = record
+                if not ingest_queue.submit(local_id, (entry, text)):
+                    break
+        except Exception as e:
+            print(f"[WAL ERROR]: Ошибка повторной выгрузки: {e}")
+
+def initialize_state_from_gdrive():
+    if not STORAGE_AVAILABLE:
+        return
+    try:
+        recover_wal_backlog()
     except Exception as e:
-        print(f"[Google Drive ERROR]: Ошибка инициализации состояния: {e}")
+        print(f"[WAL ERROR]: Не удалось восстановить логи из журнала: {e}")
+    threading.Thread(target=replay_wal, daemon=True).start()
+    texts_indexed = False
+    while True:
+        try:
+            reconcile_index_with_drive()
+        except Exception as e:
+            print(f"[Google Drive ERROR]: Ошибка сверки индекса: {e}")
+        if not texts_indexed:
+            texts_indexed = True
+            try:
+                index_local_texts()
+            except Exception as e:
+                print(f"[Search ERROR]: Не удалось проиндексировать локальные тексты: {e}")
+        time.sleep(INDEX_RECONCILE_INTERVAL_SEC)
+
+# --- Несколько процессов: писатель отдаёт читателям снимок store и поток /events через unix-сокет ---
+def write_replica_snapshot():
+    """
+    Снимок store для процесса-читателя и токен последнего учтённого в нём события:
+    с этого токена читатель подписывается на /events.
+    """
+    with lock:
+        exported = store.export_columns()
+        token = events.last_token()
+    path = f'{REPLICA_SNAPSHOT_PATH}.{uuid.uuid4().hex[:8]}'
+    write_snapshot(path, compact_columns(exported), {})
+    queue_stats = ingest_queue.stats()
+    return {'path': path, 'token': token, 'queue': {'depth': queue_stats['depth'], 'lag': queue_stats['lag']}}
+
+async def replica_snapshot(request):
+    try:
+        return JSONResponse(content=await run_in_threadpool(write_replica_snapshot))
+    except OSError as e:
+        return JSONResponse(content={"error": f"Не удалось записать снимок для читателя: {e}"}, status_code=500)
+
+writer_socket = WriterSocketServer(app, [Route('/_replica/snapshot', replica_snapshot, methods=['POST'])])
+
+def load_replica(columns, queue):
+    with lock:
+        store.load_columns(columns)
+        writer_queue.update(queue)
+        events.publish('reset', {})
+
+def apply_writer_event(event_type, data):
+    """
+    Событие писателя -> реплика store читателя; затем то же событие получают подписчики /events читателя.
+    """
+    removed = None
+    with lock:
+        if event_type == 'log_added':
+            entry = data['entry']
+            if not store.has(entry.get('local_id'), entry.get('file_id')):
+                store.add(dict(entry))
+        elif event_type == 'log_updated':
+            store.set_file_id(data['local_id'], data['file_id'])
+        elif event_type == 'log_deleted':
+            entry = data['entry']
+            removed = store.remove_by_local_id(entry['local_id']) if entry.get('local_id') else None
+            if removed is None and entry.get('file_id'):
+                removed = store.remove_by_file_id(entry['file_id'])
+        elif event_type == 'queue':
+            writer_queue.update(data)
+        events.publish(event_type, data)
+    if removed is not None:
+        text_cache.discard(removed)
+
+replica_follower = ReplicaFollower(election, load_replica, apply_writer_event, lambda: start_writer(promoted=True))
+
+def start_writer(promoted=False):
+    """
+    Запуск писателя: журнал приёма, фоновая выгрузка, снимок store и сверка с хранилищем.
+    promoted=True — процесс был читателем, и в его store уже реплика от завершившегося писателя.
+    """
+    global wal
+    wal = IngestWAL()
+    metrics.gauge('logerapi_wal_pending', 'Логов в журнале приёма, ещё не попавших в индекс', lambda: wal.stats()['pending'])
+    metrics.gauge('logerapi_wal_unshipped', 'Логов в журнале приёма, ещё не выгруженных', lambda: wal.stats()['unshipped'])
+    metrics.gauge('logerapi_wal_bytes', 'Размер сегментов журнала приёма', lambda: wal.stats()['bytes'])
+    index_writer.start()
+    if STORAGE_LAYOUT == 'bundles':
+        bundle_writer.start()
+    ingest_queue.start()
+    if STORAGE_AVAILABLE:
+        if promoted:
+            # Реплика — как восстановленный снимок: записи, которых нет в индексе, уберёт первая сверка
+            with lock:
+                sync_state['restored_rows'] = len(store)
+        else:
+            restore_search_index()
+            restore_store_snapshot()
+        snapshot_writer.start()
+        threading.Thread(target=initialize_state_from_gdrive, daemon=True).start()
+    if MULTIPROCESS_MODE:
+        writer_socket.start()
 
 # Инициализация при старте
-if CREDENTIALS_EXISTS:
-    threading.Thread(target=initialize_state_from_gdrive, daemon=True).start()
+if not election.try_acquire(start_writer) and STORAGE_AVAILABLE:
+    replica_follower.start()
 
 # --- Endpoint для удаления лога ---
 @app.delete('/log')
-async def delete_log(file_id: str = Query(...)):
-    global logger
-    if not CREDENTIALS_EXISTS:
+async def delete_log(file_id: str = None, local_id: str = None):
+    """
+    Удаляет лог по file_id (Google Drive id) или по local_id — в том числе ещё не выгруженный.
+    """
+    if not STORAGE_AVAILABLE:
         return JSONResponse(content={"error": ERROR_MESSAGE}, status_code=500)
-    if logger is None:
-        try:
-            logger = GDriveLogger()
-        except Exception as e:
-            return JSONResponse(content={"error": f"Ошибка инициализации GDriveLogger: {e}"}, status_code=500)
+    if not file_id and not local_id:
+        return JSONResponse(content={"error": "Нужен file_id или local_id"}, status_code=400)
+    if not file_id:
+        with lock:
+            entry = store.get_by_local_id(local_id)
+            file_id = entry.get('file_id') if entry is not None else None
+        # Лог ещё в журнале: выгрузка прекратится, а уже выгруженный файл удалим ниже
+        state = await run_in_threadpool(wal.drop, local_id)
+        file_id = file_id or (state or {}).get('file_id')
+        if not file_id:
+            forget_log(local_id=local_id)
+            return {"status": "deleted"}
+    try:
+        logger = await run_storage(get_storage)
+    except Exception as e:
+        return JSONResponse(content={"error": f"Ошибка инициализации хранилища: {e}"}, status_code=500)
     # Удаляем с Google Drive
-    logger.delete_log_file(file_id)
-    # Удаляем из индекс-файла
-    logger.remove_log_from_index(file_id)
+    await run_storage(logger.delete_log_file, file_id)
+    # Удаляем из индекс-файла (пачкой, вместе с другими изменениями)
+    index_writer.remove(file_id)
     # Удаляем из локального состояния
-    with lock:
-        log_files[:] = [l for l in log_files if l.get('file_id') != file_id]
-        log_stats[:] = [s for s in log_stats if s.get('file_id') != file_id]
+    entry = forget_log(file_id)
+    if entry is not None and entry.get('local_id') and not local_id:
+        await run_in_threadpool(wal.drop, entry['local_id'])
     return {"status": "deleted"}
 
 CONFIG_PATH = '../whisper_API_que/core/config.py'  # путь к файлу в другом репозитории
@@ -203,7 +917,7 @@ GITHUB_CONFIG_PATH = 'core/config.py'
 async def get_settings():
     # Всегда грузим из GitHub
     try:
-        resp = requests.get(CONFIG_GITHUB_URL, timeout=5)
+        resp = await http_client().get(CONFIG_GITHUB_URL, timeout=5)
         if resp.status_code == 200:
             code = resp.text
             result = {}
@@ -236,7 +950,10 @@ async def save_settings(data: dict = Body(...)):
     # Получаем sha текущего файла
     headers = {'Authorization': f'token {token}', 'Accept': 'application/vnd.github.v3+json'}
     api_url = f'https://api.github.com/repos/{GITHUB_REPO}/contents/{GITHUB_CONFIG_PATH}'
-    resp = requests.get(api_url, headers=headers)
+    try:
+        resp = await http_client().get(api_url, headers=headers)
+    except httpx.HTTPError as e:
+        return JSONResponse(content={'error': f'Не удалось получить sha файла config.py из GitHub: {e}'}, status_code=500)
     if resp.status_code == 200:
         sha = resp.json().get('sha')
     else:
@@ -249,7 +966,10 @@ async def save_settings(data: dict = Body(...)):
         'content': content_b64,
         'sha': sha
     }
-    put_resp = requests.put(api_url, headers=headers, json=payload)
+    try:
+        put_resp = await http_client().put(api_url, headers=headers, json=payload)
+    except httpx.HTTPError as e:
+        return JSONResponse(content={'error': f'Ошибка обновления config.py через GitHub API: {e}'}, status_code=500)
     if put_resp.status_code in (200, 201):
         return {'status': 'ok'}
     else:
@@ -257,25 +977,29 @@ async def save_settings(data: dict = Body(...)):
 
 @app.post('/api/settings/rollback')
 async def rollback_settings():
-    try:
-        # Откатить последний коммит только для config.py
-        subprocess.run(['git', '-C', '../whisper_API_que', 'checkout', 'HEAD~1', '--', 'core/config.py'], check=True)
-        subprocess.run(['git', '-C', '../whisper_API_que', 'commit', '-am', 'Rollback config.py via web UI'], check=True)
-        subprocess.run(['git', '-C', '../whisper_API_que', 'push'], check=True)
-    except Exception as e:
-        return JSONResponse(content={'error': f'Ошибка отката: {e}'}, status_code=500)
+    # Откатить последний коммит только для config.py
+    commands = [
+        ['git', '-C', '../whisper_API_que', 'checkout', 'HEAD~1', '--', 'core/config.py'],
+        ['git', '-C', '../whisper_API_que', 'commit', '-am', 'Rollback config.py via web UI'],
+        ['git', '-C', '../whisper_API_que', 'push'],
+    ]
+    for command in commands:
+        try:
+            code, output = await run_command(*command)
+        except Exception as e:
+            return JSONResponse(content={'error': f'Ошибка отката: {e}'}, status_code=500)
+        if code != 0:
+            return JSONResponse(content={'error': f"Ошибка отката: {' '.join(command)}: {output.strip()}"}, status_code=500)
     return {'status': 'ok'}
 
 @app.get('/settings', response_class=HTMLResponse)
-async def settings_page():
-    with open('app/static/settings.html', encoding='utf-8') as f:
-        html = f.read()
-    return HTMLResponse(html)
+async def settings_page(request: Request):
+    return static_assets.page_response(request, '/settings')
 
 @app.get('/runpod_status')
 async def runpod_status():
     try:
-        resp = requests.get('https://3xd93p62vxzrvx-8000.proxy.runpod.net/api/status', timeout=5)
+        resp = await http_client().get('https://3xd93p62vxzrvx-8000.proxy.runpod.net/api/status', timeout=5)
         online = False
         if resp.status_code == 200:
             data = resp.json()
@@ -285,8 +1009,7 @@ async def runpod_status():
             from datetime import datetime
             now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             try:
-                logger = GDriveLogger()
-                logger.save_last_online(now)
+                await run_storage(lambda: get_storage().save_last_online(now))
             except Exception:
                 pass
         return {'status': online}
@@ -0,0 +1,79 @@
+"""
+Блокирующий ввод-вывод вне цикла событий: общий асинхронный HTTP-клиент для внешних запросов
+(GitHub, RunPod) и ограниченный пул потоков для вызовов хранилища (Google Drive), чтобы медленный
+внешний сервис не останавливал остальные запросы и не занимал весь общий пул потоков Starlette.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from .constants import *
+from . import metrics
+
+_storage_executor = ThreadPoolExecutor(max_workers=STORAGE_EXECUTOR_WORKERS, thread_name_prefix='storage')
+_storage_in_flight = [0]
+_storage_lock = threading.Lock()
+
+metrics.gauge('logerapi_storage_calls_in_flight', 'Вызовов хранилища в пуле потоков (выполняются и ждут)',
+              lambda: _storage_in_flight[0])
+
+
+async def run_storage(fn, *args, **kwargs):
+    """
+    Выполняет блокирующий вызов хранилища в пуле из STORAGE_EXECUTOR_WORKERS потоков и ждёт результат.
+    """
+    with _storage_lock:
+        _storage_in_flight[0] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_storage_executor, functools.partial(fn, *args, **kwargs))
+    finally:
+        with _storage_lock:
+            _storage_in_flight[0] -= 1
+
+
+_client = None
+_client_loop = None
+
+
+def http_client():
+    """
+    Общий httpx.AsyncClient с пулом keep-alive соединений. Клиент привязан к циклу событий,
+    поэтому для другого цикла (например, в тестах) создаётся новый.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=OUTBOUND_HTTP_TIMEOUT_SEC,
+            limits=httpx.Limits(max_connections=OUTBOUND_HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=OUTBOUND_HTTP_MAX_CONNECTIONS),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_http_client():
+    global _client, _client_loop
+    if _client is not None and _client_loop is asyncio.get_running_loop():
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+
+
+async def run_command(*args, timeout=COMMAND_TIMEOUT_SEC):
+    """
+    Запускает внешнюю команду без блокировки цикла событий.
+    Возвращает (код завершения, stdout+stderr); при превышении timeout процесс убивается.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    try:
+        output, _ = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise
+    return process.returncode, output.decode('utf-8', errors='replace')
@@ -4,8 +4,106 @@ GOOGLE_TOKEN_FILE = 'token.json'
 GOOGLE_DRIVE_FOLDER_NAME = 'LogerAPI_Logs'
 DATE_FORMAT = '%Y-%m-%d'
 LOG_FILE_EXTENSION = '.txt'
+DRIVE_HTTP_TIMEOUT_SEC = 60  # таймаут HTTP-запросов к Google Drive
 UI_UPDATE_INTERVAL_MS = 1000
 
+# --- Очередь приёма логов ---
+INGEST_QUEUE_MAXSIZE = 1000  # максимум записей в очереди, при переполнении POST /log отвечает 503
+INGEST_WORKERS = 4  # число фоновых воркеров выгрузки на Google Drive
+INGEST_RETRY_AFTER_SEC = 5  # значение заголовка Retry-After при переполнении очереди
+
+# --- Планировщик запросов к Google Drive ---
+DRIVE_RATE_PER_SEC = 10  # запросов в секунду в среднем (token bucket), с запасом от квоты Drive API
+DRIVE_BURST = 20  # сколько запросов можно отправить подряд без ожидания
+DRIVE_MAX_RETRIES = 6  # повторов при 429/5xx/сетевых сбоях
+DRIVE_BACKOFF_BASE_SEC = 0.5  # первая задержка перед повтором, дальше удваивается (со случайным jitter)
+DRIVE_BACKOFF_MAX_SEC = 32  # максимальная задержка перед повтором
+DRIVE_BATCH_SIZE = 100  # запросов в одном batch HTTP-запросе (лимит Drive API — 100)
+DRIVE_STATS_WINDOW = 500  # по скольким последним вызовам считать p50/p95 задержки
+
+# --- Внешние запросы и пул потоков хранилища ---
+OUTBOUND_HTTP_TIMEOUT_SEC = 10  # таймаут запросов к GitHub и RunPod
+OUTBOUND_HTTP_MAX_CONNECTIONS = 20  # соединений в пуле общего HTTP-клиента
+COMMAND_TIMEOUT_SEC = 60  # таймаут внешних команд (git при откате настроек)
+STORAGE_EXECUTOR_WORKERS = 8  # потоков для вызовов хранилища из запросов (/log_text, DELETE /log)
+
+# --- Хранилище логов ---
+STORAGE_BACKEND = 'gdrive'  # 'gdrive' — Google Drive, 'local' — каталог LOCAL_STORAGE_DIR, 'memory' — в памяти (нагрузочные замеры)
+LOCAL_STORAGE_DIR = 'data/storage'  # корень локального хранилища: индекс, дельта-сегменты и папки-дни
+
+# --- Раскладка логов на Google Drive ---
+STORAGE_LAYOUT = 'files'  # 'files' — отдельный .txt на каждый лог, 'bundles' — пачки логов в одном .ndjson.gz
+BUNDLE_MAX_RECORDS = 1000  # сколько логов максимум в одной пачке
+BUNDLE_MAX_AGE_SEC = 300  # окно пачки: дольше записи в буфере не копятся
+BUNDLE_BUFFER_MAX_RECORDS = 5000  # предел буфера пачек (например, пока Google Drive недоступен)
+BUNDLE_BUFFER_MAX_BYTES = 32 * 1024 * 1024  # предел текстов в буфере пачек; сверх пределов логи ждут в журнале
+
+# --- Журнал приёма (WAL) ---
+WAL_DIR = 'data/wal'  # сегменты журнала принятых, но ещё не попавших в индекс логов
+WAL_SEGMENT_BYTES = 16 * 1024 * 1024  # размер сегмента, после которого начинается новый
+WAL_COMPACT_SEGMENTS = 4  # сколько закрытых сегментов с незавершёнными логами держать до уплотнения
+WAL_REPLAY_INTERVAL_SEC = 30  # как часто повторять выгрузку логов, не дошедших до Google Drive
+
+# --- Пакетный приём /logs/batch ---
+LOGS_BATCH_MAX_ITEMS = 10000  # максимум логов в JSON-массиве, больше — только NDJSON
+LOGS_BATCH_CHUNK = 500  # сколько логов записывать в журнал одним fsync
+
+# --- Кэш текстов логов ---
+TEXT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # лимит текстов в памяти (LRU)
+TEXT_CACHE_DIR = 'data/texts'  # локальная копия текстов на диске
+
+# --- Пагинация /logs ---
+LOGS_PAGE_DEFAULT_LIMIT = 50
+LOGS_PAGE_MAX_LIMIT = 1000
+
+# --- Пакетная запись индекса ---
+INDEX_FLUSH_INTERVAL_SEC = 2.0  # как часто сбрасывать накопленные изменения индекса
+INDEX_FLUSH_MAX_OPS = 200  # сбросить раньше, если накопилось столько изменений
+INDEX_COMPACT_AFTER_SEGMENTS = 50  # после скольких дельта-сегментов сливать их в logs_index.json
+
+# --- Локальный снимок хранилища и сверка с Google Drive ---
+STORE_SNAPSHOT_PATH = 'data/store.snapshot'  # снимок метаданных логов для быстрого старта
+STORE_SNAPSHOT_INTERVAL_SEC = 60  # как часто сохранять снимок, если были изменения
+INDEX_RECONCILE_INTERVAL_SEC = 300  # как часто проверять изменения индекса на Google Drive
+
+# --- Пересборка индекса из лог-файлов ---
+REBUILD_LIST_WORKERS = 8  # параллельных листингов папок-дней
+REBUILD_DOWNLOAD_WORKERS = 8  # параллельных скачиваний лог-файлов
+REBUILD_STATE_PATH = 'data/index_rebuild.jsonl'  # журнал уже разобранных файлов для продолжения
+REBUILD_PROGRESS_SEC = 5  # как часто печатать прогресс
+
+# --- Поток событий /events (SSE) ---
+EVENTS_HISTORY_SIZE = 1000  # сколько последних событий хранить для переподключения по Last-Event-ID
+EVENTS_SUBSCRIBER_QUEUE = 1000  # максимум неотправленных событий на клиента, дальше — reset
+EVENTS_KEEPALIVE_SEC = 15  # интервал keepalive-комментариев при отсутствии событий
+EVENTS_RETRY_MS = 3000  # через сколько браузер переподключается после обрыва
+
+# --- Полнотекстовый поиск /search ---
+SEARCH_INDEX_PATH = 'data/search.index'  # поисковый индекс, сохраняется вместе со снимком хранилища
+SEARCH_PAGE_DEFAULT_LIMIT = 20  # результатов на страницу по умолчанию
+SEARCH_BM25_K1 = 1.2  # насыщение частоты термина в BM25
+SEARCH_BM25_B = 0.75  # нормализация по длине текста в BM25
+SEARCH_RANK_SLACK = 100  # запас кандидатов сверх страницы на случай уже удалённых записей
+SEARCH_COMPACT_DEAD_RATIO = 0.2  # доля удалённых документов, после которой индекс перестраивается при сохранении
+
+# --- Выгрузка /export ---
+EXPORT_CHUNK_ROWS = 1000  # строк store, просматриваемых под lock за один шаг выгрузки
+EXPORT_GZIP_LEVEL = 6  # уровень сжатия при gzip=true
+
+# --- Несколько процессов (uvicorn --workers N) ---
+MULTIPROCESS_MODE = False  # True — store и выгрузку ведёт один процесс-писатель, остальные читают его реплику
+WRITER_LOCK_PATH = 'data/writer.lock'  # lock-файл: кто его захватил, тот и писатель
+WRITER_SOCKET_PATH = 'data/writer.sock'  # unix-сокет писателя для читателей
+REPLICA_SNAPSHOT_PATH = 'data/replica.snapshot'  # префикс временных снимков store для запуска читателей
+REPLICA_RETRY_SEC = 1  # пауза перед переподключением читателя к писателю
+WRITER_FORWARD_TIMEOUT_SEC = 60  # таймаут запроса, пересланного читателем писателю
+
+# --- Статика и страницы UI ---
+STATIC_DIR = 'app/static'  # каталог статики, читается в память при старте
+STATIC_RELOAD = False  # True — перечитывать изменённые файлы статики без перезапуска (разработка)
+STATIC_IMMUTABLE_MAX_AGE_SEC = 31536000  # срок кэширования файлов по ссылке с ?v=<хэш>
+STATIC_COMPRESS_MIN_BYTES = 256  # файлы меньше этого размера не сжимаются
+
 # --- UI/JS constants ---
 UI_CONST = {
     'UPDATE_INTERVAL_MS': 60000,  # 1 минута
@@ -24,4 +122,6 @@ UI_CONST = {
     'CHART_X_MINUTES': 'Время (минуты)',
     'CHART_X_DAYS': 'Дата',
     'CHART_Y_FILES': 'Файлов',
+    'STATS_RANGE_HOURS': 24,  # сколько последних часов показывать на графике по минутам
+    'EVENTS_RESYNC_DELAY_MS': 3000,  # пауза перед полной загрузкой, если поток /events закрылся
 }
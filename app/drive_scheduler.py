@@ -0,0 +1,224 @@
+import random
+import threading
+import time
+from collections import deque
+import httplib2
+from googleapiclient.errors import HttpError
+from .constants import *
+from . import metrics
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = (b'rateLimitExceeded', b'userRateLimitExceeded')
+
+DRIVE_SECONDS = metrics.histogram('logerapi_drive_request_seconds',
+                                  'Запросы к Google Drive с учётом повторов и ожидания квоты', labels=('op',))
+DRIVE_RETRIES = metrics.counter('logerapi_drive_retries_total', 'Повторы запросов к Google Drive', labels=('op',))
+DRIVE_ERRORS = metrics.counter('logerapi_drive_errors_total', 'Запросы к Google Drive, не удавшиеся после повторов',
+                               labels=('op',))
+DRIVE_THROTTLED = metrics.counter('logerapi_drive_throttled_seconds_total', 'Ожидание квоты (token bucket)',
+                                  labels=('op',))
+
+
+def is_retryable(e):
+    """
+    Ошибки, после которых запрос к Google Drive имеет смысл повторить:
+    превышение квоты (429, 403 rateLimitExceeded), 5xx и сетевые сбои.
+    """
+    if isinstance(e, HttpError):
+        status = getattr(e.resp, 'status', None)
+        if status in RETRY_STATUSES:
+            return True
+        content = getattr(e, 'content', None) or b''
+        return status == 403 and any(reason in content for reason in RATE_LIMIT_REASONS)
+    return isinstance(e, (OSError, httplib2.HttpLib2Error))
+
+
+def _retry_after(e):
+    try:
+        return float(e.resp.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов: rate токенов в секунду, не больше burst в запасе.
+    """
+    def __init__(self, rate, burst):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Берёт один токен, при необходимости ждёт. Возвращает время ожидания в секундах.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+            waited += wait
+
+
+class _OpStats:
+    def __init__(self, window):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttled_sec = 0.0
+        self.total_sec = 0.0
+        self.max_sec = 0.0
+        self.recent = deque(maxlen=window)
+
+    def snapshot(self):
+        recent = sorted(self.recent)
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'throttled_sec': round(self.throttled_sec, 3),
+            'avg_ms': round(self.total_sec / self.calls * 1e3, 1) if self.calls else 0.0,
+            'p50_ms': round(_percentile(recent, 0.5) * 1e3, 1),
+            'p95_ms': round(_percentile(recent, 0.95) * 1e3, 1),
+            'max_ms': round(self.max_sec * 1e3, 1),
+        }
+
+
+class DriveScheduler:
+    """
+    Единая точка выполнения запросов к Google Drive:
+    token bucket по квоте, повтор с экспоненциальной задержкой и jitter при 429/5xx/сетевых сбоях,
+    batch-запросы для пачек однотипных операций и статистика по операциям (задержка, повторы, ошибки).
+    Потокобезопасен.
+    """
+    def __init__(self, rate=DRIVE_RATE_PER_SEC, burst=DRIVE_BURST, max_retries=DRIVE_MAX_RETRIES,
+                 backoff_base=DRIVE_BACKOFF_BASE_SEC, backoff_max=DRIVE_BACKOFF_MAX_SEC,
+                 batch_size=DRIVE_BATCH_SIZE, stats_window=DRIVE_STATS_WINDOW):
+        self._bucket = TokenBucket(rate, burst)
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._batch_size = batch_size
+        self._stats_window = stats_window
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def _delay(self, attempt, error=None):
+        # Full jitter: случайная задержка от 0 до base * 2^attempt, но не меньше Retry-After
+        delay = random.uniform(0, min(self._backoff_max, self._backoff_base * 2 ** attempt))
+        retry_after = _retry_after(error) if error is not None else None
+        return max(delay, retry_after or 0.0)
+
+    def _record(self, op, elapsed, retries, throttled, failed):
+        DRIVE_SECONDS.observe(elapsed, op=op)
+        if retries:
+            DRIVE_RETRIES.inc(retries, op=op)
+        if failed:
+            DRIVE_ERRORS.inc(op=op)
+        if throttled:
+            DRIVE_THROTTLED.inc(throttled, op=op)
+        with self._stats_lock:
+            stats = self._stats.get(op)
+            if stats is None:
+                stats = self._stats[op] = _OpStats(self._stats_window)
+            stats.calls += 1
+            stats.errors += failed
+            stats.retries += retries
+            stats.throttled_sec += throttled
+            stats.total_sec += elapsed
+            stats.max_sec = max(stats.max_sec, elapsed)
+            stats.recent.append(elapsed)
+
+    def call(self, op, action):
+        """
+        Выполняет action() (один HTTP-запрос) с учётом квоты и повторами. op — имя операции для статистики.
+        Ошибка, которую не удалось пережить повторами, пробрасывается дальше.
+        """
+        started = time.monotonic()
+        throttled = 0.0
+        attempt = 0
+        while True:
+            throttled += self._bucket.acquire()
+            try:
+                result = action()
+            except Exception as e:
+                if attempt < self._max_retries and is_retryable(e):
+                    time.sleep(self._delay(attempt, e))
+                    attempt += 1
+                    continue
+                self._record(op, time.monotonic() - started, attempt, throttled, True)
+                raise
+            self._record(op, time.monotonic() - started, attempt, throttled, False)
+            return result
+
+    def execute(self, op, request):
+        return self.call(op, lambda: request.execute(num_retries=0))
+
+    def batch(self, op, new_batch, requests):
+        """
+        Выполняет пачку запросов через batch HTTP (до batch_size запросов за один HTTP-вызов).
+        requests — {ключ: функция, создающая HttpRequest}; new_batch() — новый BatchHttpRequest.
+        Запросы, упавшие с повторяемой ошибкой, отправляются следующей пачкой после задержки.
+        Возвращает {ключ: (ответ, исключение)}.
+        """
+        results = {}
+        pending = list(requests)
+        attempt = 0
+        while pending:
+            retry = []
+            for i in range(0, len(pending), self._batch_size):
+                chunk = pending[i:i + self._batch_size]
+                failures = {}
+
+                def callback(request_id, response, exception, chunk=chunk, failures=failures):
+                    key = chunk[int(request_id)]
+                    if exception is not None:
+                        failures[key] = exception
+                    else:
+                        results[key] = (response, None)
+
+                batch = new_batch()
+                for n, key in enumerate(chunk):
+                    batch.add(requests[key](), callback=callback, request_id=str(n))
+                # Каждый запрос пачки расходует квоту как отдельный
+                throttled = sum(self._bucket.acquire() for _ in chunk)
+                started = time.monotonic()
+                try:
+                    batch.execute()
+                except Exception as e:
+                    for key in chunk:
+                        if key not in results:
+                            failures.setdefault(key, e)
+                retried = 0
+                for key, e in failures.items():
+                    if attempt < self._max_retries and is_retryable(e):
+                        retry.append(key)
+                        retried += 1
+                    else:
+                        results[key] = (None, e)
+                self._record(f'{op}:batch', time.monotonic() - started, retried, throttled,
+                             len(failures) > retried)
+            if retry:
+                time.sleep(self._delay(attempt))
+                attempt += 1
+            pending = retry
+        return results
+
+    def stats(self):
+        with self._stats_lock:
+            return {op: stats.snapshot() for op, stats in sorted(self._stats.items())}
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import threading
+import uuid
+from collections import deque
+from .constants import *
+
+
+def format_sse(event):
+    """
+    Событие -> кадр text/event-stream.
+    """
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+
+class _Subscriber:
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+
+class EventBroadcaster:
+    """
+    Рассылка событий об изменениях (лог добавлен/выгружен/удалён, очередь приёма) подписчикам /events.
+    Последние EVENTS_HISTORY_SIZE событий хранятся в кольцевом буфере, чтобы переподключившийся
+    клиент получил пропущенное по токену (Last-Event-ID). Токен — "<эпоха процесса>:<номер события>",
+    после перезапуска сервиса эпоха меняется и клиент получает reset.
+    publish потокобезопасен и вызывается из обработчиков и фоновых воркеров.
+    """
+    def __init__(self, history=EVENTS_HISTORY_SIZE, subscriber_queue=EVENTS_SUBSCRIBER_QUEUE):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._history = deque(maxlen=history)
+        self._subscriber_queue = subscriber_queue
+        self._subscribers = set()
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def token(self, event_id=None):
+        return f'{self.epoch}:{self._last_id if event_id is None else event_id}'
+
+    def last_token(self):
+        with self._lock:
+            return self.token()
+
+    def publish(self, event_type, data):
+        with self._lock:
+            self._last_id += 1
+            event = {'id': self.token(self._last_id), 'seq': self._last_id, 'type': event_type, 'data': data}
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(self._deliver, sub, event)
+            except RuntimeError:
+                # Цикл событий подписчика уже закрыт
+                self._discard(sub)
+        return event
+
+    def _deliver(self, sub, event):
+        if sub.overflowed:
+            return
+        try:
+            sub.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Медленный клиент: выбрасываем накопленное, он перечитает состояние целиком
+            sub.overflowed = True
+            while not sub.queue.empty():
+                sub.queue.get_nowait()
+            sub.queue.put_nowait(self._reset_event())
+
+    def _reset_event(self):
+        with self._lock:
+            return {'id': self.token(), 'seq': self._last_id, 'type': 'reset', 'data': {}}
+
+    def subscribe(self, last_token=None):
+        """
+        Регистрирует подписчика в текущем цикле событий.
+        Возвращает (подписчик, события после last_token); если их уже нет в буфере
+        или токен от другого запуска — вместо них одно событие reset.
+        """
+        sub = _Subscriber(asyncio.get_running_loop(), self._subscriber_queue)
+        with self._lock:
+            self._subscribers.add(sub)
+            if not last_token:
+                return sub, []
+            epoch, _, last_id = last_token.partition(':')
+            try:
+                last_id = int(last_id)
+            except ValueError:
+                last_id = -1
+            oldest = self._history[0]['seq'] if self._history else self._last_id + 1
+            if epoch != self.epoch or last_id > self._last_id or last_id < oldest - 1:
+                return sub, [{'id': self.token(), 'seq': self._last_id, 'type': 'reset', 'data': {}}]
+            return sub, [e for e in self._history if e['seq'] > last_id]
+
+    def _discard(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def unsubscribe(self, sub):
+        self._discard(sub)
+
+    def subscribers_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    async def stream(self, sub, backlog, keepalive=EVENTS_KEEPALIVE_SEC):
+        """
+        Кадры text/event-stream для подписчика: сначала backlog, затем новые события.
+        Раз в keepalive секунд без событий шлёт комментарий, чтобы прокси не рвали соединение.
+        """
+        try:
+            yield f'retry: {EVENTS_RETRY_MS}\n\n'
+            for event in backlog:
+                yield format_sse(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(event)
+                if event['type'] == 'reset' and sub.overflowed:
+                    # Дальше клиент переподключится с новым токеном
+                    return
+        finally:
+            self.unsubscribe(sub)
@@ -0,0 +1,132 @@
+"""
+Потоковая выгрузка логов (GET /export). Записи приходят страницами (списками словарей) и сразу
+кодируются, поэтому память сервера не зависит от объёма выгрузки, а первые байты уходят сразу.
+Форматы: 'ndjson', 'csv' и колоночные — 'columns' (NDJSON, строка которого содержит колонки одной
+страницы: {"filename": [...], "duration": [...], ...}) и 'parquet' (группа строк на страницу, нужен pyarrow).
+"""
+import csv
+import io
+import json
+import zlib
+from .constants import *
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow не обязателен: без него недоступен только format=parquet
+    pa = pq = None
+
+EXPORT_FIELDS = ('filename', 'received_at', 'duration', 'size', 'queue_time', 'process_time', 'local_id', 'file_id')
+# format -> (Content-Type, расширение файла)
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'columns': ('application/x-ndjson', 'columns.ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def format_available(fmt):
+    return fmt in EXPORT_FORMATS and (fmt != 'parquet' or pq is not None)
+
+
+def _encode_ndjson(pages, fields):
+    # Запись целиком, как в /logs (включая дополнительные поля старых записей индекса)
+    for rows in pages:
+        if rows:
+            yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+
+
+def _encode_csv(pages, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for rows in pages:
+        for row in rows:
+            writer.writerow(['' if row.get(field) is None else row.get(field) for field in fields])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Страниц не было — заголовок всё равно отдаётся
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _encode_columns(pages, fields):
+    for rows in pages:
+        if rows:
+            yield (json.dumps({field: [row.get(field) for row in rows] for field in fields},
+                              ensure_ascii=False) + '\n').encode('utf-8')
+
+
+class _ByteSink:
+    """
+    Файлоподобный приёмник для ParquetWriter: накопленные байты забираются drain() после каждой группы строк.
+    """
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _parquet_type(field):
+    if field in ('duration', 'queue_time', 'process_time'):
+        return pa.float64()
+    if field == 'size':
+        return pa.int64()
+    return pa.string()
+
+
+def _encode_parquet(pages, fields):
+    schema = pa.schema([(field, _parquet_type(field)) for field in fields])
+    sink = _ByteSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in pages:
+            if rows:
+                writer.write_table(pa.Table.from_pydict(
+                    {field: [row.get(field) for row in rows] for field in fields}, schema=schema))
+                yield sink.drain()
+    yield sink.drain()
+
+
+_ENCODERS = {'ndjson': _encode_ndjson, 'csv': _encode_csv, 'columns': _encode_columns, 'parquet': _encode_parquet}
+
+
+def encode_export(pages, fmt, fields=EXPORT_FIELDS):
+    """
+    Страницы записей -> куски байт в формате fmt; fields — колонки для csv, columns и parquet.
+    """
+    return _ENCODERS[fmt](pages, fields)
+
+
+def gzip_chunks(chunks, level=EXPORT_GZIP_LEVEL):
+    """
+    Сжатие gzip на лету. После каждого куска — sync flush, чтобы клиент получал данные сразу, а не после
+    накопления буфера компрессора.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -2,24 +2,134 @@ import os
 from datetime import datetime
 from typing import Dict
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload, HttpRequest
+from googleapiclient.errors import HttpError
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
 import pickle
 from .constants import *
+from .drive_scheduler import DriveScheduler
+from .metrics import span
+from .log_bundle import BUNDLE_MIMETYPE, parse_bundle_ref
+from .storage_backend import (
+    StorageBackend, delta_segment_name, format_log_body, log_file_name,
+    INDEX_FILENAME, INDEX_DELTA_PREFIX, LAST_ONLINE_FILENAME, TOMBSTONES_FILENAME,
+)
 import json
-import tempfile
-import uuid
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 
-INDEX_FILENAME = 'logs_index.json'
+def _bytes_media(data: bytes, mimetype):
+    return MediaIoBaseUpload(io.BytesIO(data), mimetype=mimetype)
+
+def _json_media(obj):
+    """
+    Кодирует obj в JSON по частям прямо в байтовый буфер, без промежуточной строки целиком.
+    """
+    buf = io.BytesIO()
+    writer = io.TextIOWrapper(buf, encoding='utf-8', write_through=True)
+    for chunk in json.JSONEncoder(ensure_ascii=False).iterencode(obj):
+        writer.write(chunk)
+    writer.detach()
+    buf.seek(0)
+    return MediaIoBaseUpload(buf, mimetype='application/json')
+
+def _is_not_found(e):
+    return isinstance(e, HttpError) and getattr(e.resp, 'status', None) == 404
+
+class GDriveLogger(StorageBackend):
+    ERROR_TAG = 'Google Drive ERROR'
 
-class GDriveLogger:
     def __init__(self):
+        super().__init__()
         self.creds = self.get_user_credentials()
-        self.service = build('drive', 'v3', credentials=self.creds)
-        self.root_folder_id = self._get_or_create_root_folder()
+        # httplib2.Http не потокобезопасен: у каждого потока своё keep-alive соединение,
+        # discovery-документ берётся из библиотеки, без сетевого запроса
+        self._http_local = threading.local()
+        self.service = build(
+            'drive', 'v3',
+            http=self._authorized_http(),
+            requestBuilder=self._build_request,
+            static_discovery=True,
+            cache_discovery=False
+        )
+        # Все запросы к Drive идут через планировщик: квота, повторы при 429/5xx, статистика
+        self.scheduler = DriveScheduler()
+        # Кэш id папок и файлов: 'root', 'index', 'day:YYYY-MM-DD'
+        self._id_cache = {}
+        self._id_cache_lock = threading.Lock()
+        self._id_creation_locks = {}  # ключ -> [lock, сколько потоков его держат или ждут]
+        self._get_or_create_root_folder()
+
+    def _authorized_http(self):
+        http = getattr(self._http_local, 'http', None)
+        if http is None:
+            http = AuthorizedHttp(self.creds, http=httplib2.Http(timeout=DRIVE_HTTP_TIMEOUT_SEC))
+            self._http_local.http = http
+        return http
+
+    def _build_request(self, http, *args, **kwargs):
+        return HttpRequest(self._authorized_http(), *args, **kwargs)
+
+    def _execute(self, op, request):
+        return self.scheduler.execute(op, request)
+
+    @property
+    def root_folder_id(self):
+        return self._get_or_create_root_folder()
+
+    def _cached_id(self, key, resolve):
+        """
+        Возвращает id из кэша или вычисляет его через resolve().
+        Одновременные промахи по одному ключу ждут один общий resolve(), поэтому
+        параллельные первые записи за новый день не создают дублей папок.
+        Lock ключа живёт, пока его кто-то ждёт, и удаляется последним вышедшим.
+        """
+        with self._id_cache_lock:
+            cached = self._id_cache.get(key)
+            if cached:
+                return cached
+            creation = self._id_creation_locks.get(key)
+            if creation is None:
+                creation = self._id_creation_locks[key] = [threading.Lock(), 0]
+            creation[1] += 1
+        try:
+            with creation[0]:
+                with self._id_cache_lock:
+                    cached = self._id_cache.get(key)
+                if cached:
+                    return cached
+                value = resolve()
+                with self._id_cache_lock:
+                    self._id_cache[key] = value
+                return value
+        finally:
+            with self._id_cache_lock:
+                creation[1] -= 1
+                if not creation[1]:
+                    del self._id_creation_locks[key]
+
+    def invalidate_id_cache(self):
+        with self._id_cache_lock:
+            self._id_cache.clear()
+
+    def _retry_on_not_found(self, action):
+        """
+        Выполняет action(); если Google Drive ответил 404 (папку или файл удалили вручную),
+        сбрасывает кэш id и повторяет один раз.
+        """
+        try:
+            return action()
+        except HttpError as e:
+            if not _is_not_found(e):
+                raise
+            self.invalidate_id_cache()
+            return action()
 
     def get_user_credentials(self):
         creds = None
@@ -37,8 +147,12 @@ class GDriveLogger:
         return creds
 
     def _get_or_create_root_folder(self):
+        return self._cached_id('root', self._find_or_create_root_folder)
+
+    @span('folder_lookup')
+    def _find_or_create_root_folder(self):
         query = f"name='{GOOGLE_DRIVE_FOLDER_NAME}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-        results = self.service.files().list(q=query, fields="files(id, name)").execute()
+        results = self._execute('list', self.service.files().list(q=query, fields="files(id, name)"))
         items = results.get('files', [])
         if items:
             return items[0]['id']
@@ -46,12 +160,16 @@ class GDriveLogger:
             'name': GOOGLE_DRIVE_FOLDER_NAME,
             'mimeType': 'application/vnd.google-apps.folder'
         }
-        folder = self.service.files().create(body=file_metadata, fields='id').execute()
+        folder = self._execute('create_folder', self.service.files().create(body=file_metadata, fields='id'))
         return folder.get('id')
 
     def _get_or_create_day_folder(self, date_str: str):
+        return self._cached_id(f'day:{date_str}', lambda: self._find_or_create_day_folder(date_str))
+
+    @span('folder_lookup')
+    def _find_or_create_day_folder(self, date_str: str):
         query = f"name='{date_str}' and mimeType='application/vnd.google-apps.folder' and '{self.root_folder_id}' in parents and trashed=false"
-        results = self.service.files().list(q=query, fields="files(id, name)").execute()
+        results = self._execute('list', self.service.files().list(q=query, fields="files(id, name)"))
         items = results.get('files', [])
         if items:
             return items[0]['id']
@@ -60,298 +178,322 @@ class GDriveLogger:
             'mimeType': 'application/vnd.google-apps.folder',
             'parents': [self.root_folder_id]
         }
-        folder = self.service.files().create(body=file_metadata, fields='id').execute()
+        folder = self._execute('create_folder', self.service.files().create(body=file_metadata, fields='id'))
         return folder.get('id')
 
     def _get_or_create_index_file(self):
         """
         Возвращает file_id индекс-файла logs_index.json в LogerAPI_Logs на Google Диске или создаёт его, если нет.
         """
+        return self._cached_id('index', self._find_or_create_index_file)
+
+    @span('folder_lookup')
+    def _find_or_create_index_file(self):
         # Убедиться, что корневая папка существует
         root_folder_id = self._get_or_create_root_folder()
         query = f"name='{INDEX_FILENAME}' and '{root_folder_id}' in parents and trashed=false"
-        results = self.service.files().list(q=query, fields="files(id, name)").execute()
+        results = self._execute('list', self.service.files().list(q=query, fields="files(id, name)"))
         items = results.get('files', [])
         if items:
             return items[0]['id']
         # Создать пустой индекс-файл именно в LogerAPI_Logs
-        tmpfile = tempfile.NamedTemporaryFile(delete=False, suffix='.json')
         try:
-            with open(tmpfile.name, 'w', encoding='utf-8') as f:
-                json.dump([], f)
             file_metadata = {
                 'name': INDEX_FILENAME,
                 'parents': [root_folder_id],
                 'mimeType': 'application/json'
             }
-            media = MediaFileUpload(tmpfile.name, mimetype='application/json')
-            file = self.service.files().create(body=file_metadata, media_body=media, fields='id').execute()
+            media = _json_media([])
+            file = self._execute('create_index', self.service.files().create(
+                body=file_metadata, media_body=media, fields='id'
+            ))
             return file.get('id')
         except Exception as e:
             print(f'[Google Drive ERROR]: Не удалось создать индекс-файл: {e}')
             raise
-        finally:
-            try:
-                os.remove(tmpfile.name)
-            except Exception:
-                pass
 
-    def log(self, data: Dict):
-        date_str = datetime.now().strftime(DATE_FORMAT)
-        folder_id = self._get_or_create_day_folder(date_str)
-        # Исправление: убираем двоеточие и пробелы из received_at для имени файла
-        safe_received_at = data['received_at'].replace(':', '-').replace(' ', '_')
-        filename = f"{data['filename']}_{safe_received_at}{LOG_FILE_EXTENSION}"
-        local_path = f"/tmp/{filename}"
-        with open(local_path, 'w', encoding='utf-8') as f:
-            for k, v in data.items():
-                f.write(f"{k}: {v}\n")
+    def _create_in_day_folder(self, date_str, filename, media):
         file_metadata = {
             'name': filename,
-            'parents': [folder_id]
+            'parents': [self._get_or_create_day_folder(date_str)]
         }
-        media = MediaFileUpload(local_path, mimetype='text/plain')
-        try:
-            self.service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        except Exception as e:
-            print(f"[Google Drive ERROR]: {e}")
-        finally:
-            # Исправление: безопасное удаление файла (ждём, пока файл не освободится)
-            import time
-            for _ in range(10):
-                try:
-                    os.remove(local_path)
-                    break
-                except PermissionError:
-                    time.sleep(0.1)
-            else:
-                print(f"[Google Drive ERROR]: Не удалось удалить временный файл {local_path}")
+        return self._execute('create_log', self.service.files().create(
+            body=file_metadata, media_body=media, fields='id'
+        ))
 
+    @span('upload')
     def log_and_return_id(self, data: Dict):
         date_str = datetime.now().strftime(DATE_FORMAT)
-        folder_id = self._get_or_create_day_folder(date_str)
-        safe_received_at = data['received_at'].replace(':', '-').replace(' ', '_')
-        filename = f"{data['filename']}_{safe_received_at}{LOG_FILE_EXTENSION}"
-        local_path = f"/tmp/{filename}"
-        with open(local_path, 'w', encoding='utf-8') as f:
-            for k, v in data.items():
-                f.write(f"{k}: {v}\n")
-        file_metadata = {
-            'name': filename,
-            'parents': [folder_id]
-        }
-        media = MediaFileUpload(local_path, mimetype='text/plain')
+        media = _bytes_media(format_log_body(data), 'text/plain')
         file_id = None
         try:
-            file = self.service.files().create(body=file_metadata, media_body=media, fields='id').execute()
+            file = self._retry_on_not_found(lambda: self._create_in_day_folder(date_str, log_file_name(data), media))
             file_id = file.get('id')
         except Exception as e:
             print(f"[Google Drive ERROR]: {e}")
-        finally:
-            import time
-            for _ in range(10):
-                try:
-                    os.remove(local_path)
-                    break
-                except PermissionError:
-                    time.sleep(0.1)
-            else:
-                print(f"[Google Drive ERROR]: Не удалось удалить временный файл {local_path}")
         return file_id
 
-    def list_all_logs(self):
+    @span('upload')
+    def upload_bundle(self, name, data: bytes):
         """
-        Возвращает список всех лог-файлов (метаданные) из всех папок-дней в корневой папке.
+        Выгружает пачку логов (см. app/log_bundle.py) в папку текущего дня и возвращает её id.
+        Ошибки пробрасываются: записи пачки остаются в буфере BundleWriter.
+        """
+        date_str = datetime.now().strftime(DATE_FORMAT)
+        media = _bytes_media(data, BUNDLE_MIMETYPE)
+        file = self._retry_on_not_found(lambda: self._create_in_day_folder(date_str, name, media))
+        return file.get('id')
+
+    def _list_request(self, query, fields, page_token=None):
+        return self.service.files().list(
+            q=query, fields=f"nextPageToken, files({fields})", pageSize=1000, pageToken=page_token
+        )
+
+    def _list_files(self, query, fields='id, name', page_token=None):
+        """
+        Все файлы по запросу с учётом пагинации (files().list отдаёт не больше pageSize за раз).
+        page_token — продолжить с указанной страницы.
         """
-        # Получаем все папки-даты
+        while True:
+            results = self._execute('list', self._list_request(query, fields, page_token))
+            yield from results.get('files', [])
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+    def list_day_folders(self):
         query = f"'{self.root_folder_id}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
-        day_folders = self.service.files().list(q=query, fields="files(id, name)").execute().get('files', [])
-        all_logs = []
-        for folder in day_folders:
-            folder_id = folder['id']
-            date_str = folder['name']
-            # Получаем все .txt файлы в папке-дне
-            q = f"'{folder_id}' in parents and mimeType='text/plain' and trashed=false"
-            files = self.service.files().list(q=q, fields="files(id, name)").execute().get('files', [])
-            for f in files:
-                all_logs.append({
-                    'id': f['id'],
-                    'name': f['name'],
-                    'date': date_str
-                })
-        return all_logs
+        return list(self._list_files(query))
 
-    def download_log_file(self, file_id, local_path):
+    def list_folder_logs(self, folder):
         """
-        Скачивает файл с Google Drive по file_id в local_path.
+        Лог-файлы и пачки логов одной папки-дня: [{'id', 'name', 'date'}].
         """
-        from googleapiclient.http import MediaIoBaseDownload
-        import io
+        q = (f"'{folder['id']}' in parents and (mimeType='text/plain' or mimeType='{BUNDLE_MIMETYPE}') "
+             f"and trashed=false")
+        return [{'id': f['id'], 'name': f['name'], 'date': folder['name']} for f in self._list_files(q)]
+
+    def list_all_logs(self, workers=REBUILD_LIST_WORKERS):
+        """
+        Возвращает список всех лог-файлов (метаданные) из всех папок-дней в корневой папке.
+        Папки перебираются параллельно, каждая — постранично.
+        """
+        folders = self.list_day_folders()
+        all_logs = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for files in pool.map(self.list_folder_logs, folders):
+                all_logs.extend(files)
+        return all_logs
+
+    def _download_to(self, file_id, fh):
         request = self.service.files().get_media(fileId=file_id)
-        fh = io.FileIO(local_path, 'wb')
         downloader = MediaIoBaseDownload(fh, request)
         done = False
         while not done:
-            status, done = downloader.next_chunk()
-        fh.close()
-
-    def parse_log_file(self, local_path):
-        """
-        Парсит локальный лог-файл в dict. Приводит duration, size, queue_time, process_time к числам.
-        """
-        data = {}
-        with open(local_path, encoding='utf-8') as f:
-            for line in f:
-                if ':' in line:
-                    k, v = line.strip().split(':', 1)
-                    data[k.strip()] = v.strip()
-        # Приведение типов
-        for key in ["duration", "queue_time", "process_time"]:
-            if key in data:
-                try:
-                    data[key] = float(data[key])
-                except Exception:
-                    data[key] = 0.0
-        if "size" in data:
-            try:
-                data["size"] = int(data["size"])
-            except Exception:
-                data["size"] = 0
-        return data
+            status, done = self.scheduler.call('download', lambda: downloader.next_chunk(num_retries=0))
 
+    def download_bytes(self, file_id) -> bytes:
+        """
+        Скачивает файл с Google Drive по file_id в память.
+        """
+        buf = io.BytesIO()
+        self._download_to(file_id, buf)
+        return buf.getvalue()
+
+    def download_range(self, file_id, offset, length) -> bytes:
+        """
+        Скачивает length байт файла начиная с offset (HTTP Range).
+        """
+        request = self.service.files().get_media(fileId=file_id)
+        request.headers['Range'] = f'bytes={offset}-{offset + length - 1}'
+        return self._execute('download_range', request)
+
+    def _download_json(self, file_id):
+        buf = io.BytesIO()
+        self._download_to(file_id, buf)
+        buf.seek(0)
+        return json.load(io.TextIOWrapper(buf, encoding='utf-8'))
+
+    @span('delete')
     def delete_log_file(self, file_id):
         """
         Удаляет файл с Google Drive по file_id.
+        Запись из пачки только помечается удалённой: остальные записи пачки остаются на месте.
         """
+        if parse_bundle_ref(file_id) is not None:
+            self.delete_bundle_record(file_id)
+            return
         try:
-            self.service.files().delete(fileId=file_id).execute()
+            self._execute('delete', self.service.files().delete(fileId=file_id))
         except Exception as e:
             print(f"[Google Drive ERROR]: Не удалось удалить файл {file_id}: {e}")
 
-    def load_index(self):
+    @span('delete')
+    def delete_files(self, file_ids):
         """
-        Загружает и возвращает список логов из индекс-файла.
+        Удаляет файлы пачками через batch-запросы. Уже удалённые (404) считаются удалёнными.
+        Возвращает список file_id, которые удалить не удалось.
         """
-        file_id = self._get_or_create_index_file()
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.json') as tmpfile:
-            local_path = tmpfile.name
-        try:
-            self.download_log_file(file_id, local_path)
-            with open(local_path, encoding='utf-8') as f:
-                return json.load(f)
-        except Exception:
-            return []
-        finally:
-            try:
-                os.remove(local_path)
-            except Exception:
-                pass
+        results = self.scheduler.batch('delete', self.service.new_batch_http_request, {
+            file_id: (lambda file_id=file_id: self.service.files().delete(fileId=file_id))
+            for file_id in file_ids
+        })
+        failed = []
+        for file_id, (_, error) in results.items():
+            if error is not None and not _is_not_found(error):
+                print(f"[Google Drive ERROR]: Не удалось удалить файл {file_id}: {error}")
+                failed.append(file_id)
+        return failed
+
+    def _index_meta(self):
+        return self._retry_on_not_found(lambda: self._execute('get_meta', self.service.files().get(
+            fileId=self._get_or_create_index_file(), fields='id, modifiedTime'
+        )))
+
+    def _read_base_index(self):
+        return self._retry_on_not_found(lambda: self._download_json(self._get_or_create_index_file()))
 
+    def _read_index_delta(self, file_id):
+        return self._download_json(file_id)
+
+    @span('index_save')
     def save_index(self, index_data):
         """
         Сохраняет index_data (list) в индекс-файл на Google Drive.
         """
-        file_id = self._get_or_create_index_file()
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.json') as tmpfile:
-            local_path = tmpfile.name
-        try:
-            with open(local_path, 'w', encoding='utf-8') as f:
-                json.dump(index_data, f, ensure_ascii=False)
-            media = MediaFileUpload(local_path, mimetype='application/json')
-            self.service.files().update(fileId=file_id, media_body=media).execute()
-        finally:
-            try:
-                os.remove(local_path)
-            except Exception:
-                pass
+        media = _json_media(index_data)
+        file = self._retry_on_not_found(lambda: self._execute('update_index', self.service.files().update(
+            fileId=self._get_or_create_index_file(), media_body=media, fields='id, modifiedTime'
+        )))
+        self.advance_index_cursor(file.get('modifiedTime'))
+        return file.get('modifiedTime')
 
-    def add_log_to_index(self, log_entry):
-        index = self.load_index()
-        index.append(log_entry)
-        self.save_index(index)
+    def _delta_query(self, since):
+        query = f"name contains '{INDEX_DELTA_PREFIX}' and '{self.root_folder_id}' in parents and trashed=false"
+        if since:
+            query += f" and modifiedTime > '{since}'"
+        return query
 
-    def remove_log_from_index(self, file_id):
-        index = self.load_index()
-        index = [item for item in index if item.get('file_id') != file_id]
-        self.save_index(index)
+    def list_index_deltas(self, since=None):
+        """
+        Возвращает дельта-сегменты индекса (id, name, modifiedTime) в порядке создания;
+        since — только изменённые после этого modifiedTime.
+        """
+        segments = list(self._list_files(self._delta_query(since), fields='id, name, modifiedTime'))
+        segments.sort(key=lambda f: f['name'])
+        return segments
 
-    def sync_index_with_drive(self):
+    def _index_meta_and_deltas(self, since):
         """
-        Проверяет наличие и целостность logs_index.json на Google Диске, если повреждён или отсутствует — пересоздаёт.
+        Метаданные logs_index.json и первая страница новых дельта-сегментов одним batch-запросом.
+        При ошибке — те же запросы по отдельности (с повтором после сброса кэша id при 404).
         """
-        try:
-            file_id = self._get_or_create_index_file()
-            # Пробуем скачать и прочитать файл
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.json') as tmpfile:
-                local_path = tmpfile.name
-            try:
-                self.download_log_file(file_id, local_path)
-                with open(local_path, encoding='utf-8') as f:
-                    json.load(f)  # Проверка на валидность
-            except Exception as e:
-                print(f'[Google Drive ERROR]: Индекс-файл повреждён, пересоздаём: {e}')
-                self.save_index([])  # Пересоздать пустой
-            finally:
-                try:
-                    os.remove(local_path)
-                except Exception:
-                    pass
-        except Exception as e:
-            print(f'[Google Drive ERROR]: Не удалось синхронизировать индекс-файл: {e}')
+        query = self._delta_query(since)
+        fields = 'id, name, modifiedTime'
+        index_id = self._get_or_create_index_file()
+        results = self.scheduler.batch('index_changes', self.service.new_batch_http_request, {
+            'meta': lambda: self.service.files().get(fileId=index_id, fields='id, modifiedTime'),
+            'deltas': lambda: self._list_request(query, fields),
+        })
+        (meta, meta_error), (page, page_error) = results['meta'], results['deltas']
+        if meta_error is not None or page_error is not None:
+            return self._index_meta(), self.list_index_deltas(since=since)
+        segments = page.get('files', [])
+        if page.get('nextPageToken'):
+            segments.extend(self._list_files(query, fields=fields, page_token=page['nextPageToken']))
+        segments.sort(key=lambda f: f['name'])
+        return meta, segments
 
-    def ensure_index_consistency(self):
+    @span('index_delta_save')
+    def append_index_delta(self, ops):
         """
-        Гарантирует, что индекс-файл на Google Диске существует и валиден при запуске.
+        Записывает пачку изменений индекса отдельным дельта-сегментом.
+        Стоимость записи зависит только от размера пачки, а не от размера индекса.
         """
-        self.sync_index_with_drive()
+        name = delta_segment_name()
+        media = _json_media(ops)
+        file = self._retry_on_not_found(lambda: self._execute('create_delta', self.service.files().create(
+            body={'name': name, 'parents': [self.root_folder_id], 'mimeType': 'application/json'},
+            media_body=media, fields='id, modifiedTime'
+        )))
+        self.advance_index_cursor(file.get('modifiedTime'))
+        return file.get('id')
+
+    def _tombstones_file_id(self):
+        return self._cached_id('tombstones', self._find_or_create_tombstones_file)
+
+    def _find_or_create_tombstones_file(self):
+        file_id = self.find_file_id_by_name(TOMBSTONES_FILENAME)
+        if file_id:
+            return file_id
+        file_metadata = {
+            'name': TOMBSTONES_FILENAME,
+            'parents': [self.root_folder_id],
+            'mimeType': 'application/json'
+        }
+        return self._execute('create_file', self.service.files().create(
+            body=file_metadata, media_body=_json_media([]), fields='id'
+        )).get('id')
+
+    def _read_tombstones(self):
+        return self._retry_on_not_found(lambda: self._download_json(self._tombstones_file_id()))
+
+    def _write_tombstones(self, refs):
+        media = _json_media(refs)
+        self._retry_on_not_found(lambda: self._execute('update_tombstones', self.service.files().update(
+            fileId=self._tombstones_file_id(), media_body=media
+        )))
 
     def save_last_online(self, dt_str):
         """
         Сохраняет время последнего онлайна в файл last_online.txt в ту же папку, что и logs_index.json
         """
-        import tempfile
-        from googleapiclient.http import MediaFileUpload
-        # Получаем parent folder id из index-файла
-        index_file_id = self.find_file_id_by_name('logs_index.json')
-        parent_id = None
-        if index_file_id:
-            file = self.drive_service.files().get(fileId=index_file_id, fields='parents').execute()
-            parents = file.get('parents', [])
-            if parents:
-                parent_id = parents[0]
+        media = _bytes_media(dt_str.encode('utf-8'), 'text/plain')
+        self._retry_on_not_found(lambda: self._execute('update_last_online', self.service.files().update(
+            fileId=self._cached_id('last_online', self._find_or_create_last_online_file),
+            media_body=media
+        )))
+
+    def _find_or_create_last_online_file(self):
+        file_id = self.find_file_id_by_name(LAST_ONLINE_FILENAME)
+        if file_id:
+            return file_id
         file_metadata = {
-            'name': 'last_online.txt',
+            'name': LAST_ONLINE_FILENAME,
+            'parents': [self.root_folder_id],
             'mimeType': 'text/plain'
         }
-        if parent_id:
-            file_metadata['parents'] = [parent_id]
-        # Сохраняем строку во временный файл
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.txt', mode='w', encoding='utf-8') as tmpfile:
-            tmpfile.write(dt_str)
-            local_path = tmpfile.name
-        media = MediaFileUpload(local_path, mimetype='text/plain')
-        file_id = self.find_file_id_by_name('last_online.txt')
-        try:
-            if file_id:
-                self.drive_service.files().update(
-                    fileId=file_id,
-                    media_body=media
-                ).execute()
-            else:
-                self.drive_service.files().create(
-                    body=file_metadata,
-                    media_body=media
-                ).execute()
-        finally:
-            try:
-                os.remove(local_path)
-            except Exception:
-                pass
+        return self._execute('create_file', self.service.files().create(body=file_metadata, fields='id')).get('id')
+
+    def stats(self):
+        return self.scheduler.stats()
 
     def find_file_id_by_name(self, filename):
         """
-        Возвращает file_id файла по имени, если найден, иначе None
+        Возвращает file_id файла по имени в корневой папке, если найден, иначе None
         """
-        results = self.drive_service.files().list(q=f"name='{filename}' and trashed=false", fields="files(id)").execute()
+        query = f"name='{filename}' and '{self.root_folder_id}' in parents and trashed=false"
+        results = self._execute('list', self.service.files().list(q=query, fields="files(id)"))
         files = results.get('files', [])
         return files[0]['id'] if files else None
+
+
+_logger_instance = None
+_logger_lock = threading.Lock()
+
+def get_logger():
+    """
+    Возвращает единственный на процесс GDriveLogger, создавая его при первом обращении.
+    """
+    global _logger_instance
+    if _logger_instance is None:
+        with _logger_lock:
+            if _logger_instance is None:
+                _logger_instance = GDriveLogger()
+    return _logger_instance
+
+def drive_stats():
+    """
+    Статистика запросов к Google Drive по операциям; пусто, пока GDriveLogger не создан.
+    """
+    return _logger_instance.stats() if _logger_instance is not None else {}
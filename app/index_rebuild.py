@@ -0,0 +1,198 @@
+"""
+Пересборка logs_index.json по самим лог-файлам на Google Drive.
+
+Нужна, когда индекс-файл повреждён или потерян: лог-файлы и пачки логов в папках-днях содержат
+все поля записи индекса (кроме file_id, это id самого файла или диапазон байт в пачке).
+Записи пачек, удалённые через DELETE /log (bundle_tombstones.json), в индекс не возвращаются.
+Папки листаются параллельно и постранично, файлы скачиваются и разбираются пулом потоков.
+Уже разобранные записи пишутся в журнал REBUILD_STATE_PATH, прерванная пересборка
+при следующем запуске продолжается с того же места.
+
+Запуск из корня проекта при остановленном сервисе:
+    python -m app.index_rebuild --workers 16
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .constants import *
+from .text_cache import TextCache
+from .log_bundle import BUNDLE_SUFFIX, bundle_ref, iter_bundle, source_file_id
+
+INDEX_FIELDS = ('filename', 'duration', 'size', 'received_at', 'queue_time', 'process_time')
+
+
+def entry_from_log(data, file_id):
+    """
+    Разобранный лог-файл -> запись индекса без текста; None, если в файле нет обязательных полей.
+    """
+    if not data.get('filename') or not data.get('received_at'):
+        return None
+    entry = {key: data[key] for key in data if key not in ('text', 'local_id', 'file_id')}
+    for key in INDEX_FIELDS:
+        entry.setdefault(key, 0 if key == 'size' else 0.0)
+    local_id = data.get('local_id')
+    entry['local_id'] = local_id if local_id and local_id != 'None' else None
+    entry['file_id'] = file_id
+    return entry
+
+
+def load_journal(path):
+    """
+    Записи, уже разобранные прерванной пересборкой: {file_id: запись}.
+    """
+    done = {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Последняя строка могла не дописаться
+                    continue
+                done[entry['file_id']] = entry
+    except OSError:
+        pass
+    return done
+
+
+def unshipped_entries(logger, segments):
+    """
+    Записи из дельта-сегментов без file_id: лог-файла для них нет, текст хранится только в индексе.
+    """
+    entries = []
+    for segment in segments:
+        for op in logger.load_index_delta(segment['id']):
+            entry = op.get('entry') or {}
+            if op.get('op') == 'add' and not entry.get('file_id'):
+                entries.append(entry)
+    return entries
+
+
+class _Progress:
+    def __init__(self, total, interval):
+        self.total = total
+        self.done = 0
+        self.errors = 0
+        self._interval = interval
+        self._started = time.monotonic()
+        self._printed = self._started
+
+    def step(self, ok):
+        self.done += 1
+        self.errors += not ok
+        now = time.monotonic()
+        if now - self._printed < self._interval and self.done < self.total:
+            return
+        self._printed = now
+        rate = self.done / max(now - self._started, 1e-9)
+        eta = (self.total - self.done) / rate if rate else 0
+        print(f'[Index rebuild]: {self.done}/{self.total} файлов, ошибок {self.errors}, '
+              f'{rate:.1f} файл/сек, осталось ~{eta:.0f} сек')
+
+
+def rebuild_index(logger, workers=REBUILD_DOWNLOAD_WORKERS, state_path=REBUILD_STATE_PATH,
+                  resume=True, dry_run=False, text_cache=None, progress_interval=REBUILD_PROGRESS_SEC):
+    """
+    Собирает индекс заново по лог-файлам и сохраняет его вместо logs_index.json.
+    Дельта-сегменты, существовавшие до начала, удаляются: их записи с file_id есть в лог-файлах,
+    а записи без file_id переносятся в новый индекс как есть.
+    text_cache — если задан, тексты скачанных логов сразу кладутся в локальный кэш текстов.
+    Возвращает собранный список логов.
+    """
+    segments = logger.list_index_deltas()
+    unshipped = unshipped_entries(logger, segments)
+    tombstones = logger.load_bundle_tombstones()
+    files = logger.list_all_logs()
+    print(f'[Index rebuild]: найдено {len(files)} лог-файлов, дельта-сегментов {len(segments)}')
+    done = load_journal(state_path) if resume else {}
+    known = {f['id'] for f in files}
+    # Файлы, удалённые после прерванного запуска, в индекс не возвращаем
+    done = {file_id: entry for file_id, entry in done.items()
+            if source_file_id(file_id) in known and file_id not in tombstones}
+    parsed = {source_file_id(file_id) for file_id in done}
+    pending = [f for f in files if f['id'] not in parsed]
+    if done:
+        print(f'[Index rebuild]: продолжение, уже разобрано {len(done)}')
+
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    journal_lock = threading.Lock()
+    skipped = []
+
+    def parse(file):
+        body = logger.download_bytes(file['id'])
+        if file['name'].endswith(BUNDLE_SUFFIX):
+            # Пачка: каждая запись — отдельный gzip-член, file_id записи указывает на её диапазон байт
+            records = [(record, bundle_ref(file['id'], offset, length)) for offset, length, record in iter_bundle(body)]
+            return [(record, file_id) for record, file_id in records if file_id not in tombstones]
+        return [(logger.parse_log_text(body.decode('utf-8')), file['id'])]
+
+    def fetch(file):
+        entries = []
+        for data, file_id in parse(file):
+            entry = entry_from_log(data, file_id)
+            if entry is None:
+                skipped.append(file_id)
+                continue
+            if text_cache is not None:
+                text_cache.seed(entry['local_id'] or file_id, data.get('text'))
+            entries.append(entry)
+        # Файл попадает в журнал целиком, чтобы при продолжении его не скачивать повторно
+        with journal_lock:
+            for entry in entries:
+                journal.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return entries
+
+    progress = _Progress(len(pending), progress_interval)
+    with open(state_path, 'a' if resume else 'w', encoding='utf-8') as journal, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch, f): f for f in pending}
+        for future in as_completed(futures):
+            try:
+                entries = future.result()
+            except Exception as e:
+                print(f"[Google Drive ERROR]: Не удалось разобрать лог-файл {futures[future]['name']}: {e}")
+                progress.step(False)
+                continue
+            for entry in entries:
+                done[entry['file_id']] = entry
+            progress.step(True)
+    failed = progress.errors
+    if skipped:
+        print(f'[Index rebuild]: пропущено {len(skipped)} файлов без filename/received_at')
+    index = sorted(done.values(), key=lambda e: e.get('received_at') or '') + unshipped
+    if failed:
+        # Журнал остаётся: повторный запуск докачает только то, что не удалось
+        raise RuntimeError(f'не удалось разобрать {failed} файлов, повторите запуск для продолжения')
+    if dry_run:
+        print(f'[Index rebuild]: собрано {len(index)} записей (dry run, индекс не сохранён)')
+        return index
+    logger.save_index(index)
+    logger.delete_files([segment['id'] for segment in segments])
+    try:
+        os.remove(state_path)
+    except OSError:
+        pass
+    print(f'[Index rebuild]: индекс сохранён, {len(index)} записей')
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=REBUILD_DOWNLOAD_WORKERS, help='параллельных скачиваний')
+    parser.add_argument('--state', default=REBUILD_STATE_PATH, help='журнал для продолжения')
+    parser.add_argument('--no-resume', action='store_true', help='начать заново, игнорируя журнал')
+    parser.add_argument('--dry-run', action='store_true', help='собрать индекс, но не сохранять его')
+    parser.add_argument('--seed-texts', action='store_true', help='сохранить тексты логов в локальный кэш')
+    args = parser.parse_args()
+    from .storage_backend import get_storage
+    rebuild_index(
+        get_storage(), workers=args.workers, state_path=args.state, resume=not args.no_resume,
+        dry_run=args.dry_run, text_cache=TextCache(loader=None) if args.seed_texts else None,
+    )
+
+
+if __name__ == '__main__':
+    main()
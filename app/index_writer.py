@@ -0,0 +1,93 @@
+import threading
+from .constants import *
+
+
+class IndexWriter:
+    """
+    Накапливает изменения индекс-файла и сбрасывает их на Google Drive одной пачкой
+    (по таймеру или при достижении размера пачки) в виде дельта-сегмента.
+    После INDEX_COMPACT_AFTER_SEGMENTS сегментов запускает уплотнение в фоне.
+    on_flush(ops), если задан, вызывается после успешной записи пачки операций.
+    """
+    def __init__(self, get_logger, flush_interval=INDEX_FLUSH_INTERVAL_SEC,
+                 max_batch=INDEX_FLUSH_MAX_OPS, compact_after=INDEX_COMPACT_AFTER_SEGMENTS, on_flush=None):
+        self._get_logger = get_logger
+        self._on_flush = on_flush
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        self._compact_after = compact_after
+        self._pending = []
+        self._lock = threading.Lock()
+        # Сериализует сбросы и уплотнение: в процессе один писатель индекса
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._segments = 0
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='index-writer', daemon=True)
+        self._thread.start()
+
+    def add(self, log_entry):
+        self._submit({'op': 'add', 'entry': dict(log_entry)})
+
+    def remove(self, file_id):
+        self._submit({'op': 'remove', 'file_id': file_id})
+
+    def _submit(self, op):
+        with self._lock:
+            self._pending.append(op)
+            full = len(self._pending) >= self._max_batch
+        if full:
+            self._wakeup.set()
+
+    def note_existing_segments(self, count):
+        """
+        Учитывает сегменты, уже лежащие на Google Drive при старте, чтобы уплотнение не откладывалось.
+        """
+        with self._flush_lock:
+            self._segments = max(self._segments, count)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Записывает все накопленные операции одним дельта-сегментом.
+        При ошибке операции возвращаются в начало очереди и уйдут со следующим сбросом.
+        """
+        with self._flush_lock:
+            with self._lock:
+                ops, self._pending = self._pending, []
+            if not ops:
+                return 0
+            try:
+                logger = self._get_logger()
+                logger.append_index_delta(ops)
+            except Exception as e:
+                print(f'[Google Drive ERROR]: Не удалось записать изменения индекса: {e}')
+                with self._lock:
+                    self._pending[:0] = ops
+                return 0
+            if self._on_flush is not None:
+                try:
+                    self._on_flush(ops)
+                except Exception as e:
+                    print(f'[Index writer ERROR]: Ошибка обработчика записи индекса: {e}')
+            self._segments += 1
+            if self._segments >= self._compact_after:
+                try:
+                    logger.compact_index()
+                    self._segments = 0
+                except Exception as e:
+                    print(f'[Google Drive ERROR]: Не удалось уплотнить индекс: {e}')
+            return len(ops)
@@ -0,0 +1,115 @@
+import queue
+import threading
+import time
+from .constants import *
+
+
+class IngestQueue:
+    """
+    Ограниченная очередь приёма логов с пулом фоновых воркеров.
+    POST /log только кладёт запись в очередь, выгрузка на Google Drive идёт в фоне.
+    on_change(stats), если задан, вызывается после каждого изменения глубины очереди.
+    """
+    def __init__(self, handler, maxsize=INGEST_QUEUE_MAXSIZE, workers=INGEST_WORKERS, on_change=None):
+        self._handler = handler
+        self._on_change = on_change
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._maxsize = maxsize
+        self._workers_count = workers
+        self._workers = []
+        # key -> время постановки в очередь (порядок вставки = порядок поступления)
+        self._pending = {}
+        self._reserved = set()  # ключи, которые принимаются прямо сейчас и вот-вот попадут в очередь
+        self._pending_lock = threading.Lock()
+        self._processed = 0
+        self._failed = 0
+
+    def start(self):
+        if self._workers:
+            return
+        for i in range(self._workers_count):
+            t = threading.Thread(target=self._worker, name=f'ingest-worker-{i}', daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def submit(self, key, item):
+        """
+        Ставит запись в очередь. Возвращает False, если очередь заполнена.
+        """
+        with self._pending_lock:
+            self._pending[key] = time.monotonic()
+        try:
+            self._queue.put_nowait((key, item))
+        except queue.Full:
+            with self._pending_lock:
+                self._pending.pop(key, None)
+            return False
+        self._notify()
+        return True
+
+    def _notify(self):
+        if self._on_change is None:
+            return
+        try:
+            self._on_change(self.stats())
+        except Exception as e:
+            print(f"[Ingest queue ERROR]: Ошибка обработчика изменения очереди: {e}")
+
+    def _worker(self):
+        while True:
+            key, item = self._queue.get()
+            try:
+                ok = self._handler(item)
+            except Exception as e:
+                print(f"[Google Drive ERROR]: Ошибка фоновой выгрузки лога: {e}")
+                ok = False
+            with self._pending_lock:
+                self._pending.pop(key, None)
+                if ok is False:
+                    self._failed += 1
+                else:
+                    self._processed += 1
+            self._notify()
+            self._queue.task_done()
+
+    def reserve(self, keys):
+        """
+        Отмечает ключи, которые сейчас принимаются: до release() contains() считает их стоящими в очереди.
+        """
+        with self._pending_lock:
+            self._reserved.update(keys)
+
+    def release(self, keys):
+        with self._pending_lock:
+            self._reserved.difference_update(keys)
+
+    def contains(self, key):
+        """
+        Стоит ли запись с этим ключом в очереди, обрабатывается воркером или зарезервирована (reserve).
+        """
+        with self._pending_lock:
+            return key in self._pending or key in self._reserved
+
+    def join(self):
+        """
+        Ждёт, пока все поставленные записи будут обработаны.
+        """
+        self._queue.join()
+
+    def stats(self):
+        """
+        Глубина очереди и задержка (возраст самой старой необработанной записи) в секундах.
+        """
+        with self._pending_lock:
+            depth = len(self._pending)
+            oldest = next(iter(self._pending.values()), None)
+            processed = self._processed
+            failed = self._failed
+        lag = time.monotonic() - oldest if oldest is not None else 0.0
+        return {
+            'depth': depth,
+            'maxsize': self._maxsize,
+            'lag': round(lag, 3),
+            'processed': processed,
+            'failed': failed,
+        }
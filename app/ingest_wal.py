@@ -0,0 +1,300 @@
+import json
+import os
+import re
+import threading
+from .constants import *
+
+_SEGMENT_RE = re.compile(r'^wal-(\d{8})\.log$')
+
+
+class IngestWAL:
+    """
+    Локальный журнал приёма логов (write-ahead log): запись попадает на диск (fsync)
+    до ответа на POST /log, поэтому сбой Google Drive или перезапуск сервиса её не теряют.
+
+    Журнал — файлы-сегменты wal-NNNNNNNN.log, по одной JSON-записи в строке:
+      {"op": "put", "id": local_id, "entry": ..., "text": ...} — принят лог;
+      {"op": "shipped", "id": local_id, "file_id": ...} — лог-файл выгружен на Google Drive;
+      {"op": "done", "id": local_id} — запись попала в индекс, лог больше не нужен журналу;
+      {"op": "drop", "id": local_id} — лог отклонён или удалён до выгрузки.
+    Сегмент сменяется после WAL_SEGMENT_BYTES; самые старые сегменты без незавершённых логов удаляются,
+    а если закрытых сегментов больше WAL_COMPACT_SEGMENTS и в них завершено больше половины логов,
+    незавершённые логи переписываются в текущий сегмент и закрытые сегменты удаляются.
+    Параллельные fsync объединяются: один вызов покрывает все записи, дописанные к этому моменту.
+    """
+    def __init__(self, path=WAL_DIR, segment_bytes=WAL_SEGMENT_BYTES, compact_segments=WAL_COMPACT_SEGMENTS):
+        self._dir = path
+        self._segment_bytes = segment_bytes
+        self._compact_segments = compact_segments
+        self._cond = threading.Condition()
+        # local_id -> {'segment', 'offset' (строка put), 'file_id'}; тексты в памяти не держим
+        self._pending = {}
+        self._live = {}  # номер сегмента -> local_id его незавершённых логов
+        self._puts = {}  # номер сегмента -> сколько логов в него записано
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self._segment = None  # номер текущего сегмента, в который идёт запись
+        os.makedirs(path, exist_ok=True)
+        self._recover()
+        self._open_segment(max(self._live, default=0) + 1)
+
+    def _segment_path(self, segment):
+        return os.path.join(self._dir, f'wal-{segment:08d}.log')
+
+    def _recover(self):
+        segments = sorted(int(m.group(1)) for m in map(_SEGMENT_RE.match, os.listdir(self._dir)) if m)
+        for segment in segments:
+            self._live.setdefault(segment, set())
+            with open(self._segment_path(segment), 'rb') as f:
+                offset = 0
+                for line in f:
+                    start, offset = offset, offset + len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Недописанная строка в конце сегмента при аварийной остановке
+                        continue
+                    self._replay(record, segment, start)
+        self._collect()
+
+    def _replay(self, record, segment, offset):
+        local_id = record.get('id')
+        op = record.get('op')
+        if op == 'put':
+            # Повторный put — копия, перенесённая уплотнением; старый сегмент больше не нужен
+            previous = self._pending.get(local_id)
+            if previous is not None:
+                self._live[previous['segment']].discard(local_id)
+            self._pending[local_id] = {'segment': segment, 'offset': offset, 'file_id': record.get('file_id')}
+            self._live[segment].add(local_id)
+            self._puts[segment] = self._puts.get(segment, 0) + 1
+        elif local_id in self._pending:
+            if op == 'shipped':
+                self._pending[local_id]['file_id'] = record.get('file_id')
+            elif op in ('done', 'drop'):
+                state = self._pending.pop(local_id)
+                self._live[state['segment']].discard(local_id)
+
+    def _collect(self):
+        # Удаляются только самые старые сегменты: отметки done/drop лежат в том же или более новом
+        # сегменте, чем их put, поэтому удаление "с начала" не может воскресить завершённый лог
+        while self._live:
+            oldest = min(self._live)
+            if oldest == self._segment or self._live[oldest]:
+                return
+            self._remove_segment(oldest)
+
+    def _remove_segment(self, segment):
+        self._live.pop(segment, None)
+        self._puts.pop(segment, None)
+        try:
+            os.remove(self._segment_path(segment))
+        except OSError as e:
+            print(f'[WAL ERROR]: Не удалось удалить сегмент журнала {segment}: {e}')
+
+    def _open_segment(self, segment):
+        self._segment = segment
+        self._live.setdefault(segment, set())
+        self._file = open(self._segment_path(segment), 'ab')
+        self._offset = self._file.tell()
+
+    def _write(self, record):
+        # Вызывается под self._cond
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        offset = self._offset
+        self._file.write(line)
+        self._offset += len(line)
+        self._written += 1
+        return offset
+
+    def _sync(self):
+        # Вызывается под self._cond; ждёт, пока на диск попадёт всё записанное к этому моменту
+        target = self._written
+        while self._synced < target:
+            if self._syncing:
+                self._cond.wait()
+                continue
+            self._syncing = True
+            upto = self._written
+            f = self._file
+            f.flush()
+            self._cond.release()
+            try:
+                os.fsync(f.fileno())
+            finally:
+                self._cond.acquire()
+                self._syncing = False
+                self._synced = max(self._synced, upto)
+                self._cond.notify_all()
+
+    def _rotate_if_needed(self):
+        # Вызывается под self._cond
+        if self._offset < self._segment_bytes:
+            return
+        while self._syncing:
+            self._cond.wait()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._synced = self._written
+        self._open_segment(self._segment + 1)
+        self._collect()
+        sealed = [s for s in self._live if s != self._segment]
+        if len(sealed) > self._compact_segments:
+            # Уплотняем, только если завершено больше половины логов закрытых сегментов,
+            # иначе при долгом сбое Drive весь накопленный журнал копировался бы при каждой смене сегмента
+            live = sum(len(self._live[s]) for s in sealed)
+            if live * 2 <= sum(self._puts.get(s, 0) for s in sealed):
+                self._compact(sealed)
+
+    def _compact(self, segments):
+        # Переписывает незавершённые логи из segments в текущий сегмент; вызывается под self._cond
+        moved = 0
+        for segment in sorted(segments):
+            for local_id in sorted(self._live.get(segment, ()), key=lambda i: self._pending[i]['offset']):
+                state = self._pending[local_id]
+                record = self._read_at(segment, state['offset'])
+                record['file_id'] = state['file_id']
+                state['segment'], state['offset'] = self._segment, self._write(record)
+                self._live[self._segment].add(local_id)
+                self._puts[self._segment] = self._puts.get(self._segment, 0) + 1
+                moved += 1
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced = self._written
+        # Старые сегменты удаляются по порядку, от самого старого
+        for segment in sorted(segments):
+            self._remove_segment(segment)
+        print(f'[WAL]: Журнал уплотнён: {len(segments)} сегментов, перенесено {moved} записей')
+
+    def _read_at(self, segment, offset):
+        if segment == self._segment:
+            self._file.flush()
+        with open(self._segment_path(segment), 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def append(self, local_id, entry, text):
+        """
+        Записывает принятый лог и ждёт fsync. После возврата запись переживёт перезапуск.
+        """
+        self.append_many([(local_id, entry, text)])
+
+    def append_many(self, items):
+        """
+        Записывает пачку логов [(local_id, entry, text)] с одним fsync на всю пачку.
+        """
+        with self._cond:
+            for local_id, entry, text in items:
+                self._rotate_if_needed()
+                offset = self._write({'op': 'put', 'id': local_id, 'entry': entry, 'text': text})
+                self._pending[local_id] = {'segment': self._segment, 'offset': offset, 'file_id': None}
+                self._live[self._segment].add(local_id)
+                self._puts[self._segment] = self._puts.get(self._segment, 0) + 1
+            self._sync()
+
+    def mark_shipped(self, local_id, file_id):
+        """
+        Отмечает выгрузку лог-файла. Возвращает False, если лог уже удалён из журнала (drop).
+        """
+        return self.mark_shipped_many([(local_id, file_id)])[0]
+
+    def mark_shipped_many(self, items):
+        """
+        mark_shipped для пачки [(local_id, file_id)] с одним fsync. Возвращает флаги в том же порядке.
+        """
+        marked = []
+        with self._cond:
+            for local_id, file_id in items:
+                state = self._pending.get(local_id)
+                if state is not None:
+                    state['file_id'] = file_id
+                    self._write({'op': 'shipped', 'id': local_id, 'file_id': file_id})
+                marked.append(state is not None)
+            self._sync()
+        return marked
+
+    def mark_done(self, local_ids):
+        """
+        Завершает логи, попавшие в индекс, с одним fsync на пачку: после возврата отметка
+        переживёт перезапуск, и журнал не вернёт эти логи в работу.
+        """
+        with self._cond:
+            for local_id in local_ids:
+                if self._finish(local_id):
+                    self._write({'op': 'done', 'id': local_id})
+            self._sync()
+
+    def drop(self, local_id):
+        """
+        Убирает лог из журнала (отклонён или удалён до выгрузки). Возвращает состояние лога или None.
+        """
+        return self.drop_many([local_id])[0]
+
+    def drop_many(self, local_ids):
+        """
+        drop для пачки логов с одним fsync. Возвращает состояния в том же порядке.
+        """
+        states = []
+        with self._cond:
+            for local_id in local_ids:
+                state = self._pending.get(local_id)
+                if state is not None:
+                    state = dict(state)
+                    self._finish(local_id)
+                    self._write({'op': 'drop', 'id': local_id})
+                states.append(state)
+            self._sync()
+        return states
+
+    def _finish(self, local_id):
+        state = self._pending.pop(local_id, None)
+        if state is None:
+            return False
+        live = self._live.get(state['segment'])
+        if live is not None:
+            live.discard(local_id)
+            if not live:
+                self._collect()
+        return True
+
+    def state(self, local_id):
+        with self._cond:
+            state = self._pending.get(local_id)
+            return dict(state) if state is not None else None
+
+    def pending_ids(self, shipped=None):
+        """
+        local_id незавершённых логов; shipped=False — только ещё не выгруженные, True — только выгруженные.
+        """
+        with self._cond:
+            return [local_id for local_id, state in self._pending.items()
+                    if shipped is None or bool(state['file_id']) == shipped]
+
+    def read(self, local_id):
+        """
+        (entry, text) незавершённого лога или None.
+        """
+        with self._cond:
+            state = self._pending.get(local_id)
+            if state is None:
+                return None
+            record = self._read_at(state['segment'], state['offset'])
+            return record['entry'], record['text']
+
+    def stats(self):
+        with self._cond:
+            size = self._offset
+            for segment in self._live:
+                if segment != self._segment:
+                    try:
+                        size += os.path.getsize(self._segment_path(segment))
+                    except OSError:
+                        pass
+            return {
+                'pending': len(self._pending),
+                'unshipped': sum(1 for s in self._pending.values() if not s['file_id']),
+                'segments': len(self._live),
+                'bytes': size,
+            }
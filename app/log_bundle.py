@@ -0,0 +1,199 @@
+import gzip
+import json
+import threading
+import time
+import uuid
+import zlib
+from .constants import *
+
+BUNDLE_SUFFIX = '.ndjson.gz'
+BUNDLE_MIMETYPE = 'application/gzip'
+
+
+def bundle_ref(bundle_id, offset, length):
+    """
+    file_id записи внутри пачки: '<id пачки на Google Drive>#<смещение>+<длина>'.
+    """
+    return f'{bundle_id}#{offset}+{length}'
+
+
+def parse_bundle_ref(file_id):
+    """
+    file_id -> (id пачки, смещение, длина) или None, если это обычный лог-файл.
+    """
+    if not file_id or '#' not in file_id:
+        return None
+    bundle_id, _, span = file_id.partition('#')
+    offset, _, length = span.partition('+')
+    try:
+        return bundle_id, int(offset), int(length)
+    except ValueError:
+        return None
+
+
+def source_file_id(file_id):
+    """
+    id объекта на Google Drive, в котором лежит лог (сам лог-файл или пачка).
+    """
+    ref = parse_bundle_ref(file_id)
+    return ref[0] if ref else file_id
+
+
+def pack_bundle(records):
+    """
+    [(запись, текст)] -> (байты пачки, [(смещение, длина)] по записям).
+    Каждая запись — отдельный gzip-член с одной строкой NDJSON, поэтому её можно скачать
+    по диапазону байт и распаковать отдельно. Последний член — таблица смещений.
+    """
+    chunks = []
+    spans = []
+    offset = 0
+    for entry, text in records:
+        record = {k: v for k, v in entry.items() if k != 'file_id'}
+        record['text'] = text
+        member = gzip.compress((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'), mtime=0)
+        chunks.append(member)
+        spans.append((offset, len(member)))
+        offset += len(member)
+    table = {'bundle_index': [[entry.get('local_id'), o, n] for (entry, _), (o, n) in zip(records, spans)]}
+    chunks.append(gzip.compress((json.dumps(table) + '\n').encode('utf-8'), mtime=0))
+    return b''.join(chunks), spans
+
+
+def read_bundle_record(member):
+    """
+    Байты одного gzip-члена (результат ranged-скачивания) -> запись с полем text.
+    """
+    return json.loads(gzip.decompress(member))
+
+
+def iter_bundle(data):
+    """
+    Все записи пачки: [(смещение, длина, запись)]; таблица смещений пропускается.
+    """
+    result = []
+    offset = 0
+    while offset < len(data):
+        decompressor = zlib.decompressobj(wbits=31)
+        payload = decompressor.decompress(data[offset:])
+        length = len(data) - offset - len(decompressor.unused_data)
+        record = json.loads(payload)
+        if 'bundle_index' not in record:
+            result.append((offset, length, record))
+        offset += length
+    return result
+
+
+class BundleWriter:
+    """
+    Копит принятые логи и выгружает их на Google Drive одним объектом-пачкой
+    (раз в BUNDLE_MAX_AGE_SEC или по достижении BUNDLE_MAX_RECORDS записей) вместо файла на каждый лог.
+    on_shipped([(запись, file_id)]) вызывается после выгрузки пачки; при ошибке записи остаются
+    в буфере до следующей попытки (в журнале приёма они всё это время числятся невыгруженными).
+    Буфер ограничен max_buffered записями и max_bytes байт текстов: сверх этого add() отказывает,
+    и лог остаётся невыгруженным в журнале до повторной выгрузки.
+    """
+    def __init__(self, get_logger, on_shipped, max_records=BUNDLE_MAX_RECORDS, max_age=BUNDLE_MAX_AGE_SEC,
+                 max_buffered=BUNDLE_BUFFER_MAX_RECORDS, max_bytes=BUNDLE_BUFFER_MAX_BYTES):
+        self._get_logger = get_logger
+        self._on_shipped = on_shipped
+        self._max_records = max_records
+        self._max_age = max_age
+        self._max_buffered = max_buffered
+        self._max_bytes = max_bytes
+        self._pending = []  # [(запись, текст)]
+        self._bytes = 0
+        self._keys = set()
+        self._started = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='bundle-writer', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _size(text):
+        return len(text.encode('utf-8')) if text else 0
+
+    def add(self, log_entry, text):
+        """
+        Кладёт лог в буфер. Возвращает False, если буфер заполнен.
+        """
+        size = self._size(text)
+        with self._lock:
+            if log_entry['local_id'] in self._keys:
+                return True
+            # Одиночный лог больше max_bytes всё равно принимается, иначе он не выгрузился бы никогда
+            if self._pending and (len(self._pending) >= self._max_buffered or self._bytes + size > self._max_bytes):
+                accepted = False
+            else:
+                accepted = True
+                if not self._pending:
+                    self._started = time.monotonic()
+                self._pending.append((log_entry, text))
+                self._keys.add(log_entry['local_id'])
+                self._bytes += size
+            full = len(self._pending) >= self._max_records or not accepted
+        if full:
+            self._wakeup.set()
+        return accepted
+
+    def contains(self, local_id):
+        with self._lock:
+            return local_id in self._keys
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(min(self._max_age, 5))
+            self._wakeup.clear()
+            with self._lock:
+                due = self._pending and (len(self._pending) >= self._max_records
+                                         or time.monotonic() - self._started >= self._max_age)
+            if due:
+                self.flush()
+
+    def flush(self):
+        """
+        Выгружает накопленные записи пачками. Возвращает число выгруженных записей.
+        """
+        shipped = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    records = self._pending[:self._max_records]
+                if not records:
+                    return shipped
+                data, spans = pack_bundle(records)
+                name = f"bundle_{time.strftime('%Y-%m-%d_%H-%M-%S')}_{uuid.uuid4().hex[:8]}{BUNDLE_SUFFIX}"
+                try:
+                    bundle_id = self._get_logger().upload_bundle(name, data)
+                except Exception as e:
+                    print(f'[Google Drive ERROR]: Не удалось выгрузить пачку логов: {e}')
+                    return shipped
+                # Записи уходят из буфера только после on_shipped: до отметки выгрузки в журнале
+                # contains() должен их видеть, иначе повторная выгрузка из журнала отправила бы их ещё раз
+                try:
+                    self._on_shipped([(entry, bundle_ref(bundle_id, o, n))
+                                      for (entry, _), (o, n) in zip(records, spans)])
+                except Exception as e:
+                    print(f'[Bundle writer ERROR]: Ошибка обработчика выгрузки пачки: {e}')
+                with self._lock:
+                    del self._pending[:len(records)]
+                    self._keys.difference_update(e['local_id'] for e, _ in records)
+                    self._bytes -= sum(self._size(text) for _, text in records)
+                    if self._pending:
+                        self._started = time.monotonic()
+                shipped += len(records)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'buffered': len(self._pending),
+                'bytes': self._bytes,
+                'age': round(time.monotonic() - self._started, 3) if self._pending else 0.0,
+            }
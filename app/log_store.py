@@ -0,0 +1,567 @@
+import base64
+import bisect
+import heapq
+import json
+import sys
+from array import array
+from .aggregates import TimeBucketAggregates, parse_received_at, prefix_range, format_ts, DAY_SEC
+
+# Поля, хранящиеся в колонках; остальные поля записи (если есть) лежат в словаре _extra
+FIELDS = frozenset(('filename', 'duration', 'size', 'received_at', 'queue_time', 'process_time', 'local_id', 'file_id'))
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def _trigrams(s):
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _to_int(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return 0
+    return value if _INT64_MIN <= value <= _INT64_MAX else 0
+
+
+def compact_columns(exported):
+    """
+    Результат LogStore.export_columns -> колонки только живых строк в порядке received_at
+    (формат LogStore.load_columns). Выполняется вне lock.
+    """
+    order = exported['order']
+    columns = {name: array(exported[name].typecode, (exported[name][i] for i in order))
+               for name in ('ts', 'size', 'duration', 'queue_time', 'process_time')}
+    for name in ('filename', 'local_id', 'file_id'):
+        column = exported[name]
+        columns[name] = [column[i] for i in order]
+    raw, extra = exported['raw_received_at'], exported['extra']
+    position = {seq: new for new, seq in enumerate(order)} if raw or extra else {}
+    columns['raw_received_at'] = {position[seq]: v for seq, v in raw.items() if seq in position}
+    columns['extra'] = {position[seq]: v for seq, v in extra.items() if seq in position}
+    columns['aggregates'] = exported['aggregates']
+    return columns
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    ts, seq = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return (int(ts), int(seq))
+
+
+class LogStore:
+    """
+    Хранилище метаданных логов в памяти, по колонкам.
+    Запись — номер строки seq: received_at хранится секундами от эпохи (array('q')), duration,
+    queue_time и process_time — array('d'), size — array('q'), имена файлов интернируются.
+    Словари записей собираются только при выдаче наружу.
+    Первичные ключи: seq, local_id, file_id и пара (filename, received_at) — поиск за O(1).
+    Вторичные индексы: номера строк по дням в порядке (received_at, seq) и триграммы имён файлов.
+    Ключ сортировки (секунды received_at, seq) служит и курсором пагинации.
+    Удаление помечает строку удалённой (tombstone): список её дня чистится при следующем чтении дня,
+    колонки и списки триграмм не сдвигаются до следующего reset.
+    Не потокобезопасен — вызывается под общим lock из api.py.
+    """
+    def __init__(self):
+        self.aggregates = TimeBucketAggregates()
+        self.version = 0  # растёт при каждом изменении; по нему снимок понимает, есть ли что сохранять
+        self.reset([])
+
+    def _clear(self):
+        self.version += 1
+        self._ts = array('q')
+        self._size = array('q')
+        self._duration = array('d')
+        self._queue_time = array('d')
+        self._process_time = array('d')
+        self._filename = []
+        self._local_id = []
+        self._file_id = []
+        self._alive = bytearray()
+        self._raw_received_at = {}  # seq -> received_at не в формате 'YYYY-MM-DD HH:MM:SS' (как пришёл)
+        self._extra = {}  # seq -> прочие поля записи
+        self._live = 0
+        self._by_local_id = {}
+        self._by_file_id = {}
+        self._by_name = {}  # (filename, секунды received_at) -> seq или список seq при совпадениях
+        self._days = []  # отсортированные номера дней
+        self._by_day = {}  # номер дня -> array('q') номеров строк по (received_at, seq), включая удалённые
+        self._day_live = {}  # день -> число живых записей
+        self._day_dead = {}  # день -> число tombstone в self._by_day[день]
+        # Триграмма имени файла -> array('q') номеров строк по возрастанию, включая удалённые.
+        # Строится при первом поиске по имени, чтобы не замедлять загрузку индекса
+        self._trigrams = None
+
+    def reset(self, entries):
+        self._clear()
+        for entry in entries:
+            self._insert(entry, sort=False)
+        for day, seqs in self._by_day.items():
+            self._by_day[day] = array('q', sorted(seqs, key=self._sort_key))
+        self.aggregates.reset(self._ts, self._duration, self._size, self._alive)
+
+    def export_columns(self):
+        """
+        Копии колонок для снимка на диск. Под lock выполняется только копирование;
+        порядок живых строк по (received_at, seq) передаётся в 'order', переставляет их compact_columns.
+        """
+        order = array('q')
+        for day in list(self._days):
+            order.extend(self._day_keys(day))
+        return {
+            'order': order,
+            'ts': self._ts[:],
+            'size': self._size[:],
+            'duration': self._duration[:],
+            'queue_time': self._queue_time[:],
+            'process_time': self._process_time[:],
+            'filename': self._filename[:],
+            'local_id': self._local_id[:],
+            'file_id': self._file_id[:],
+            'raw_received_at': dict(self._raw_received_at),
+            'extra': dict(self._extra),
+            'aggregates': self.aggregates.export(),
+        }
+
+    def load_columns(self, columns):
+        """
+        Загружает колонки из compact_columns (живые строки по возрастанию received_at).
+        Индексы строятся пакетно, без разбора записей по одной.
+        """
+        self._clear()
+        self._ts = columns['ts']
+        self._size = columns['size']
+        self._duration = columns['duration']
+        self._queue_time = columns['queue_time']
+        self._process_time = columns['process_time']
+        self._filename = columns['filename']
+        self._local_id = columns['local_id']
+        self._file_id = columns['file_id']
+        self._raw_received_at = dict(columns['raw_received_at'])
+        self._extra = dict(columns['extra'])
+        n = len(self._ts)
+        self._alive = bytearray(b'\x01') * n
+        self._live = n
+        self._by_local_id = dict(zip(self._local_id, range(n)))
+        self._by_local_id.pop(None, None)
+        self._by_file_id = dict(zip(self._file_id, range(n)))
+        self._by_file_id.pop(None, None)
+        # Индекс (filename, received_at) нужен только /log_text — строится при первом обращении
+        self._by_name = None
+        # Строки отсортированы по received_at, поэтому каждый день — непрерывный диапазон номеров
+        start = 0
+        while start < n:
+            day = self._ts[start] // DAY_SEC
+            end = bisect.bisect_left(self._ts, (day + 1) * DAY_SEC, lo=start)
+            self._days.append(day)
+            self._by_day[day] = array('q', range(start, end))
+            self._day_live[day] = end - start
+            start = end
+        self.aggregates.load(columns['aggregates'])
+
+    def __len__(self):
+        return self._live
+
+    def _sort_key(self, seq):
+        return (self._ts[seq], seq)
+
+    def _received_at(self, seq):
+        if seq in self._raw_received_at:
+            return self._raw_received_at[seq]
+        return format_ts(self._ts[seq])
+
+    def _row(self, seq):
+        """
+        Собирает словарь записи из колонок.
+        """
+        row = {
+            'filename': self._filename[seq],
+            'duration': self._duration[seq],
+            'size': self._size[seq],
+            'received_at': self._received_at(seq),
+            'queue_time': self._queue_time[seq],
+            'process_time': self._process_time[seq],
+            'local_id': self._local_id[seq],
+            'file_id': self._file_id[seq],
+        }
+        extra = self._extra.get(seq)
+        if extra:
+            row.update(extra)
+        return row
+
+    def add(self, entry):
+        seq = self._insert(entry, sort=True)
+        self.version += 1
+        self.aggregates.add(self._ts[seq], self._duration[seq], self._size[seq])
+        return seq
+
+    def _insert(self, entry, sort):
+        seq = len(self._ts)
+        received_at = entry.get('received_at')
+        ts, canonical = parse_received_at(received_at if isinstance(received_at, str) else None)
+        if not canonical:
+            self._raw_received_at[seq] = received_at
+        filename = entry.get('filename')
+        filename = sys.intern(filename) if isinstance(filename, str) else ''
+        self._ts.append(ts)
+        self._size.append(_to_int(entry.get('size')))
+        self._duration.append(_to_float(entry.get('duration')))
+        self._queue_time.append(_to_float(entry.get('queue_time')))
+        self._process_time.append(_to_float(entry.get('process_time')))
+        self._filename.append(filename)
+        self._local_id.append(entry.get('local_id'))
+        self._file_id.append(entry.get('file_id'))
+        self._alive.append(1)
+        if entry.keys() - FIELDS:
+            self._extra[seq] = {k: v for k, v in entry.items() if k not in FIELDS}
+        self._live += 1
+        day = ts // DAY_SEC
+        seqs = self._by_day.get(day)
+        if seqs is None:
+            seqs = self._by_day[day] = array('q')
+            bisect.insort(self._days, day)
+        if sort and seqs and self._sort_key(seqs[-1]) > (ts, seq):
+            seqs.insert(bisect.bisect_left(seqs, (ts, seq), key=self._sort_key), seq)
+        else:
+            seqs.append(seq)
+        self._day_live[day] = self._day_live.get(day, 0) + 1
+        if entry.get('local_id'):
+            self._by_local_id[entry['local_id']] = seq
+        if entry.get('file_id'):
+            self._by_file_id[entry['file_id']] = seq
+        if self._by_name is not None:
+            self._index_name(seq)
+        if self._trigrams is not None:
+            self._index_trigrams(seq)
+        return seq
+
+    def _index_name(self, seq):
+        name = (self._filename[seq], self._ts[seq])
+        same = self._by_name.get(name)
+        if same is None:
+            self._by_name[name] = seq
+        elif isinstance(same, list):
+            same.append(seq)
+        else:
+            self._by_name[name] = [same, seq]
+
+    def _name_index(self):
+        if self._by_name is None:
+            alive = self._alive
+            live = [seq for seq in range(len(alive)) if alive[seq]] if self._live < len(alive) else range(len(alive))
+            self._by_name = dict(zip(((self._filename[seq], self._ts[seq]) for seq in live), live))
+            if len(self._by_name) < len(live):
+                # Есть записи с одинаковыми (filename, received_at) — собираем их списками
+                self._by_name = {}
+                for seq in live:
+                    self._index_name(seq)
+        return self._by_name
+
+    def _index_trigrams(self, seq):
+        for tri in _trigrams(self._filename[seq]):
+            postings = self._trigrams.get(tri)
+            if postings is None:
+                postings = self._trigrams[tri] = array('q')
+            postings.append(seq)
+
+    def set_file_id(self, local_id, file_id):
+        """
+        Проставляет file_id записи, принятой с local_id, после выгрузки на Google Drive.
+        Возвращает запись с проставленным file_id или None.
+        """
+        seq = self._by_local_id.get(local_id)
+        if seq is None:
+            return None
+        self._file_id[seq] = file_id
+        self.version += 1
+        if file_id:
+            self._by_file_id[file_id] = seq
+        return self._row(seq)
+
+    def get_by_file_id(self, file_id):
+        seq = self._by_file_id.get(file_id)
+        return self._row(seq) if seq is not None else None
+
+    def get_by_local_id(self, local_id):
+        seq = self._by_local_id.get(local_id)
+        return self._row(seq) if seq is not None else None
+
+    def get_by_name(self, filename, received_at):
+        ts, _ = parse_received_at(received_at)
+        same = self._name_index().get((filename, ts))
+        if same is None:
+            return None
+        # Разные строки received_at могут давать одни и те же секунды — сверяем строку
+        for seq in (same if isinstance(same, list) else (same,)):
+            if self._received_at(seq) == received_at:
+                return self._row(seq)
+        return None
+
+    def has(self, local_id=None, file_id=None):
+        return bool((local_id and local_id in self._by_local_id) or (file_id and file_id in self._by_file_id))
+
+    def stale_file_ids(self, known_file_ids, below_seq):
+        """
+        file_id живых записей с seq < below_seq, которых нет в known_file_ids.
+        """
+        return [file_id for file_id, seq in self._by_file_id.items()
+                if seq < below_seq and file_id not in known_file_ids]
+
+    def remove_by_file_id(self, file_id):
+        seq = self._by_file_id.get(file_id)
+        return self.remove(seq) if seq is not None else None
+
+    def remove_by_local_id(self, local_id):
+        seq = self._by_local_id.get(local_id)
+        return self.remove(seq) if seq is not None else None
+
+    def remove(self, seq):
+        if seq is None or not 0 <= seq < len(self._alive) or not self._alive[seq]:
+            return None
+        entry = self._row(seq)
+        ts = self._ts[seq]
+        self._alive[seq] = 0
+        self._live -= 1
+        self.version += 1
+        day = ts // DAY_SEC
+        self._day_live[day] -= 1
+        self._day_dead[day] = self._day_dead.get(day, 0) + 1
+        local_id, file_id = self._local_id[seq], self._file_id[seq]
+        if local_id and self._by_local_id.get(local_id) == seq:
+            del self._by_local_id[local_id]
+        if file_id and self._by_file_id.get(file_id) == seq:
+            del self._by_file_id[file_id]
+        if self._by_name is not None:
+            name = (self._filename[seq], ts)
+            same = self._by_name.get(name)
+            if same == seq:
+                del self._by_name[name]
+            elif isinstance(same, list) and seq in same:
+                same.remove(seq)
+                if len(same) == 1:
+                    self._by_name[name] = same[0]
+        # Строка остаётся в колонках, освобождаем только ссылки на строки и словари
+        self._local_id[seq] = self._file_id[seq] = None
+        self._raw_received_at.pop(seq, None)
+        self._extra.pop(seq, None)
+        self.aggregates.remove(ts, self._duration[seq], self._size[seq])
+        return entry
+
+    def _day_keys(self, day):
+        """
+        Живые номера строк дня по порядку; tombstone вычищаются здесь, при первом чтении дня после удаления.
+        """
+        if self._day_dead.get(day):
+            if self._day_live.get(day):
+                alive = self._alive
+                self._by_day[day] = array('q', (seq for seq in self._by_day[day] if alive[seq]))
+                self._day_dead[day] = 0
+            else:
+                del self._by_day[day], self._day_live[day], self._day_dead[day]
+                i = bisect.bisect_left(self._days, day)
+                if i < len(self._days) and self._days[i] == day:
+                    del self._days[i]
+                return array('q')
+        return self._by_day.get(day, array('q'))
+
+    def _day_range(self, day, lo, hi):
+        """
+        Номера строк дня с received_at в [lo, hi) и их количество; lo=None — без ограничения.
+        """
+        if lo is None or (lo <= day * DAY_SEC and (day + 1) * DAY_SEC <= hi):
+            return self._day_keys(day), self._day_live.get(day, 0)
+        keys = self._day_keys(day)
+        start = bisect.bisect_left(keys, (lo, -1), key=self._sort_key)
+        end = bisect.bisect_left(keys, (hi, -1), key=self._sort_key)
+        return keys[start:end], end - start
+
+    def entries(self):
+        result = []
+        for day in list(self._days):
+            result.extend(self._row(seq) for seq in self._day_keys(day))
+        return result
+
+    def _scan_received_at(self, seqs, date):
+        """
+        Фильтр по строковому префиксу received_at, когда префикс не переводится в интервал секунд.
+        """
+        return [seq for seq in seqs if str(self._received_at(seq) or '').startswith(date)]
+
+    def _filename_keys(self, filename, date):
+        if len(filename) >= 3:
+            if self._trigrams is None:
+                self._trigrams = {}
+                for seq in range(len(self._filename)):
+                    if self._alive[seq]:
+                        self._index_trigrams(seq)
+            # Кандидаты — самый короткий список триграммы, остальное отсеивает проверка подстроки
+            candidates = min((self._trigrams.get(tri, ()) for tri in _trigrams(filename)), key=len)
+        else:
+            # Короче триграммы — индекс не помогает, проверяем все имена
+            candidates = range(len(self._alive))
+        alive = self._alive
+        keys = [seq for seq in candidates if alive[seq] and filename in self._filename[seq]]
+        if date:
+            bounds = prefix_range(date)
+            if bounds is None:
+                keys = self._scan_received_at(keys, date)
+            else:
+                keys = [seq for seq in keys if bounds[0] <= self._ts[seq] < bounds[1]]
+        keys.sort(key=self._sort_key)
+        return keys
+
+    def _slice(self, keys, cursor, offset, limit, descending):
+        total = len(keys)
+        if descending:
+            end = bisect.bisect_left(keys, cursor, key=self._sort_key) if cursor else total
+            end = max(end - offset, 0)
+            start = max(end - limit, 0) if limit is not None else 0
+            return list(keys[start:end])[::-1], start > 0
+        start = bisect.bisect_right(keys, cursor, key=self._sort_key) if cursor else 0
+        start += offset
+        end = start + limit if limit is not None else total
+        return list(keys[start:end]), end < total
+
+    def _days_page(self, date, cursor, offset, limit, descending):
+        """
+        Страница без фильтра по имени: идём по дням, целые дни до offset пропускаем по счётчикам.
+        """
+        lo = hi = None
+        if date:
+            bounds = prefix_range(date)
+            if bounds is None:
+                keys = self._scan_received_at(
+                    [seq for day in list(self._days) for seq in self._day_keys(day)], date)
+                page, has_more = self._slice(keys, cursor, offset, limit, descending)
+                return page, has_more, len(keys)
+            lo, hi = bounds
+            days = self._days[bisect.bisect_left(self._days, lo // DAY_SEC):
+                              bisect.bisect_left(self._days, (hi - 1) // DAY_SEC + 1)]
+        else:
+            days = list(self._days)
+        ranges = {}
+        total = 0
+        for day in days:
+            ranges[day] = self._day_range(day, lo, hi)
+            total += ranges[day][1]
+        if descending:
+            days = days[::-1]
+        cursor_day = cursor[0] // DAY_SEC if cursor else None
+        page = []
+        for i, day in enumerate(days):
+            if cursor_day is not None and (day > cursor_day if descending else day < cursor_day):
+                continue
+            keys, count = ranges[day]
+            day_cursor = cursor if day == cursor_day else None
+            if day_cursor is None and offset >= count:
+                offset -= count
+                continue
+            if day_cursor is not None:
+                if descending:
+                    available = bisect.bisect_left(keys, day_cursor, key=self._sort_key)
+                else:
+                    available = len(keys) - bisect.bisect_right(keys, day_cursor, key=self._sort_key)
+                if offset >= available:
+                    offset -= available
+                    continue
+            need = limit - len(page) if limit is not None else None
+            chunk, more_in_day = self._slice(keys, day_cursor, offset, need, descending)
+            offset = 0
+            page.extend(chunk)
+            if limit is not None and len(page) >= limit:
+                has_more = more_in_day or any(ranges[d][1] for d in days[i + 1:])
+                return page, has_more, total
+        return page, False, total
+
+    def query(self, filename=None, date=None, cursor=None, offset=0, limit=None, descending=False):
+        """
+        Возвращает (записи страницы, курсор следующей страницы или None, всего совпадений).
+        filename — подстрока имени файла, date — префикс received_at.
+        """
+        cursor_key = decode_cursor(cursor) if cursor else None
+        if filename:
+            keys = self._filename_keys(filename, date)
+            page, has_more = self._slice(keys, cursor_key, offset, limit, descending)
+            total = len(keys)
+        else:
+            page, has_more, total = self._days_page(date, cursor_key, offset, limit, descending)
+        next_cursor = encode_cursor(self._sort_key(page[-1])) if page and has_more else None
+        return [self._row(seq) for seq in page], next_cursor, total
+
+    def _matching_keys(self, filename, date):
+        """
+        Все живые номера строк, подходящие под фильтры, в порядке (received_at, seq).
+        """
+        if filename:
+            return self._filename_keys(filename, date)
+        bounds = prefix_range(date) if date else None
+        if bounds is None:
+            keys = [seq for day in list(self._days) for seq in self._day_keys(day)]
+            return self._scan_received_at(keys, date) if date else keys
+        lo, hi = bounds
+        days = self._days[bisect.bisect_left(self._days, lo // DAY_SEC):
+                          bisect.bisect_left(self._days, (hi - 1) // DAY_SEC + 1)]
+        return [seq for day in days for seq in self._day_range(day, lo, hi)[0]]
+
+    def sorted_page(self, column, filename=None, date=None, offset=0, limit=None, descending=False):
+        """
+        Страница, упорядоченная по column ('filename' без учёта регистра, 'duration' или 'size'),
+        при равенстве — по received_at. Возвращает (записи страницы, всего совпадений).
+        Порядок не совпадает с ключом курсора, поэтому страницы выбираются только по offset.
+        """
+        keys = self._matching_keys(filename, date)
+        if column == 'filename':
+            names = self._filename
+            sort_key = lambda seq: (names[seq].lower(), self._ts[seq], seq)
+        else:
+            values = {'duration': self._duration, 'size': self._size}[column]
+            sort_key = lambda seq: (values[seq], self._ts[seq], seq)
+        if limit is None:
+            ordered = sorted(keys, key=sort_key, reverse=descending)
+        else:
+            # Нужны только первые offset + limit строк, а не сортировка всех совпадений
+            pick = heapq.nlargest if descending else heapq.nsmallest
+            ordered = pick(offset + limit, keys, key=sort_key)
+        return [self._row(seq) for seq in ordered[offset:]], len(keys)
+
+    def scan(self, lo=None, hi=None, filename=None, after=None, limit=1000):
+        """
+        Постраничный проход по порядку (received_at, seq) для выгрузки: записи с received_at в [lo, hi)
+        (секунды, None — без границы) и подстрокой filename в имени, начиная после ключа after.
+        Просматривает не больше limit строк, чтобы lock держался недолго даже при редких совпадениях.
+        Возвращает (записи, ключ для следующего вызова или None, если строк больше нет).
+        """
+        first_day = lo // DAY_SEC if lo is not None else None
+        if after is not None:
+            first_day = after[0] // DAY_SEC if first_day is None else max(first_day, after[0] // DAY_SEC)
+        start = bisect.bisect_left(self._days, first_day) if first_day is not None else 0
+        rows, scanned, last = [], 0, None
+        for day in self._days[start:]:
+            if hi is not None and day * DAY_SEC >= hi:
+                return rows, None
+            keys = self._day_keys(day)
+            i = 0
+            if after is not None:
+                i = bisect.bisect_right(keys, after, key=self._sort_key)
+            if lo is not None:
+                i = max(i, bisect.bisect_left(keys, (lo, -1), key=self._sort_key))
+            for j in range(i, len(keys)):
+                seq = keys[j]
+                if hi is not None and self._ts[seq] >= hi:
+                    return rows, None
+                if scanned >= limit:
+                    return rows, last
+                scanned += 1
+                last = self._sort_key(seq)
+                if not filename or filename in self._filename[seq]:
+                    rows.append(self._row(seq))
+        return rows, None
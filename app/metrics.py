@@ -0,0 +1,299 @@
+"""
+Метрики сервиса в текстовом формате Prometheus (GET /metrics): счётчики, гистограммы задержек
+и показатели, которые считаются в момент запроса. Без внешних зависимостей.
+
+Запись в гистограмму — поиск корзины и инкремент под коротким lock, поэтому метрики
+можно держать включёнными постоянно.
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+from starlette.routing import Match, Mount
+
+# Корзины гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Ожидание lock обычно микросекундное
+LOCK_WAIT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # метки -> [счётчики по корзинам (последняя — +Inf), сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {count}')
+        return lines
+
+
+class Gauge:
+    """
+    Показатель, значение которого вычисляет read() в момент запроса /metrics.
+    read() возвращает число или {значения меток: число}. kind='counter' — для уже накопленных
+    где-то счётчиков (например, обработано очередью).
+    """
+    def __init__(self, name, help, read, labels=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.kind = kind
+        self._read = read
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        try:
+            value = self._read()
+        except Exception as e:
+            print(f'[Metrics ERROR]: Не удалось получить {self.name}: {e}')
+            return lines
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for key, v in sorted(items):
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f'{self.name}{_format_labels(self.labels, key)} {_format_value(v)}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Повторная регистрация (например, при перезагрузке модуля) заменяет метрику
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def counter(name, help, labels=()):
+    return registry.register(Counter(name, help, labels))
+
+
+def histogram(name, help, labels=(), buckets=LATENCY_BUCKETS):
+    return registry.register(Histogram(name, help, labels, buckets))
+
+
+def gauge(name, help, read, labels=(), kind='gauge'):
+    return registry.register(Gauge(name, help, read, labels, kind))
+
+
+SPAN_SECONDS = histogram('logerapi_span_seconds', 'Длительность внутренних операций', labels=('span',))
+SPAN_ERRORS = counter('logerapi_span_errors_total', 'Внутренние операции, завершившиеся исключением',
+                      labels=('span',))
+
+
+class span:
+    """
+    Замер участка кода: with span('index_save'): ... или @span('upload') над функцией.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        SPAN_SECONDS.observe(time.perf_counter() - self._started, span=self.name)
+        if exc_type is not None:
+            SPAN_ERRORS.inc(span=self.name)
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(self.name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+LOCK_WAIT_SECONDS = histogram('logerapi_lock_wait_seconds', 'Ожидание захвата lock', labels=('lock',),
+                              buckets=LOCK_WAIT_BUCKETS)
+
+
+class TimedLock:
+    """
+    threading.Lock, который записывает время ожидания захвата в гистограмму.
+    """
+    def __init__(self, name):
+        self._lock = threading.Lock()
+        self._name = name
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            # Без конкуренции ожидания нет: пишем ноль без обращения к часам
+            LOCK_WAIT_SECONDS.observe(0.0, lock=self._name)
+            return True
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        LOCK_WAIT_SECONDS.observe(time.perf_counter() - started, lock=self._name)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+REQUEST_SECONDS = histogram('logerapi_http_request_seconds', 'Время обработки HTTP-запроса',
+                            labels=('method', 'route', 'status'))
+REQUESTS_IN_FLIGHT = [0]
+_IN_FLIGHT_LOCK = threading.Lock()
+gauge('logerapi_http_requests_in_flight', 'HTTP-запросов в обработке', lambda: REQUESTS_IN_FLIGHT[0])
+
+
+def _add_in_flight(delta):
+    # Middleware работает и в потоке сервера писателя на unix-сокете, поэтому изменение — под lock
+    with _IN_FLIGHT_LOCK:
+        REQUESTS_IN_FLIGHT[0] += delta
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware: гистограмма времени ответа по шаблону маршрута ('/log_text', '/static'),
+    а не по URL, чтобы число рядов не росло. Для потоковых ответов (/events) замер идёт до начала ответа.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+        recorded = [False]
+
+        def record():
+            if recorded[0]:
+                return
+            recorded[0] = True
+            _add_in_flight(-1)
+            REQUEST_SECONDS.observe(time.perf_counter() - started, method=scope['method'],
+                                    route=_route_label(scope), status=str(status[0]))
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+                if _is_streaming(message):
+                    record()
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                record()
+
+        _add_in_flight(1)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            record()
+
+
+def _is_streaming(message):
+    for name, value in message.get('headers', ()):
+        if name.lower() == b'content-type' and value.startswith(b'text/event-stream'):
+            return True
+    return False
+
+
+def _route_label(scope):
+    route = scope.get('route')
+    path = getattr(route, 'path', None)
+    if path is not None:
+        return path or '/'
+    # Для подключённых приложений (/static) и старых версий Starlette маршрута в scope нет
+    app = scope.get('app')
+    for candidate in getattr(app, 'routes', ()):
+        prefix = getattr(candidate, 'path', None)
+        if isinstance(candidate, Mount) and prefix and scope['path'].startswith(prefix + '/'):
+            return prefix
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return candidate.path or '/'
+    return 'other'
@@ -0,0 +1,266 @@
+"""
+Работа в нескольких процессах (uvicorn --workers N при MULTIPROCESS_MODE = True).
+
+Процесс, захвативший lock-файл WRITER_LOCK_PATH, становится писателем: только он ведёт журнал приёма,
+выгрузку в хранилище, logs_index.json и снимок store, и дополнительно слушает unix-сокет WRITER_SOCKET_PATH.
+Остальные процессы — читатели: при старте получают от писателя снимок store, дальше применяют его поток
+/events и отвечают на /logs, /summary, /stats и /histogram сами. Запросы на изменение читатель
+пересылает писателю через сокет. Если писатель завершился, lock освобождается и его захватывает
+один из читателей.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from .constants import *
+from .store_snapshot import read_snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows: несколько процессов не поддерживаются, процесс всегда писатель
+    fcntl = None
+
+# Заголовки одного соединения, которые не пересылаются
+_HOP_HEADERS = {b'host', b'connection', b'keep-alive', b'transfer-encoding', b'upgrade'}
+
+
+class WriterElection:
+    """
+    Выбор писателя через flock на WRITER_LOCK_PATH. Lock держится открытым дескриптором
+    до завершения процесса, после чего ОС освобождает его сама.
+    enabled=False — процесс работает один и всегда считается писателем.
+    is_writer становится True только после запуска писателя (start в try_acquire): до этого запросы
+    на изменение пересылаются по-прежнему и получают 503, а не попадают в процесс без журнала приёма.
+    """
+    def __init__(self, path=WRITER_LOCK_PATH, enabled=MULTIPROCESS_MODE):
+        self.path = path
+        self.enabled = enabled
+        self.is_writer = False
+        self._fd = None
+
+    def try_acquire(self, start=None):
+        """
+        Пытается стать писателем без ожидания; при успехе вызывает start() и только потом отмечает
+        процесс писателем. Возвращает True, если процесс — писатель.
+        """
+        if self.is_writer:
+            return True
+        if not self.enabled or fcntl is None:
+            return self._become_writer(start)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f'{os.getpid()}\n'.encode())
+        self._fd = fd
+        return self._become_writer(start)
+
+    def _become_writer(self, start):
+        if start is not None:
+            start()
+        self.is_writer = True
+        return True
+
+
+class WriterSocketServer:
+    """
+    Второй uvicorn-сервер писателя на unix-сокете в отдельном потоке: то же приложение
+    плюс служебные маршруты для читателей (routes).
+    """
+    def __init__(self, app, routes, path=WRITER_SOCKET_PATH):
+        self._app = Starlette(routes=list(routes) + [Mount('', app=app)])
+        self._path = path
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        os.makedirs(os.path.dirname(self._path) or '.', exist_ok=True)
+        server = uvicorn.Server(uvicorn.Config(self._app, uds=self._path, lifespan='off', log_level='warning'))
+        self._thread = threading.Thread(target=server.run, name='writer-socket', daemon=True)
+        self._thread.start()
+
+
+def iter_sse(lines):
+    """
+    Строки text/event-stream -> (id, тип, data) по одному на событие; комментарии и retry пропускаются.
+    """
+    event_id, event_type, data = None, 'message', []
+    for line in lines:
+        if not line:
+            if data:
+                yield event_id, event_type, json.loads('\n'.join(data))
+            event_id, event_type, data = None, 'message', []
+            continue
+        field, _, value = line.partition(':')
+        value = value[1:] if value.startswith(' ') else value
+        if field == 'id':
+            event_id = value
+        elif field == 'event':
+            event_type = value
+        elif field == 'data':
+            data.append(value)
+
+
+class ReplicaFollower:
+    """
+    Реплика store в процессе-читателе. Поток: запросить у писателя снимок (load(columns, queue)),
+    затем применять события его /events по одному (apply(тип, data)) начиная с токена снимка.
+    reset от писателя — снова загрузить снимок. Писатель недоступен — попытка стать писателем
+    (on_promote()), иначе переподключение через REPLICA_RETRY_SEC.
+    """
+    def __init__(self, election, load, apply, on_promote, socket_path=WRITER_SOCKET_PATH):
+        self._election = election
+        self._load = load
+        self._apply = apply
+        self._on_promote = on_promote
+        self._client = httpx.Client(
+            transport=httpx.HTTPTransport(uds=socket_path), base_url='http://writer',
+            timeout=httpx.Timeout(WRITER_FORWARD_TIMEOUT_SEC, read=EVENTS_KEEPALIVE_SEC * 3)
+        )
+        self._thread = None
+        self.synced = False  # реплика загружена и получает события
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='replica-follower', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._follow()
+            except httpx.TransportError:
+                pass  # писатель ещё запускается или уже завершился
+            except Exception as e:
+                print(f'[Replica ERROR]: Ошибка синхронизации с писателем: {e}')
+            self.synced = False
+            if self._election.try_acquire(self._promote):
+                return
+            time.sleep(REPLICA_RETRY_SEC)
+
+    def _promote(self):
+        print(f'[Replica]: Писатель недоступен, процесс {os.getpid()} становится писателем')
+        self._on_promote()
+
+    def _bootstrap(self):
+        resp = self._client.post('/_replica/snapshot')
+        resp.raise_for_status()
+        info = resp.json()
+        try:
+            columns, _ = read_snapshot(info['path'])
+        finally:
+            try:
+                os.remove(info['path'])
+            except OSError:
+                pass
+        self._load(columns, info['queue'])
+        return info['token']
+
+    def _follow(self):
+        token = self._bootstrap()
+        self.synced = True
+        while True:
+            token = self._stream(token)
+
+    def _stream(self, token):
+        """
+        Применяет события писателя после token. Возвращает токен, с которого продолжать.
+        """
+        with self._client.stream('GET', '/events', params={'last_event_id': token}) as resp:
+            resp.raise_for_status()
+            for event_id, event_type, data in iter_sse(resp.iter_lines()):
+                if event_type == 'reset':
+                    # Писатель перечитал store целиком или пропущенных событий у него уже нет
+                    return self._bootstrap()
+                self._apply(event_type, data)
+                token = event_id
+        return token
+
+    def fetch_text(self, entry):
+        """
+        Текст лога у писателя (его кэш или хранилище). None, если писатель его не нашёл.
+        """
+        resp = self._client.get('/log_text', params={'filename': entry['filename'], 'received_at': entry['received_at']})
+        if resp.status_code != 200:
+            return None
+        return resp.json().get('text')
+
+
+class WriterProxyMiddleware:
+    """
+    ASGI middleware процесса-читателя: запросы из routes ({(метод, путь)}) пересылаются писателю
+    через unix-сокет, тело запроса и ответа передаются потоком. В процессе-писателе ничего не делает.
+    """
+    def __init__(self, app, election, routes, socket_path=WRITER_SOCKET_PATH, timeout=WRITER_FORWARD_TIMEOUT_SEC):
+        self.app = app
+        self._election = election
+        self._routes = set(routes)
+        self._socket_path = socket_path
+        self._timeout = timeout
+        self._client = None
+        self._client_loop = None
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] != 'http' or self._election.is_writer
+                or (scope['method'], scope['path']) not in self._routes):
+            await self.app(scope, receive, send)
+            return
+        await self._forward(scope, receive, send)
+
+    def _writer_client(self):
+        # Как и async_io.http_client, клиент привязан к циклу событий
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=self._socket_path), base_url='http://writer',
+                timeout=self._timeout
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def _forward(self, scope, receive, send):
+        async def body():
+            while True:
+                message = await receive()
+                if message['type'] != 'http.request':
+                    return
+                yield message.get('body', b'')
+                if not message.get('more_body', False):
+                    return
+
+        url = scope['path']
+        if scope.get('query_string'):
+            url += '?' + scope['query_string'].decode('latin-1')
+        headers = [(k, v) for k, v in scope['headers'] if k.lower() not in _HOP_HEADERS]
+        client = self._writer_client()
+        try:
+            response = await client.send(client.build_request(scope['method'], url, headers=headers, content=body()),
+                                         stream=True)
+        except httpx.TransportError as e:
+            payload = json.dumps({'error': f'Процесс-писатель недоступен, повторите запрос позже: {e}'},
+                                 ensure_ascii=False).encode('utf-8')
+            await send({'type': 'http.response.start', 'status': 503, 'headers': [
+                (b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode()),
+                (b'retry-after', str(REPLICA_RETRY_SEC).encode()),
+            ]})
+            await send({'type': 'http.response.body', 'body': payload})
+            return
+        try:
+            await send({'type': 'http.response.start', 'status': response.status_code,
+                        'headers': [(k, v) for k, v in response.headers.raw if k.lower() not in _HOP_HEADERS]})
+            async for chunk in response.aiter_raw():
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await response.aclose()
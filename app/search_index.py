@@ -0,0 +1,356 @@
+"""
+Полнотекстовый поиск по текстам логов (GET /search): инвертированный индекс в памяти с ранжированием BM25.
+
+Нормализация рассчитана на русские транскрипты: casefold, ё -> е, слова из букв и цифр,
+лёгкий стемминг русских окончаний (падежи, роды, личные формы глаголов, -ся/-сь).
+Документ — текст лога под ключом text_key (local_id или file_id). Постинги термина — массивы
+номеров документов (по возрастанию) и частот; удалённые документы помечаются и вычищаются
+при сохранении, когда их доля превышает SEARCH_COMPACT_DEAD_RATIO.
+"""
+import functools
+import heapq
+import json
+import math
+import os
+import re
+import sys
+import threading
+from array import array
+from .constants import *
+
+try:
+    import numpy as np
+except ImportError:  # numpy не обязателен: без него оценки считаются обычным циклом
+    np = None
+
+MAGIC = b'LOGSRCH1'
+_WORD = re.compile(r'\w+')
+_CYRILLIC = re.compile('[а-я]')
+_REFLEXIVE = ('ся', 'сь')
+_RU_SUFFIXES = tuple(sorted({
+    # существительные и прилагательные
+    'иями', 'ями', 'ами', 'иях', 'ях', 'ах', 'ией', 'ием', 'ом', 'ем', 'ам', 'ям', 'ов', 'ев', 'ей',
+    'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ую', 'юю',
+    'ия', 'ии', 'ию', 'ью',
+    # глаголы
+    'ешь', 'ете', 'ет', 'ут', 'ют', 'ите', 'ит', 'им', 'ат', 'ят', 'ала', 'ила', 'ыла', 'ела', 'али', 'или',
+    'ыли', 'ели', 'ал', 'ил', 'ыл', 'ел', 'ать', 'ять', 'ить', 'еть', 'уть', 'ть',
+    # однобуквенные окончания
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+}, key=len, reverse=True))
+_MIN_STEM = 3
+_MAX_TF = 65535
+
+
+@functools.lru_cache(maxsize=200000)
+def stem(word):
+    """
+    Лёгкий стемминг: у русского слова отрезается самое длинное известное окончание,
+    если остаётся не меньше _MIN_STEM букв. Остальные слова не меняются.
+    """
+    if len(word) <= _MIN_STEM or not _CYRILLIC.search(word):
+        return word
+    for suffix in _REFLEXIVE:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            word = word[:-len(suffix)]
+            break
+    for suffix in _RU_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    """
+    Текст -> список терминов: casefold, ё -> е, слова из букв и цифр, стемминг.
+    """
+    return [stem(word) for word in _WORD.findall((text or '').casefold().replace('ё', 'е'))]
+
+
+class SearchIndex:
+    """
+    Инвертированный индекс. Потокобезопасен: изменения и поиск идут под собственным lock
+    (не lock хранилища метаданных).
+    """
+    def __init__(self, k1=SEARCH_BM25_K1, b=SEARCH_BM25_B):
+        self._k1 = k1
+        self._b = b
+        self._lock = threading.Lock()
+        self._clear()
+        self.version = 0  # растёт при каждом изменении, по нему save() решает, писать ли файл
+        self._saved_version = 0
+
+    def _clear(self):
+        self._keys = []  # номер документа -> ключ
+        self._doc_by_key = {}
+        self._doc_len = array('I')
+        self._alive = bytearray()
+        self._postings = {}  # термин -> (array('I') номеров документов, array('H') частот)
+        self._live_docs = 0
+        self._total_len = 0
+
+    def __len__(self):
+        return self._live_docs
+
+    def has(self, key):
+        with self._lock:
+            return key in self._doc_by_key
+
+    def add(self, key, text):
+        """
+        Индексирует текст под ключом; уже проиндексированный ключ не меняется (тексты логов неизменны).
+        """
+        if not key or text is None:
+            return False
+        terms = {}
+        for term in tokenize(text):
+            terms[term] = terms.get(term, 0) + 1
+        with self._lock:
+            if key in self._doc_by_key:
+                return False
+            doc = len(self._keys)
+            self._keys.append(key)
+            self._doc_by_key[key] = doc
+            length = sum(terms.values())
+            self._doc_len.append(min(length, 0xFFFFFFFF))
+            self._alive.append(1)
+            self._live_docs += 1
+            self._total_len += length
+            for term, tf in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array('I'), array('H'))
+                postings[0].append(doc)
+                postings[1].append(min(tf, _MAX_TF))
+            self.version += 1
+        return True
+
+    def remove(self, key):
+        with self._lock:
+            doc = self._doc_by_key.pop(key, None)
+            if doc is None:
+                return False
+            self._alive[doc] = 0
+            self._live_docs -= 1
+            self._total_len -= self._doc_len[doc]
+            self.version += 1
+        return True
+
+    def search(self, query, offset=0, limit=SEARCH_PAGE_DEFAULT_LIMIT, keep=None):
+        """
+        Документы, содержащие хотя бы один термин запроса, по убыванию BM25.
+        keep(key) -> False отбрасывает документ (запись уже удалена из хранилища, но ещё не из индекса).
+        Возвращает ([(ключ, оценка)] для страницы, всего найдено). keep вызывается только для документов
+        до конца страницы, поэтому total приблизительный: отброшенные дальше страницы в нём ещё учтены.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            if not terms or not self._live_docs:
+                return [], 0
+            if np is not None:
+                ranked, total = self._score_numpy(terms)
+            else:
+                ranked, total = self._score_python(terms, offset + limit)
+            keys = self._keys
+            page, skipped, dropped = [], 0, 0
+            for doc, score in ranked:
+                if keep is not None and not keep(keys[doc]):
+                    dropped += 1
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                page.append((keys[doc], score))
+                if len(page) >= limit:
+                    break
+        return page, total - dropped
+
+    def _idf(self, df):
+        n = self._live_docs
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _score_python(self, terms, wanted):
+        avg_len = self._total_len / self._live_docs or 1.0
+        k1, b = self._k1, self._b
+        alive, doc_len = self._alive, self._doc_len
+        scores = {}
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            docs, tfs = postings
+            idf = self._idf(len(docs))
+            for doc, tf in zip(docs, tfs):
+                if alive[doc]:
+                    norm = k1 * (1 - b + b * doc_len[doc] / avg_len)
+                    scores[doc] = scores.get(doc, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return self._ranked(scores, wanted + SEARCH_RANK_SLACK), len(scores)
+
+    @staticmethod
+    def _ranked(scores, wanted):
+        """
+        Документы по убыванию оценки: сначала первые wanted (частичная сортировка), и только если
+        keep отбросил столько, что их не хватило на страницу, — остальные полной сортировкой.
+        """
+        order = lambda item: (-item[1], item[0])
+        top = heapq.nsmallest(wanted, scores.items(), key=order)
+        yield from top
+        if len(top) < len(scores):
+            yield from sorted(scores.items(), key=order)[len(top):]
+
+    def _score_numpy(self, terms):
+        # Считаются только документы из постингов запроса: длины и пометки удаления берутся
+        # через представления numpy без копирования, а не пересобираются по всем документам
+        avg_len = self._total_len / self._live_docs or 1.0
+        k1, b = self._k1, self._b
+        doc_len = np.frombuffer(self._doc_len, dtype=np.uint32)
+        alive = np.frombuffer(self._alive, dtype=np.uint8)
+        all_docs, all_scores = [], []
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            docs = np.array(postings[0], dtype=np.int64)
+            tfs = np.array(postings[1], dtype=np.float64)
+            idf = self._idf(len(docs))
+            all_docs.append(docs)
+            all_scores.append(idf * tfs * (k1 + 1) / (tfs + k1 * (1 - b + b * doc_len[docs] / avg_len)))
+        if not all_docs:
+            return iter(()), 0
+        matched, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores), minlength=len(matched))
+        keep = alive[matched] != 0
+        matched, scores = matched[keep], scores[keep]
+        # matched по возрастанию, поэтому при равных оценках порядок — по номеру документа, как в _ranked
+        order = np.argsort(-scores, kind='stable')
+        return ((int(matched[i]), float(scores[i])) for i in order), len(matched)
+
+    def _compact(self):
+        """
+        Убирает удалённые документы из постингов и перенумеровывает оставшиеся; вызывать под lock.
+        """
+        if self._live_docs == len(self._keys):
+            return
+        renumber = array('q', [-1]) * len(self._keys)
+        keys, doc_len = [], array('I')
+        for doc, key in enumerate(self._keys):
+            if self._alive[doc]:
+                renumber[doc] = len(keys)
+                keys.append(key)
+                doc_len.append(self._doc_len[doc])
+        postings = {}
+        for term, (docs, tfs) in self._postings.items():
+            new_docs, new_tfs = array('I'), array('H')
+            for doc, tf in zip(docs, tfs):
+                if renumber[doc] >= 0:
+                    new_docs.append(renumber[doc])
+                    new_tfs.append(tf)
+            if new_docs:
+                postings[term] = (new_docs, new_tfs)
+        self._keys = keys
+        self._doc_by_key = {key: doc for doc, key in enumerate(keys)}
+        self._doc_len = doc_len
+        self._alive = bytearray(b'\x01') * len(keys)
+        self._postings = postings
+
+    def save(self, path=SEARCH_INDEX_PATH):
+        """
+        Записывает индекс на диск, если он менялся с прошлого сохранения (атомарно: tmp, fsync, os.replace).
+        Возвращает True, если файл записан.
+        """
+        with self._lock:
+            if self.version == self._saved_version:
+                return False
+            if len(self._keys) - self._live_docs > len(self._keys) * SEARCH_COMPACT_DEAD_RATIO:
+                self._compact()
+            terms = list(self._postings)
+            offsets = array('Q', [0])
+            for term in terms:
+                offsets.append(offsets[-1] + len(self._postings[term][0]))
+            sections = [
+                ('keys', json.dumps(self._keys, ensure_ascii=False).encode('utf-8')),
+                ('terms', '\n'.join(terms).encode('utf-8')),
+                ('doc_len', self._doc_len.tobytes()),
+                ('alive', bytes(self._alive)),
+                ('offsets', offsets.tobytes()),
+            ]
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = f'{path}.tmp'
+            layout, position = {}, 0
+            for name, data in sections:
+                layout[name] = [position, len(data)]
+                position += len(data)
+            layout['docs'] = [position, offsets[-1] * 4]
+            layout['tfs'] = [position + offsets[-1] * 4, offsets[-1] * 2]
+            header = json.dumps({'docs': len(self._keys), 'live_docs': self._live_docs, 'terms': len(terms),
+                                 'byteorder': sys.byteorder, 'total_len': self._total_len,
+                                 'sections': layout}).encode('utf-8')
+            with open(tmp_path, 'wb') as f:
+                f.write(MAGIC)
+                f.write(len(header).to_bytes(8, 'little'))
+                f.write(header)
+                for _, data in sections:
+                    f.write(data)
+                for term in terms:
+                    f.write(self._postings[term][0].tobytes())
+                for term in terms:
+                    f.write(self._postings[term][1].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            self._saved_version = self.version
+        return True
+
+    def load(self, path=SEARCH_INDEX_PATH):
+        """
+        Загружает индекс, сохранённый save(). Возвращает число документов.
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('неизвестный формат поискового индекса')
+        header_len = int.from_bytes(data[len(MAGIC):len(MAGIC) + 8], 'little')
+        start = len(MAGIC) + 8
+        header = json.loads(data[start:start + header_len])
+        base = start + header_len
+        view = memoryview(data)
+
+        def section(name, typecode=None):
+            offset, length = header['sections'][name]
+            chunk = view[base + offset:base + offset + length]
+            if typecode is None:
+                return bytes(chunk)
+            column = array(typecode)
+            column.frombytes(chunk)
+            if header['byteorder'] != sys.byteorder:
+                column.byteswap()
+            return column
+
+        keys = json.loads(section('keys'))
+        terms = section('terms').decode('utf-8').split('\n') if header['terms'] else []
+        doc_len = section('doc_len', 'I')
+        alive = bytearray(section('alive'))
+        offsets = section('offsets', 'Q')
+        docs = section('docs', 'I')
+        tfs = section('tfs', 'H')
+        if (len(keys) != header['docs'] or len(doc_len) != len(keys) or len(alive) != len(keys)
+                or len(offsets) != len(terms) + 1):
+            raise ValueError('повреждённый поисковый индекс')
+        postings = {term: (docs[offsets[i]:offsets[i + 1]], tfs[offsets[i]:offsets[i + 1]])
+                    for i, term in enumerate(terms)}
+        with self._lock:
+            self._keys = keys
+            self._doc_by_key = {key: doc for doc, key in enumerate(keys) if alive[doc]}
+            self._doc_len = doc_len
+            self._alive = alive
+            self._postings = postings
+            self._live_docs = header['live_docs']
+            self._total_len = header['total_len']
+            self.version += 1
+            self._saved_version = self.version
+        return self._live_docs
+
+    def stats(self):
+        with self._lock:
+            return {'docs': self._live_docs, 'terms': len(self._postings),
+                    'postings': sum(len(docs) for docs, _ in self._postings.values())}
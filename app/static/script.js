@@ -1,11 +1,15 @@
 let chart;
 let histChart;
 let logs = [];
-let allLogs = [];
 let currentPage = 1;
+let totalLogs = 0;
 const logsPerPage = window.LOGS_PER_PAGE || 10;
 let filters = { filename: '', date: '' };
 let sortState = { column: null, asc: true };
+// Последнее состояние графиков и summary — к нему применяются события из /events
+let statsData = {};
+let histData = {};
+let summaryData = null;
 
 const UI_CONST = {
     UPDATE_INTERVAL_MS: 60000, // 1 минута
@@ -24,33 +28,60 @@ const UI_CONST = {
     CHART_X_MINUTES: 'Время (минуты)',
     CHART_X_DAYS: 'Дата',
     CHART_Y_FILES: 'Файлов',
+    STATS_RANGE_HOURS: 24, // сколько последних часов показывать на графике по минутам
+    EVENTS_RESYNC_DELAY_MS: 3000, // пауза перед полной загрузкой, если поток /events закрылся
 };
 
+// Первая минута, которая попадает на график
+function statsRangeStart() {
+    const pad = n => n.toString().padStart(2, '0');
+    const from = new Date(Date.now() - UI_CONST.STATS_RANGE_HOURS * 3600 * 1000);
+    return `${from.getFullYear()}-${pad(from.getMonth()+1)}-${pad(from.getDate())} ${pad(from.getHours())}:${pad(from.getMinutes())}`;
+}
+
 async function fetchStats() {
-    const res = await fetch('/stats');
+    // Запрашиваем только минуты, которые попадают на график
+    const res = await fetch('/stats?start=' + encodeURIComponent(statsRangeStart()));
     const data = await res.json();
     if (data.error) {
         showError(data.error);
         return null;
     }
+    rememberVersion('stats', res);
+    statsData = data;
     return data;
 }
 
 async function fetchHistogram() {
     const res = await fetch('/histogram');
     const data = await res.json();
+    rememberVersion('hist', res);
+    histData = data;
     return data;
 }
 
-async function fetchLogs() {
-    let url = '/logs';
-    const params = [];
+// Сервер отдаёт только текущую страницу (без текста логов) в нужном порядке
+function logsPageUrl() {
+    const params = [
+        'include_text=false',
+        'limit=' + logsPerPage,
+        'offset=' + (currentPage - 1) * logsPerPage,
+    ];
+    // Сортирует сервер: по времени (по умолчанию) или по выбранной колонке среди всех подходящих логов
+    if (sortState.column && sortState.column !== 'received_at') params.push('sort=' + sortState.column);
+    if (sortState.column && !sortState.asc) params.push('order=desc');
     if (filters.filename) params.push('filename=' + encodeURIComponent(filters.filename));
     if (filters.date) params.push('date=' + encodeURIComponent(filters.date));
-    if (params.length) url += '?' + params.join('&');
-    const res = await fetch(url);
+    return '/logs?' + params.join('&');
+}
+
+async function fetchLogs() {
+    const res = await fetch(logsPageUrl());
     const data = await res.json();
-    logs = data;
+    if (data.error) return;
+    rememberVersion('logs', res);
+    logs = data.items;
+    totalLogs = data.total;
     renderLogsTable(logs);
 }
 
@@ -58,11 +89,20 @@ async function fetchSummary() {
     const res = await fetch('/summary');
     const data = await res.json();
     if (!data.error) {
-        document.getElementById('totalFiles').textContent = `${UI_CONST.TOTAL_FILES_LABEL}: ${data.total_files}`;
-        document.getElementById('totalDuration').textContent = `${UI_CONST.TOTAL_DURATION_LABEL}: ${formatDuration(data.total_duration)}`;
-        if (data.total_size !== undefined) {
-            document.getElementById('totalSize').textContent = `Общий объем: ${formatFileSize(data.total_size)}`;
-        }
+        rememberVersion('summary', res);
+        summaryData = data;
+        renderSummary(data);
+    }
+}
+
+function renderSummary(data) {
+    document.getElementById('totalFiles').textContent = `${UI_CONST.TOTAL_FILES_LABEL}: ${data.total_files}`;
+    document.getElementById('totalDuration').textContent = `${UI_CONST.TOTAL_DURATION_LABEL}: ${formatDuration(data.total_duration)}`;
+    if (data.total_size !== undefined) {
+        document.getElementById('totalSize').textContent = `Общий объем: ${formatFileSize(data.total_size)}`;
+    }
+    if (data.queue_depth !== undefined) {
+        document.getElementById('ingestQueue').textContent = `Очередь: ${data.queue_depth} (задержка ${Math.round(data.queue_lag)} ${UI_CONST.DURATION_SEC})`;
     }
 }
 
@@ -176,39 +216,7 @@ function updateHistChart(data) {
 function renderLogsTable(logs) {
     const tbody = document.querySelector('#logsTable tbody');
     tbody.innerHTML = '';
-    let sortedLogs = [...logs];
-    if (sortState.column) {
-        sortedLogs.sort((a, b) => {
-            let valA, valB;
-            switch (sortState.column) {
-                case 'received_at':
-                    valA = new Date(a.received_at).getTime();
-                    valB = new Date(b.received_at).getTime();
-                    break;
-                case 'filename':
-                    valA = a.filename.toLowerCase();
-                    valB = b.filename.toLowerCase();
-                    break;
-                case 'duration':
-                    valA = Number(a.duration);
-                    valB = Number(b.duration);
-                    break;
-                case 'size':
-                    valA = Number(a.size);
-                    valB = Number(b.size);
-                    break;
-                default:
-                    return 0;
-            }
-            if (valA < valB) return sortState.asc ? -1 : 1;
-            if (valA > valB) return sortState.asc ? 1 : -1;
-            return 0;
-        });
-    }
-    const start = (currentPage - 1) * logsPerPage;
-    const end = start + logsPerPage;
-    const pageLogs = sortedLogs.slice(start, end);
-    for (const log of pageLogs) {
+    for (const log of logs) {
         const tr = document.createElement('tr');
         tr.innerHTML = `
             <td>${formatDateTime(log.received_at)}</td>
@@ -217,12 +225,12 @@ function renderLogsTable(logs) {
             <td>${formatFileSize(log.size)}</td>
             <td>
                 <button class="open-log-btn" onclick="openLogModal('${log.filename.replace(/'/g, '\'')}', '${log.received_at.replace(/'/g, '\'')}', '${log.file_id || ''}')">Открыть</button>
-                <button class="open-log-btn delete-log-btn" onclick="deleteLog('${log.file_id || ''}')">Удалить</button>
+                <button class="open-log-btn delete-log-btn" onclick="deleteLog('${log.file_id || ''}', '${log.local_id || ''}')">Удалить</button>
             </td>
         `;
         tbody.appendChild(tr);
     }
-    renderPagination(logs.length);
+    renderPagination(totalLogs);
 }
 
 function openLogModal(filename, received_at, file_id) {
@@ -231,7 +239,8 @@ function openLogModal(filename, received_at, file_id) {
     fetch(`/log_text?filename=${encodeURIComponent(filename)}&received_at=${encodeURIComponent(received_at)}`)
         .then(res => res.json())
         .then(data => {
-            let gdocLink = file_id ? `<a href='https://drive.google.com/file/d/${file_id}/view' target='_blank' style='color:#8be9fd;'>Открыть в Google Docs</a><br><br>` : '';
+            // Запись из пачки (file_id вида '<id пачки>#<диапазон>') открывается как файл пачки
+            let gdocLink = file_id ? `<a href='https://drive.google.com/file/d/${file_id.split('#')[0]}/view' target='_blank' style='color:#8be9fd;'>Открыть в Google Docs</a><br><br>` : '';
             document.getElementById('logText').innerHTML =
                 gdocLink +
                 `<div class='log-text-block'><pre style="white-space:pre-wrap;word-break:break-all;margin:0;max-height:600px;overflow:auto;">${data.text ? escapeHtml(data.text) : 'Нет данных'}</pre></div>` +
@@ -280,7 +289,7 @@ function renderPagination(totalLogs) {
         btn.onclick = () => {
             if (i !== currentPage && typeof i === 'number') {
                 currentPage = i;
-                renderLogsTable(logs);
+                fetchLogs();
             }
         };
         container.appendChild(btn);
@@ -318,14 +327,8 @@ function renderPagination(totalLogs) {
 }
 
 function loadLogs() {
-    fetch('/logs')
-        .then(res => res.json())
-        .then(data => {
-            allLogs = data;
-            logs = data;
-            currentPage = 1;
-            renderLogsTable(logs);
-        });
+    currentPage = 1;
+    fetchLogs();
 }
 
 async function openLog(filename, received_at) {
@@ -341,6 +344,7 @@ function closeModal() {
 function applyFilters() {
     filters.filename = document.getElementById('filenameFilter').value.trim();
     filters.date = document.getElementById('dateFilter').value;
+    currentPage = 1;
     fetchLogs();
 }
 function resetFilters() {
@@ -358,9 +362,193 @@ async function updateCharts() {
     updateHistChart(hist);
 }
 
-async function refreshTableAndSummary() {
-    await fetchLogs();
-    await fetchSummary();
+// --- Поток изменений с сервера (/events) ---
+// Номер последнего события, уже учтённого в каждом представлении (заголовок X-Event-Id ответа)
+let versions = { stats: 0, hist: 0, logs: 0, summary: 0 };
+let streamEpoch = null;
+let eventSource = null;
+let renderTimer = null;
+let logsRefetchTimer = null;
+const dirty = { charts: false, logs: false, summary: false };
+
+function rememberVersion(view, res) {
+    const token = res.headers.get('X-Event-Id');
+    if (!token) return;
+    const [epoch, seq] = token.split(':');
+    streamEpoch = epoch;
+    versions[view] = Number(seq);
+}
+
+// Перерисовка не чаще раза в 200 мс, даже если события идут пачкой
+function scheduleRender(what) {
+    dirty[what] = true;
+    if (renderTimer) return;
+    renderTimer = setTimeout(() => {
+        renderTimer = null;
+        if (dirty.charts) {
+            trimStats();
+            updateChart(statsData);
+            updateHistChart(histData);
+        }
+        if (dirty.logs) renderLogsTable(logs);
+        if (dirty.summary && summaryData) renderSummary(summaryData);
+        dirty.charts = dirty.logs = dirty.summary = false;
+    }, 200);
+}
+
+// Удаление сдвигает страницы — текущую перечитываем (одна страница, не чаще раза в секунду)
+function scheduleLogsRefetch() {
+    if (logsRefetchTimer) return;
+    logsRefetchTimer = setTimeout(() => {
+        logsRefetchTimer = null;
+        fetchLogs();
+    }, 1000);
+}
+
+function addToBucket(data, key, count) {
+    if (!key) return;
+    const value = (data[key] || 0) + count;
+    if (value > 0) data[key] = value;
+    else delete data[key];
+}
+
+// Минуты, ушедшие за левую границу графика
+function trimStats() {
+    const start = statsRangeStart();
+    for (const minute of Object.keys(statsData)) {
+        if (minute < start) delete statsData[minute];
+    }
+}
+
+function matchesFilters(entry) {
+    if (filters.filename && !String(entry.filename).includes(filters.filename)) return false;
+    if (filters.date && !String(entry.received_at).startsWith(filters.date)) return false;
+    return true;
+}
+
+function sameLog(a, b) {
+    return (a.local_id && a.local_id === b.local_id) || (a.file_id && a.file_id === b.file_id);
+}
+
+function applyDelta(seq, delta) {
+    if (seq > versions.stats) {
+        if (delta.minute && delta.minute >= statsRangeStart()) addToBucket(statsData, delta.minute, delta.count);
+        versions.stats = seq;
+        scheduleRender('charts');
+    }
+    if (seq > versions.hist) {
+        addToBucket(histData, delta.day, delta.count);
+        versions.hist = seq;
+        scheduleRender('charts');
+    }
+    if (seq > versions.summary && summaryData) {
+        summaryData.total_files += delta.count;
+        summaryData.total_duration += delta.duration;
+        summaryData.total_size += delta.size;
+        versions.summary = seq;
+        scheduleRender('summary');
+    }
+}
+
+function applyLogAdded(seq, entry) {
+    if (seq <= versions.logs) return;
+    versions.logs = seq;
+    if (!matchesFilters(entry)) return;
+    totalLogs += 1;
+    if (sortState.column && sortState.column !== 'received_at') {
+        // Место новой записи при сортировке по колонке знает только сервер
+        scheduleLogsRefetch();
+        return;
+    }
+    const desc = sortState.column === 'received_at' && !sortState.asc;
+    if (desc && currentPage === 1) {
+        // Новые логи — в начале первой страницы
+        logs.unshift(entry);
+        if (logs.length > logsPerPage) logs.pop();
+    } else if (!desc && currentPage === Math.ceil(totalLogs / logsPerPage) && logs.length < logsPerPage) {
+        // ...или в конце последней
+        logs.push(entry);
+    }
+    scheduleRender('logs');
+}
+
+function applyLogUpdated(seq, data) {
+    if (seq <= versions.logs) return;
+    versions.logs = seq;
+    const log = logs.find(l => l.local_id === data.local_id);
+    if (log) {
+        log.file_id = data.file_id;
+        scheduleRender('logs');
+    }
+}
+
+function applyLogDeleted(seq, entry) {
+    if (seq <= versions.logs) return;
+    versions.logs = seq;
+    if (!matchesFilters(entry)) return;
+    totalLogs = Math.max(totalLogs - 1, 0);
+    const idx = logs.findIndex(l => sameLog(l, entry));
+    if (idx !== -1) {
+        logs.splice(idx, 1);
+        scheduleLogsRefetch();
+    }
+    scheduleRender('logs');
+}
+
+function handleEvent(type, e) {
+    if (type === 'reset') {
+        resync();
+        return;
+    }
+    const data = JSON.parse(e.data);
+    if (type === 'queue') {
+        if (summaryData) {
+            summaryData.queue_depth = data.depth;
+            summaryData.queue_lag = data.lag;
+            scheduleRender('summary');
+        }
+        return;
+    }
+    const seq = Number(e.lastEventId.split(':')[1]);
+    if (type === 'log_added') {
+        applyDelta(seq, data.delta);
+        applyLogAdded(seq, data.entry);
+    } else if (type === 'log_deleted') {
+        applyDelta(seq, data.delta);
+        applyLogDeleted(seq, data.entry);
+    } else if (type === 'log_updated') {
+        applyLogUpdated(seq, data);
+    }
+}
+
+function connectEvents() {
+    if (eventSource) eventSource.close();
+    // Досылаем всё, что произошло после самого старого из загруженных представлений;
+    // при обрыве браузер сам переподключится с Last-Event-ID последнего полученного события
+    const since = Math.min(versions.stats, versions.hist, versions.logs, versions.summary);
+    const query = streamEpoch ? '?last_event_id=' + encodeURIComponent(`${streamEpoch}:${since}`) : '';
+    eventSource = new EventSource('/events' + query);
+    for (const type of ['log_added', 'log_updated', 'log_deleted', 'queue', 'reset']) {
+        eventSource.addEventListener(type, e => handleEvent(type, e));
+    }
+    // Обычный обрыв браузер переподключает сам с Last-Event-ID: пропущенное сервер дошлёт или пришлёт reset.
+    // Если поток закрыт совсем (сервер ответил ошибкой), состояние загружается заново после паузы
+    const source = eventSource;
+    source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED && eventSource === source) {
+            setTimeout(() => { if (eventSource === source) resync(); }, UI_CONST.EVENTS_RESYNC_DELAY_MS);
+        }
+    };
+}
+
+// Полная загрузка состояния и подписка на изменения после неё
+async function resync() {
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+    }
+    await Promise.all([updateCharts(), fetchLogs(), fetchSummary()]);
+    connectEvents();
 }
 
 window.onload = async function() {
@@ -378,7 +566,7 @@ window.onload = async function() {
                     sortState.asc = true;
                 }
                 currentPage = 1;
-                renderLogsTable(logs);
+                fetchLogs();
             };
         }
     });
@@ -427,29 +615,20 @@ window.onload = async function() {
     updateRunpodStatus();
     setInterval(updateRunpodStatus, 15000); // обновлять статус каждые 15 секунд
 
-    loadLogs();
-    await updateCharts();
-    await refreshTableAndSummary();
-    setInterval(updateCharts, UI_CONST.UPDATE_INTERVAL_MS); // графики раз в минуту
-    setInterval(refreshTableAndSummary, 1000); // таблица и summary раз в секунду
+    // Дальше таблица, графики и summary обновляются событиями из /events
+    await resync();
+    setInterval(() => scheduleRender('charts'), UI_CONST.UPDATE_INTERVAL_MS); // сдвиг окна графика раз в минуту, без запросов
 };
 
-// --- Периодическая полная синхронизация с Google Drive ---
-async function fullSyncFromServer() {
-    await fetchLogs();
-    await fetchSummary();
-}
-setInterval(fullSyncFromServer, 5 * 60 * 1000); // раз в 5 минут
-
-async function deleteLog(file_id) {
-    const btn = document.querySelector(`button[onclick*="deleteLog('${file_id}'"]`);
+async function deleteLog(file_id, local_id) {
+    const btn = document.querySelector(`button[onclick*="deleteLog('${file_id}', '${local_id}'"]`);
     if (btn) btn.classList.add('loading-btn');
-    const url = `/log?file_id=${encodeURIComponent(file_id)}`;
+    // Ещё не выгруженный на Google Drive лог удаляется по local_id
+    const url = file_id ? `/log?file_id=${encodeURIComponent(file_id)}` : `/log?local_id=${encodeURIComponent(local_id)}`;
     const res = await fetch(url, { method: 'DELETE' });
     const data = await res.json();
     if (data.status === 'deleted') {
-        logs = logs.filter(l => l.file_id !== file_id);
-        renderLogsTable();
+        await fetchLogs();
         await fetchSummary();
     } else {
         alert(data.error || UI_CONST.DELETE_ERROR_TEXT);
@@ -0,0 +1,193 @@
+"""
+Статика и страницы UI из памяти. Файлы app/static читаются один раз при старте; для каждого заранее
+считаются ETag (хэш содержимого) и сжатые варианты gzip и brotli (если установлен пакет brotli).
+Ссылки на /static/... внутри HTML дополняются ?v=<хэш>: ответ по такой ссылке кэшируется браузером
+навсегда (immutable), а изменённый файл получает новый URL. Сами страницы отдаются с no-cache
+и проверяются по ETag (304 без тела). STATIC_RELOAD = True — файлы перечитываются при изменении.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from starlette.responses import Response
+from .constants import *
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен: без него отдаются gzip и несжатые варианты
+    brotli = None
+
+_COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+_STATIC_LINK = re.compile(r'''(["'])/static/([^"'?#]+)\1''')
+# Порядок предпочтения, если клиент принимает несколько кодировок
+_ENCODINGS = ('br', 'gzip')
+
+
+class _Asset:
+    """
+    Содержимое файла или страницы: несжатый и сжатые варианты и ETag по хэшу несжатого.
+    """
+    def __init__(self, body, content_type):
+        self.content_type = content_type
+        self.hash = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {'identity': body}
+        if content_type.startswith(_COMPRESSIBLE_TYPES) and len(body) >= STATIC_COMPRESS_MIN_BYTES:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants['br'] = compressed
+
+    def etag(self, encoding):
+        # У каждого варианта свой сильный ETag; совпадение проверяется по хэшу содержимого
+        return f'"{self.hash}"' if encoding == 'identity' else f'"{self.hash}-{encoding}"'
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def _etag_matches(header, asset_hash):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag.strip('"').split('-', 1)[0] == asset_hash:
+            return True
+    return False
+
+
+class StaticAssets:
+    """
+    Файлы каталога directory по относительным путям и страницы (маршрут -> HTML-файл с преобразованием).
+    """
+    def __init__(self, directory=STATIC_DIR, reload=STATIC_RELOAD):
+        self._directory = directory
+        self._reload = reload
+        self._pages = {}  # маршрут -> (имя файла, transform)
+        self._lock = threading.Lock()
+        self._signature = None
+        self._files = {}
+        self._rendered = {}
+        self._load()
+
+    def _scan(self):
+        """
+        Относительные пути файлов каталога и подпись (mtime, размер) для проверки изменений.
+        """
+        found = {}
+        for root, _, names in os.walk(self._directory):
+            for name in names:
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                found[os.path.relpath(path, self._directory).replace(os.sep, '/')] = (st.st_mtime_ns, st.st_size)
+        return found
+
+    def _load(self):
+        signature = self._scan()
+        raw = {}
+        for name in signature:
+            with open(os.path.join(self._directory, name), 'rb') as f:
+                raw[name] = f.read()
+        files = {}
+        # Сначала всё, кроме HTML: их хэши подставляются в ссылки страниц
+        for name, body in raw.items():
+            if not name.endswith('.html'):
+                files[name] = _Asset(body, self._content_type(name))
+        for name, body in raw.items():
+            if name.endswith('.html'):
+                files[name] = _Asset(self._link_versions(body.decode('utf-8'), files).encode('utf-8'), 'text/html')
+        self._files = files
+        self._rendered = {route: self._render(name, transform) for route, (name, transform) in self._pages.items()}
+        self._signature = signature
+
+    @staticmethod
+    def _content_type(name):
+        content_type, _ = mimetypes.guess_type(name)
+        return content_type or 'application/octet-stream'
+
+    @staticmethod
+    def _link_versions(html, files):
+        def versioned(match):
+            asset = files.get(match.group(2))
+            if asset is None:
+                return match.group(0)
+            quote = match.group(1)
+            return f'{quote}/static/{match.group(2)}?v={asset.hash}{quote}'
+        return _STATIC_LINK.sub(versioned, html)
+
+    def _render(self, name, transform):
+        html = self._files[name].variants['identity'].decode('utf-8')
+        if transform is not None:
+            html = transform(html)
+        return _Asset(html.encode('utf-8'), 'text/html')
+
+    def _refresh(self):
+        if not self._reload:
+            return
+        with self._lock:
+            if self._scan() != self._signature:
+                self._load()
+
+    def add_page(self, route, name, transform=None):
+        """
+        Страница route — HTML-файл name после transform(html); преобразование выполняется один раз при загрузке.
+        """
+        with self._lock:
+            self._pages[route] = (name, transform)
+            self._rendered[route] = self._render(name, transform)
+
+    def _respond(self, request, asset, cache_control):
+        accepted = _accepted_encodings(request.headers.get('accept-encoding'))
+        encoding = next((e for e in _ENCODINGS if e in accepted and e in asset.variants), 'identity')
+        headers = {'ETag': asset.etag(encoding), 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+        if _etag_matches(request.headers.get('if-none-match'), asset.hash):
+            return Response(status_code=304, headers=headers)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(asset.variants[encoding], media_type=asset.content_type, headers=headers)
+
+    def page_response(self, request, route):
+        self._refresh()
+        return self._respond(request, self._rendered[route], 'no-cache')
+
+    def file_response(self, request, name):
+        """
+        Файл из каталога; с ?v=<текущий хэш> — immutable на STATIC_IMMUTABLE_MAX_AGE_SEC, иначе no-cache.
+        """
+        self._refresh()
+        asset = self._files.get(name)
+        if asset is None:
+            return Response('Not Found', status_code=404, media_type='text/plain')
+        if request.query_params.get('v') == asset.hash:
+            cache_control = f'public, max-age={STATIC_IMMUTABLE_MAX_AGE_SEC}, immutable'
+        else:
+            cache_control = 'no-cache'
+        return self._respond(request, asset, cache_control)
+
+    def stats(self):
+        files = self._files
+        return {
+            'files': len(files),
+            'bytes': sum(len(v) for asset in files.values() for v in asset.variants.values()),
+            'brotli': brotli is not None,
+        }
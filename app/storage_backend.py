@@ -0,0 +1,706 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict
+from .constants import *
+from .log_bundle import parse_bundle_ref, read_bundle_record
+from .metrics import span
+
+INDEX_FILENAME = 'logs_index.json'
+INDEX_DELTA_PREFIX = 'logs_index.delta.'
+LAST_ONLINE_FILENAME = 'last_online.txt'
+TOMBSTONES_FILENAME = 'bundle_tombstones.json'
+
+
+def apply_index_ops(index, ops):
+    """
+    Применяет к списку логов пачку операций {'op': 'add', 'entry': ...} / {'op': 'remove', 'file_id': ...}.
+    Повторное добавление того же file_id игнорируется, поэтому сегменты можно применять повторно;
+    добавление после remove того же file_id в пачке проходит.
+    """
+    known = {e.get('file_id') for e in index if e.get('file_id')}
+    removed = {}  # file_id -> сколько записей было в списке на момент remove; более поздние остаются
+    for op in ops:
+        if op.get('op') == 'add':
+            entry = op.get('entry') or {}
+            file_id = entry.get('file_id')
+            if file_id:
+                if file_id in known:
+                    continue
+                known.add(file_id)
+            index.append(entry)
+        elif op.get('op') == 'remove':
+            file_id = op.get('file_id')
+            known.discard(file_id)
+            removed[file_id] = len(index)
+    if removed:
+        index = [e for i, e in enumerate(index) if i >= removed.get(e.get('file_id'), 0)]
+    return index
+
+
+def log_file_name(data: Dict):
+    # Убираем двоеточие и пробелы из received_at для имени файла
+    safe_received_at = data['received_at'].replace(':', '-').replace(' ', '_')
+    return f"{data['filename']}_{safe_received_at}{LOG_FILE_EXTENSION}"
+
+
+_delta_name_lock = threading.Lock()
+_last_delta_ms = [0]
+
+
+def delta_segment_name():
+    # Сегменты применяются в порядке имён: миллисекунды в имени строго растут, иначе два сегмента
+    # одной миллисекунды упорядочились бы по случайному суффиксу
+    with _delta_name_lock:
+        _last_delta_ms[0] = max(int(time.time() * 1000), _last_delta_ms[0] + 1)
+        ms = _last_delta_ms[0]
+    return f"{INDEX_DELTA_PREFIX}{ms:013d}_{uuid.uuid4().hex[:8]}.json"
+
+
+def format_log_body(data: Dict) -> bytes:
+    """
+    Содержимое лог-файла: строки "ключ: значение", поле text всегда последнее,
+    чтобы многострочный текст можно было прочитать целиком.
+    """
+    lines = [f"{k}: {v}\n" for k, v in data.items() if k != 'text']
+    if 'text' in data:
+        lines.append(f"text: {data['text']}\n")
+    return ''.join(lines).encode('utf-8')
+
+def _text_start(body):
+    if body.startswith('text: '):
+        return 0
+    i = body.find('\ntext: ')
+    return i + 1 if i >= 0 else -1
+
+def extract_log_text(body):
+    """
+    Возвращает текст лога из содержимого лог-файла или None, если поля text нет.
+    """
+    start = _text_start(body)
+    if start < 0:
+        return None
+    text = body[start + len('text: '):]
+    if text.endswith('\n'):
+        text = text[:-1]
+    return text
+
+
+class IndexLoadError(Exception):
+    """
+    Индекс не удалось загрузить: logs_index.json повреждён, а пересобрать его по лог-файлам не вышло.
+    """
+
+
+class StorageBackend:
+    """
+    Хранилище логов и индекса. Реализации: GDriveLogger (Google Drive), LocalBackend (локальный диск)
+    и MemoryBackend (в памяти); какая используется — задаёт STORAGE_BACKEND.
+
+    file_id — непрозрачный id лог-файла в хранилище (для записи из пачки — '<id пачки>#<смещение>+<длина>').
+    Индекс — базовый снимок logs_index.json плюс дельта-сегменты; index_cursor — максимальный
+    modifiedTime файлов индекса, изменения до которого уже учтены (строки одного формата сравнимы).
+    """
+    ERROR_TAG = 'Storage ERROR'  # префикс сообщений об ошибках хранилища
+
+    def __init__(self):
+        self.index_cursor = None
+        self._tombstones_lock = threading.Lock()
+
+    # --- Лог-файлы ---
+    def log_and_return_id(self, data: Dict):
+        """
+        Записывает лог-файл (с текстом) в папку текущего дня. Возвращает file_id или None при ошибке.
+        """
+        raise NotImplementedError
+
+    def upload_bundle(self, name, data: bytes):
+        """
+        Записывает пачку логов (см. app/log_bundle.py) и возвращает её id; ошибки пробрасываются.
+        """
+        raise NotImplementedError
+
+    def download_bytes(self, file_id) -> bytes:
+        raise NotImplementedError
+
+    def download_range(self, file_id, offset, length) -> bytes:
+        raise NotImplementedError
+
+    def delete_log_file(self, file_id):
+        """
+        Удаляет лог-файл; ошибки только печатаются. Запись из пачки только помечается удалённой
+        (delete_bundle_record), остальные записи пачки остаются на месте.
+        """
+        raise NotImplementedError
+
+    def delete_files(self, file_ids):
+        """
+        Удаляет файлы; уже удалённые считаются удалёнными. Возвращает file_id, которые удалить не удалось.
+        """
+        raise NotImplementedError
+
+    def list_all_logs(self):
+        """
+        Все лог-файлы и пачки логов: [{'id', 'name', 'date'}].
+        """
+        raise NotImplementedError
+
+    # --- Индекс: примитивы хранилища ---
+    def _read_base_index(self):
+        """
+        Содержимое logs_index.json (пустой список, если файла ещё нет); ошибки чтения пробрасываются.
+        """
+        raise NotImplementedError
+
+    def _read_index_delta(self, file_id):
+        """
+        Операции дельта-сегмента; ошибки чтения пробрасываются.
+        """
+        raise NotImplementedError
+
+    def _index_meta(self):
+        """
+        Метаданные logs_index.json: {'id', 'modifiedTime'} (пустой dict, если файла нет).
+        """
+        raise NotImplementedError
+
+    def _index_meta_and_deltas(self, since):
+        """
+        Метаданные logs_index.json и дельта-сегменты после since.
+        """
+        return self._index_meta(), self.list_index_deltas(since=since)
+
+    def list_index_deltas(self, since=None):
+        """
+        Дельта-сегменты индекса ({'id', 'name', 'modifiedTime'}) в порядке создания;
+        since — только изменённые после этого modifiedTime.
+        """
+        raise NotImplementedError
+
+    def append_index_delta(self, ops):
+        """
+        Записывает пачку изменений индекса отдельным дельта-сегментом. Возвращает его id.
+        """
+        raise NotImplementedError
+
+    def save_index(self, index_data):
+        """
+        Перезаписывает logs_index.json. Возвращает его новый modifiedTime.
+        """
+        raise NotImplementedError
+
+    # --- Удалённые записи пачек: примитивы хранилища ---
+    def _read_tombstones(self):
+        """
+        Содержимое bundle_tombstones.json (пустой список, если файла ещё нет).
+        """
+        raise NotImplementedError
+
+    def _write_tombstones(self, refs):
+        raise NotImplementedError
+
+    def save_last_online(self, dt_str):
+        raise NotImplementedError
+
+    def stats(self):
+        """
+        Статистика запросов к хранилищу по операциям.
+        """
+        return {}
+
+    # --- Общее для всех хранилищ ---
+    @span('log_text')
+    def load_log_text(self, file_id):
+        """
+        Возвращает текст лога. Для записи из пачки читается только её диапазон байт.
+        """
+        ref = parse_bundle_ref(file_id)
+        if ref is not None:
+            return read_bundle_record(self.download_range(*ref)).get('text')
+        return extract_log_text(self.download_bytes(file_id).decode('utf-8'))
+
+    def parse_log_file(self, local_path):
+        """
+        Парсит локальный лог-файл в dict. Приводит duration, size, queue_time, process_time к числам.
+        """
+        with open(local_path, encoding='utf-8') as f:
+            return self.parse_log_text(f.read())
+
+    def parse_log_text(self, text):
+        """
+        Парсит содержимое лог-файла (строки "ключ: значение") в dict.
+        """
+        data = {}
+        start = _text_start(text)
+        header = text[:start] if start >= 0 else text
+        for line in header.splitlines():
+            if ':' in line:
+                k, v = line.strip().split(':', 1)
+                data[k.strip()] = v.strip()
+        if start >= 0:
+            data['text'] = extract_log_text(text)
+        # Приведение типов
+        for key in ["duration", "queue_time", "process_time"]:
+            if key in data:
+                try:
+                    data[key] = float(data[key])
+                except Exception:
+                    data[key] = 0.0
+        if "size" in data:
+            try:
+                data["size"] = int(data["size"])
+            except Exception:
+                data["size"] = 0
+        return data
+
+    def advance_index_cursor(self, modified_time):
+        # RFC 3339 в UTC одного формата сравнивается как строка
+        if modified_time and (self.index_cursor is None or modified_time > self.index_cursor):
+            self.index_cursor = modified_time
+
+    def rebuild_index(self, **kwargs):
+        """
+        Собирает logs_index.json заново по лог-файлам (см. app/index_rebuild.py).
+        """
+        from .index_rebuild import rebuild_index
+        return rebuild_index(self, **kwargs)
+
+    def load_bundle_tombstones(self):
+        """
+        file_id удалённых записей из пачек: сами пачки не переписываются, пересборка индекса эти записи пропускает.
+        """
+        return set(self._read_tombstones())
+
+    def delete_bundle_record(self, file_id):
+        """
+        Помечает запись из пачки удалённой (дописывает её file_id в bundle_tombstones.json); ошибки только печатаются.
+        """
+        try:
+            with self._tombstones_lock:
+                refs = self._read_tombstones()
+                if file_id not in refs:
+                    refs.append(file_id)
+                    self._write_tombstones(refs)
+        except Exception as e:
+            print(f'[{self.ERROR_TAG}]: Не удалось отметить удаление записи {file_id} из пачки: {e}')
+
+    def add_log_to_index(self, log_entry):
+        self.append_index_delta([{'op': 'add', 'entry': log_entry}])
+
+    def remove_log_from_index(self, file_id):
+        self.append_index_delta([{'op': 'remove', 'file_id': file_id}])
+
+    # --- Индекс: общая логика ---
+    def _read_valid_base_index(self):
+        index = self._read_base_index()
+        if not isinstance(index, list):
+            raise ValueError('ожидался список')
+        return index
+
+    def load_index(self):
+        """
+        Базовый снимок индекса плюс все дельта-сегменты; ошибки чтения пробрасываются.
+        """
+        index = self._read_valid_base_index()
+        for segment in self.list_index_deltas():
+            index = apply_index_ops(index, self.load_index_delta(segment['id']))
+        return index
+
+    @span('index_load')
+    def load_index_with_cursor(self):
+        """
+        Полная загрузка индекса при старте: базовый снимок читается один раз
+        (повреждённый собирается заново по лог-файлам), затем применяются дельта-сегменты.
+        Возвращает (список логов, курсор modifiedTime, число дельта-сегментов).
+        Если индекс не прочитался и не пересобрался — IndexLoadError, а не пустой список.
+        """
+        meta = self._index_meta()
+        try:
+            index = self._read_valid_base_index()
+        except Exception as e:
+            print(f'[{self.ERROR_TAG}]: Индекс-файл повреждён, собираем заново по лог-файлам: {e}')
+            try:
+                index = self.rebuild_index()
+                meta['modifiedTime'] = self.index_cursor
+            except Exception as e:
+                # Повреждённый файл не перезаписываем, пересборку можно повторить
+                raise IndexLoadError(f'не удалось пересобрать индекс: {e}') from e
+        cursor = meta.get('modifiedTime')
+        segments = self.list_index_deltas()
+        for segment in segments:
+            index = apply_index_ops(index, self.load_index_delta(segment['id']))
+            cursor = max(cursor or '', segment.get('modifiedTime') or '') or None
+        return index, cursor, len(segments)
+
+    @span('index_changes')
+    def list_index_changes(self, since):
+        """
+        Изменения индекса после курсора since (modifiedTime):
+        {'base_changed': перезаписан ли logs_index.json, 'segments': новые дельта-сегменты, 'cursor': новый курсор}.
+        Читаются только метаданные.
+        """
+        meta, segments = self._index_meta_and_deltas(since)
+        cursor = since
+        for f in [meta] + segments:
+            if f.get('modifiedTime') and (cursor is None or f['modifiedTime'] > cursor):
+                cursor = f['modifiedTime']
+        return {
+            'base_changed': since is None or (meta.get('modifiedTime') or '') > since,
+            'segments': segments,
+            'cursor': cursor,
+        }
+
+    @span('index_delta_load')
+    def load_index_delta(self, file_id):
+        """
+        Операции дельта-сегмента. Ошибка чтения пробрасывается: пропущенный сегмент потерял бы свои изменения.
+        """
+        ops = self._read_index_delta(file_id)
+        if not isinstance(ops, list):
+            raise ValueError(f'дельта-сегмент {file_id}: ожидался список')
+        return ops
+
+    @span('index_compact')
+    def compact_index(self):
+        """
+        Сливает базовый снимок и все дельта-сегменты в новый logs_index.json и удаляет слитые сегменты.
+        Возвращает число слитых сегментов. Если базовый снимок или сегмент не прочитался, уплотнение
+        прерывается исключением: logs_index.json не перезаписывается и ни один сегмент не удаляется.
+        """
+        segments = self.list_index_deltas()
+        if not segments:
+            return 0
+        index = self._read_valid_base_index()
+        for segment in segments:
+            index = apply_index_ops(index, self.load_index_delta(segment['id']))
+        # Текст хранится в лог-файле; в индексе он остаётся только у записей без file_id
+        for entry in index:
+            if entry.get('file_id'):
+                entry.pop('text', None)
+        self.save_index(index)
+        self.delete_files([segment['id'] for segment in segments])
+        return len(segments)
+
+
+class ObjectStoreBackend(StorageBackend):
+    """
+    Хранилище поверх простого набора объектов с путевыми id: 'logs_index.json', 'logs_index.delta.*.json',
+    'bundle_tombstones.json' и 'last_online.txt' в корне, лог-файлы и пачки — 'YYYY-MM-DD/<префикс>_<имя>'.
+    Наследники реализуют _put, _get, _stat, _remove и _list.
+    """
+    ROOT = ''
+
+    def __init__(self):
+        super().__init__()
+        self._clock_lock = threading.Lock()
+        self._last_ns = 0
+
+    def _tick(self):
+        # modifiedTime строго растёт, иначе две записи за один квант часов не различались бы по курсору
+        with self._clock_lock:
+            self._last_ns = max(time.time_ns(), self._last_ns + 1)
+            return self._last_ns
+
+    @staticmethod
+    def _format_time(ns):
+        seconds, fraction = divmod(ns, 10 ** 9)
+        return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S') + f'.{fraction:09d}Z'
+
+    @staticmethod
+    def _object_id(folder, name, unique=False):
+        name = re.sub(r'[/\\#]', '_', name)
+        if unique:
+            # Как на Google Drive, одинаковые имена не перезаписывают друг друга
+            name = f'{uuid.uuid4().hex[:12]}_{name}'
+        return f'{folder}/{name}' if folder else name
+
+    def _put(self, file_id, data: bytes, ns):
+        raise NotImplementedError
+
+    def _get(self, file_id, offset=0, length=None) -> bytes:
+        """
+        Содержимое объекта; FileNotFoundError, если его нет.
+        """
+        raise NotImplementedError
+
+    def _stat(self, file_id):
+        """
+        {'id', 'name', 'modifiedTime'} или None, если объекта нет.
+        """
+        raise NotImplementedError
+
+    def _remove(self, file_id):
+        """
+        Удаляет объект; False, если его и не было.
+        """
+        raise NotImplementedError
+
+    def _list(self, folder):
+        """
+        Объекты папки ('' — корень): [{'id', 'name', 'modifiedTime'}]. Для корня — ещё и имена папок-дней.
+        """
+        raise NotImplementedError
+
+    def _write(self, file_id, data: bytes):
+        ns = self._tick()
+        self._put(file_id, data, ns)
+        return {'id': file_id, 'modifiedTime': self._format_time(ns)}
+
+    def _read_json(self, file_id):
+        return json.loads(self._get(file_id))
+
+    def _write_json(self, file_id, obj):
+        return self._write(file_id, json.dumps(obj, ensure_ascii=False).encode('utf-8'))
+
+    def _today(self):
+        return datetime.now().strftime(DATE_FORMAT)
+
+    @span('upload')
+    def log_and_return_id(self, data: Dict):
+        file_id = self._object_id(self._today(), log_file_name(data), unique=True)
+        try:
+            self._write(file_id, format_log_body(data))
+        except Exception as e:
+            print(f'[Storage ERROR]: Не удалось записать лог-файл: {e}')
+            return None
+        return file_id
+
+    @span('upload')
+    def upload_bundle(self, name, data: bytes):
+        return self._write(self._object_id(self._today(), name, unique=True), data)['id']
+
+    def download_bytes(self, file_id) -> bytes:
+        return self._get(file_id)
+
+    def download_range(self, file_id, offset, length) -> bytes:
+        return self._get(file_id, offset, length)
+
+    @span('delete')
+    def delete_log_file(self, file_id):
+        if parse_bundle_ref(file_id) is not None:
+            self.delete_bundle_record(file_id)
+            return
+        try:
+            self._remove(file_id)
+        except Exception as e:
+            print(f'[Storage ERROR]: Не удалось удалить файл {file_id}: {e}')
+
+    @span('delete')
+    def delete_files(self, file_ids):
+        failed = []
+        for file_id in file_ids:
+            try:
+                self._remove(file_id)
+            except Exception as e:
+                print(f'[Storage ERROR]: Не удалось удалить файл {file_id}: {e}')
+                failed.append(file_id)
+        return failed
+
+    def list_day_folders(self):
+        return [f for f in self._list(self.ROOT) if f.get('folder')]
+
+    def list_all_logs(self):
+        return [{'id': f['id'], 'name': f['name'], 'date': folder['name']}
+                for folder in self.list_day_folders() for f in self._list(folder['name'])]
+
+    def _read_base_index(self):
+        try:
+            return self._read_json(INDEX_FILENAME)
+        except FileNotFoundError:
+            return []
+
+    def _read_index_delta(self, file_id):
+        return self._read_json(file_id)
+
+    def _index_meta(self):
+        return self._stat(INDEX_FILENAME) or {}
+
+    def list_index_deltas(self, since=None):
+        segments = [f for f in self._list(self.ROOT)
+                    if not f.get('folder') and f['name'].startswith(INDEX_DELTA_PREFIX)
+                    and (not since or f['modifiedTime'] > since)]
+        segments.sort(key=lambda f: f['name'])
+        return segments
+
+    @span('index_delta_save')
+    def append_index_delta(self, ops):
+        file = self._write_json(self._object_id(self.ROOT, delta_segment_name()), ops)
+        self.advance_index_cursor(file['modifiedTime'])
+        return file['id']
+
+    @span('index_save')
+    def save_index(self, index_data):
+        file = self._write_json(INDEX_FILENAME, index_data)
+        self.advance_index_cursor(file['modifiedTime'])
+        return file['modifiedTime']
+
+    def _read_tombstones(self):
+        try:
+            return self._read_json(TOMBSTONES_FILENAME)
+        except FileNotFoundError:
+            return []
+
+    def _write_tombstones(self, refs):
+        self._write_json(TOMBSTONES_FILENAME, refs)
+
+    def save_last_online(self, dt_str):
+        self._write(LAST_ONLINE_FILENAME, dt_str.encode('utf-8'))
+
+
+class LocalBackend(ObjectStoreBackend):
+    """
+    Хранилище в каталоге на локальном диске (LOCAL_STORAGE_DIR) с той же раскладкой, что и на Google Drive:
+    индекс и дельта-сегменты в корне, лог-файлы в папках-днях. Файлы пишутся атомарно (через временный
+    файл и rename) с fsync; modifiedTime — mtime файла в наносекундах.
+    """
+    def __init__(self, path=LOCAL_STORAGE_DIR):
+        super().__init__()
+        self._root = os.path.abspath(path)
+        os.makedirs(self._root, exist_ok=True)
+
+    def _path(self, file_id):
+        # file_id приходит и из запросов (DELETE /log): за пределы каталога хранилища не выходим
+        path = os.path.normpath(os.path.join(self._root, file_id or ''))
+        if not path.startswith(self._root + os.sep):
+            raise FileNotFoundError(f'некорректный file_id: {file_id}')
+        return path
+
+    def _put(self, file_id, data: bytes, ns):
+        path = self._path(file_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.utime(tmp, ns=(ns, ns))
+        os.replace(tmp, path)
+
+    def _get(self, file_id, offset=0, length=None) -> bytes:
+        with open(self._path(file_id), 'rb') as f:
+            f.seek(offset)
+            return f.read() if length is None else f.read(length)
+
+    def _stat(self, file_id):
+        try:
+            path = self._path(file_id)
+            return {'id': file_id, 'name': os.path.basename(path),
+                    'modifiedTime': self._format_time(os.stat(path).st_mtime_ns)}
+        except FileNotFoundError:
+            return None
+
+    def _remove(self, file_id):
+        try:
+            os.remove(self._path(file_id))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _list(self, folder):
+        base = os.path.join(self._root, folder) if folder else self._root
+        result = []
+        try:
+            entries = list(os.scandir(base))
+        except FileNotFoundError:
+            return result
+        for entry in entries:
+            if entry.name.endswith('.tmp'):
+                continue
+            if entry.is_dir():
+                if not folder:
+                    result.append({'id': entry.name, 'name': entry.name, 'folder': True})
+                continue
+            file_id = self._object_id(folder, entry.name)
+            result.append({'id': file_id, 'name': entry.name,
+                           'modifiedTime': self._format_time(entry.stat().st_mtime_ns)})
+        return result
+
+
+class MemoryBackend(ObjectStoreBackend):
+    """
+    Хранилище в памяти процесса: для нагрузочных замеров и проверок без Google Drive.
+    Содержимое теряется при перезапуске (принятые, но не попавшие в индекс логи остаются в журнале приёма).
+    """
+    def __init__(self):
+        super().__init__()
+        self._objects = {}  # file_id -> (данные, modifiedTime в наносекундах)
+        self._lock = threading.Lock()
+
+    def _put(self, file_id, data: bytes, ns):
+        with self._lock:
+            self._objects[file_id] = (bytes(data), ns)
+
+    def _get(self, file_id, offset=0, length=None) -> bytes:
+        with self._lock:
+            item = self._objects.get(file_id)
+        if item is None:
+            raise FileNotFoundError(file_id)
+        data = item[0]
+        return data[offset:] if length is None else data[offset:offset + length]
+
+    def _stat(self, file_id):
+        with self._lock:
+            item = self._objects.get(file_id)
+        if item is None:
+            return None
+        return {'id': file_id, 'name': file_id.rpartition('/')[2], 'modifiedTime': self._format_time(item[1])}
+
+    def _remove(self, file_id):
+        with self._lock:
+            return self._objects.pop(file_id, None) is not None
+
+    def _list(self, folder):
+        with self._lock:
+            items = list(self._objects.items())
+        result = []
+        folders = set()
+        for file_id, (_, ns) in items:
+            parent, _, name = file_id.rpartition('/')
+            if parent == folder:
+                result.append({'id': file_id, 'name': name, 'modifiedTime': self._format_time(ns)})
+            elif not folder and parent:
+                folders.add(parent)
+        result.extend({'id': name, 'name': name, 'folder': True} for name in sorted(folders))
+        return result
+
+
+_backend_instance = None
+_backend_lock = threading.Lock()
+
+def storage_available():
+    """
+    Можно ли работать с хранилищем: для Google Drive нужен client_secret.json.
+    """
+    return STORAGE_BACKEND != 'gdrive' or os.path.exists(GOOGLE_CREDENTIALS_FILE)
+
+def get_storage():
+    """
+    Возвращает единственное на процесс хранилище, выбранное STORAGE_BACKEND, создавая его при первом обращении.
+    """
+    global _backend_instance
+    if STORAGE_BACKEND == 'gdrive':
+        from .gdrive_logger import get_logger
+        return get_logger()
+    if _backend_instance is None:
+        with _backend_lock:
+            if _backend_instance is None:
+                if STORAGE_BACKEND == 'local':
+                    _backend_instance = LocalBackend()
+                elif STORAGE_BACKEND == 'memory':
+                    _backend_instance = MemoryBackend()
+                else:
+                    raise ValueError(f'Неизвестное хранилище STORAGE_BACKEND = {STORAGE_BACKEND!r}')
+    return _backend_instance
+
+def storage_stats():
+    """
+    Статистика запросов к хранилищу; пусто, пока оно не создано.
+    """
+    if STORAGE_BACKEND == 'gdrive':
+        from .gdrive_logger import drive_stats
+        return drive_stats()
+    return _backend_instance.stats() if _backend_instance is not None else {}
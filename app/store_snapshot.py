@@ -0,0 +1,166 @@
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+from array import array
+from .constants import *
+
+MAGIC = b'LOGSNAP1'
+NUMERIC_COLUMNS = ('ts', 'size', 'duration', 'queue_time', 'process_time')
+STRING_COLUMNS = ('filename', 'local_id', 'file_id')
+_SEP = '\x00'
+
+
+def _pack_strings(values):
+    # None пишется пустой строкой; у local_id/file_id пустая строка при чтении снова становится None
+    return _SEP.join(v if isinstance(v, str) else '' for v in values).encode('utf-8')
+
+
+def _unpack_strings(data, count, none_if_empty):
+    if not count:
+        return []
+    values = data.decode('utf-8').split(_SEP)
+    if none_if_empty:
+        return [v or None for v in values]
+    return values
+
+
+def write_snapshot(path, columns, state):
+    """
+    Записывает колонки LogStore (результат compact_columns) и state в файл:
+    MAGIC, длина заголовка, JSON-заголовок, затем сырые байты колонок.
+    Запись атомарная: временный файл, fsync, os.replace.
+    """
+    blobs = []
+    for name in NUMERIC_COLUMNS:
+        blobs.append((name, columns[name].typecode, columns[name].tobytes()))
+    for name in STRING_COLUMNS:
+        packed = _pack_strings(columns[name])
+        if packed.count(_SEP.encode('utf-8')) != max(len(columns[name]) - 1, 0):
+            # В значениях встретился разделитель — эту колонку пишем в JSON
+            blobs.append((name, 'json', json.dumps(columns[name], ensure_ascii=False).encode('utf-8')))
+        else:
+            blobs.append((name, 'str', packed))
+    sparse = {
+        'raw_received_at': list(columns['raw_received_at'].items()),
+        'extra': list(columns['extra'].items()),
+        'aggregates': columns['aggregates'],
+    }
+    blobs.append(('sparse', 'json', json.dumps(sparse, ensure_ascii=False).encode('utf-8')))
+    layout = {}
+    offset = 0
+    for name, kind, data in blobs:
+        layout[name] = [offset, len(data), kind]
+        offset += len(data)
+    header = json.dumps({
+        'rows': len(columns['ts']),
+        'byteorder': sys.byteorder,
+        'columns': layout,
+        'state': state,
+    }).encode('utf-8')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for _, _, data in blobs:
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """
+    Читает снимок через mmap. Возвращает (колонки для LogStore.load_columns, state).
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            if bytes(view[:len(MAGIC)]) != MAGIC:
+                raise ValueError('неизвестный формат снимка')
+            header_len = int.from_bytes(view[len(MAGIC):len(MAGIC) + 8], 'little')
+            start = len(MAGIC) + 8
+            header = json.loads(bytes(view[start:start + header_len]))
+            base = start + header_len
+            rows = header['rows']
+            columns = {}
+            for name, (offset, length, kind) in header['columns'].items():
+                data = view[base + offset:base + offset + length]
+                if kind == 'str':
+                    columns[name] = _unpack_strings(bytes(data), rows, none_if_empty=(name != 'filename'))
+                elif kind == 'json':
+                    columns[name] = json.loads(bytes(data))
+                else:
+                    column = array(kind)
+                    column.frombytes(data)
+                    if header['byteorder'] != sys.byteorder:
+                        column.byteswap()
+                    columns[name] = column
+                data.release()
+    sparse = columns.pop('sparse')
+    columns['filename'] = [sys.intern(name) for name in columns['filename']]
+    columns['raw_received_at'] = {int(seq): value for seq, value in sparse['raw_received_at']}
+    columns['extra'] = {int(seq): value for seq, value in sparse['extra']}
+    columns['aggregates'] = sparse['aggregates']
+    for name in NUMERIC_COLUMNS + STRING_COLUMNS:
+        if len(columns[name]) != rows:
+            raise ValueError(f'колонка {name}: {len(columns[name])} строк вместо {rows}')
+    return columns, header['state']
+
+
+class SnapshotWriter:
+    """
+    Периодически сохраняет снимок LogStore на локальный диск, если store менялся.
+    capture(saved_version) берёт lock хранилища и возвращает (version, export_columns(), state)
+    или None, если store не менялся; перестановка колонок (compact) и запись файла идут уже без lock.
+    companions — другие сохранения, которые выполняются вместе со снимком (поисковый индекс).
+    """
+    def __init__(self, capture, compact, path=STORE_SNAPSHOT_PATH, interval=STORE_SNAPSHOT_INTERVAL_SEC,
+                 companions=()):
+        self._capture = capture
+        self._compact = compact
+        self._companions = list(companions)
+        self._path = path
+        self._interval = interval
+        self._saved_version = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def mark_saved(self, version):
+        self._saved_version = version
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='store-snapshot', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            self.save()
+
+    def save(self):
+        """
+        Сохраняет снимок, если store изменился с прошлого сохранения. Возвращает True, если файл записан.
+        """
+        with self._lock:
+            for save_companion in self._companions:
+                try:
+                    save_companion()
+                except Exception as e:
+                    print(f'[Snapshot ERROR]: Не удалось сохранить {getattr(save_companion, "__qualname__", save_companion)}: {e}')
+            try:
+                captured = self._capture(self._saved_version)
+                if captured is None:
+                    return False
+                version, exported, state = captured
+                write_snapshot(self._path, self._compact(exported), state)
+            except Exception as e:
+                print(f'[Snapshot ERROR]: Не удалось сохранить снимок хранилища: {e}')
+                return False
+            self._saved_version = version
+            return True
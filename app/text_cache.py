@@ -0,0 +1,143 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from .constants import *
+
+
+def text_key(entry):
+    """
+    Ключ текста лога: local_id (логи, принятые этим сервисом) или file_id (старые записи индекса).
+    """
+    return entry.get('local_id') or entry.get('file_id')
+
+
+class TextCache:
+    """
+    Тексты логов вне резидентного хранилища метаданных.
+    Уровни: LRU в памяти с лимитом в байтах -> файлы на локальном диске -> loader(entry)
+    (обычно скачивание лог-файла с Google Drive). Найденный ниже текст поднимается в верхние уровни.
+    """
+    def __init__(self, loader, max_bytes=TEXT_CACHE_MAX_BYTES, cache_dir=TEXT_CACHE_DIR):
+        self._loader = loader
+        self._max_bytes = max_bytes
+        self._cache_dir = cache_dir
+        self._lru = OrderedDict()  # key -> (text, размер в байтах)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self._cache_dir, re.sub(r'[^A-Za-z0-9_-]', '_', key) + '.txt')
+
+    def _remember(self, key, text):
+        size = len(text.encode('utf-8'))
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            old = self._lru.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._lru[key] = (text, size)
+            self._bytes += size
+            while self._bytes > self._max_bytes:
+                _, (_, evicted) = self._lru.popitem(last=False)
+                self._bytes -= evicted
+
+    def _read_disk(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key, text):
+        path = self._path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f'[Text cache ERROR]: Не удалось сохранить текст {key}: {e}')
+
+    def put(self, key, text):
+        """
+        Сохраняет текст на диск и в LRU в памяти.
+        """
+        if not key or text is None:
+            return
+        self._write_disk(key, text)
+        self._remember(key, text)
+
+    def seed(self, key, text):
+        """
+        Кладёт текст на диск, если его там ещё нет (перенос текстов из старого индекса).
+        """
+        if key and text is not None and not os.path.exists(self._path(key)):
+            self._write_disk(key, text)
+
+    def peek(self, entry):
+        """
+        Текст из памяти (LRU) или None — без обращения к диску и loader, можно вызывать из цикла событий.
+        """
+        key = text_key(entry)
+        with self._lock:
+            cached = self._lru.get(key) if key else None
+            if cached is not None:
+                self._lru.move_to_end(key)
+                return cached[0]
+        return None
+
+    def read_local(self, entry):
+        """
+        Текст из памяти или с диска без обращения к loader и без подъёма в LRU (массовое чтение).
+        """
+        key = text_key(entry)
+        if not key:
+            return None
+        with self._lock:
+            cached = self._lru.get(key)
+        return cached[0] if cached is not None else self._read_disk(key)
+
+    def get(self, entry, fetch=True):
+        """
+        Возвращает текст лога или None. fetch=False — только локальные уровни, без loader.
+        """
+        key = text_key(entry)
+        if not key:
+            return None
+        with self._lock:
+            cached = self._lru.get(key)
+            if cached is not None:
+                self._lru.move_to_end(key)
+                return cached[0]
+        text = self._read_disk(key)
+        if text is None and fetch:
+            try:
+                text = self._loader(entry)
+            except Exception as e:
+                print(f'[Google Drive ERROR]: Не удалось загрузить текст лога {key}: {e}')
+                text = None
+            if text is not None:
+                self._write_disk(key, text)
+        if text is not None:
+            self._remember(key, text)
+        return text
+
+    def discard(self, entry):
+        key = text_key(entry)
+        if not key:
+            return
+        with self._lock:
+            cached = self._lru.pop(key, None)
+            if cached is not None:
+                self._bytes -= cached[1]
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._lru), 'bytes': self._bytes, 'max_bytes': self._max_bytes}
@@ -0,0 +1,268 @@
+"""
+Нагрузочный замер горячих путей API: POST /log, GET /logs, /summary, /stats, /log_text и DELETE /log
+с заданной параллельностью, без Google Drive — хранилище в памяти (STORAGE_BACKEND = 'memory').
+
+Перед замером в хранилище кладётся индекс из --records записей (тексты — в пачках, как при
+STORAGE_LAYOUT = 'bundles'), сервис загружает его так же, как при старте. Запросы идут в приложение
+в том же процессе через httpx.ASGITransport, поэтому сеть не влияет на результат.
+Для каждого сценария считаются p50/p95/p99, пропускная способность и RSS процесса;
+результат сохраняется в JSON, --compare печатает изменения относительно прошлого прогона.
+
+Запуск из корня проекта:
+    python -m benchmarks.api_benchmark --records 10000 100000 1000000 --concurrency 32 --requests 2000
+    python -m benchmarks.api_benchmark --records 100000 --out new.json --compare old.json
+Журнал приёма, кэш текстов и снимок пишутся во временный каталог и удаляются после замера.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+import app.constants as constants
+
+SCENARIOS = ('post_log', 'logs', 'summary', 'stats', 'log_text', 'delete_log')
+WORDS = ('привет', 'запись', 'звонок', 'клиент', 'заказ', 'ещё', 'доставка', 'оплата', 'вопрос', 'спасибо')
+
+
+def rss_mb():
+    """
+    (текущий RSS, пиковый RSS) процесса в МБ.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if sys.platform == 'darwin':
+        peak /= 1024
+    current = peak
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    current = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return round(current, 1), round(peak, 1)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+def make_record(i, rnd):
+    base = 1_735_000_000
+    return {
+        'filename': f'audio_{i}.mp3',
+        'duration': round(rnd.uniform(5, 300), 2),
+        'size': rnd.randint(1000, 10_000_000),
+        'received_at': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(base + i * 7)),
+        'queue_time': 0.1,
+        'process_time': 0.2,
+    }
+
+
+def make_text(rnd):
+    return ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(5, 40)))
+
+
+def seed_storage(storage, records, rnd, bundle_size=1000):
+    """
+    Кладёт в хранилище индекс из records записей с текстами в пачках. Возвращает записи индекса.
+    """
+    from app.log_bundle import pack_bundle, bundle_ref
+    index = []
+    for start in range(0, records, bundle_size):
+        batch = []
+        for i in range(start, min(start + bundle_size, records)):
+            entry = dict(make_record(i, rnd), local_id=f'seed{i:07d}', file_id=None)
+            batch.append((entry, make_text(rnd)))
+        data, spans = pack_bundle(batch)
+        bundle_id = storage.upload_bundle(f'bundle_seed_{start}.ndjson.gz', data)
+        for (entry, _), (offset, length) in zip(batch, spans):
+            entry['file_id'] = bundle_ref(bundle_id, offset, length)
+            index.append(entry)
+    storage.save_index(index)
+    return index
+
+
+def build_requests(scenario, count, seeded, rnd):
+    """
+    Список запросов (метод, путь, параметры, тело) для сценария.
+    """
+    if scenario == 'post_log':
+        return [('POST', '/log', None, dict(make_record(10 ** 8 + i, rnd), text=make_text(rnd)))
+                for i in range(count)]
+    if scenario == 'logs':
+        return [('GET', '/logs', {'limit': 50, 'offset': rnd.randrange(max(len(seeded) - 50, 1)),
+                                  'order': rnd.choice(('asc', 'desc'))}, None) for _ in range(count)]
+    if scenario == 'summary':
+        return [('GET', '/summary', None, None)] * count
+    if scenario == 'stats':
+        requests = []
+        for _ in range(count):
+            day = rnd.choice(seeded)['received_at'][:10]
+            requests.append(('GET', '/stats', {'start': day, 'end': day}, None))
+        return requests
+    if scenario == 'log_text':
+        return [('GET', '/log_text', {'filename': e['filename'], 'received_at': e['received_at']}, None)
+                for e in (rnd.choice(seeded) for _ in range(count))]
+    if scenario == 'delete_log':
+        # Каждая запись удаляется один раз; удалённые убираются из выборки для следующих сценариев
+        victims = rnd.sample(seeded, min(count, len(seeded)))
+        gone = {e['file_id'] for e in victims}
+        seeded[:] = [e for e in seeded if e['file_id'] not in gone]
+        return [('DELETE', '/log', {'file_id': e['file_id']}, None) for e in victims]
+    raise ValueError(scenario)
+
+
+async def run_scenario(client, requests, concurrency):
+    latencies = []
+    statuses = {}
+    pending = iter(requests)
+
+    async def worker():
+        for method, path, params, body in pending:
+            t0 = time.perf_counter()
+            resp = await client.request(method, path, params=params, json=body)
+            latencies.append(time.perf_counter() - t0)
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    current, peak = rss_mb()
+    return {
+        'requests': len(latencies),
+        'errors': sum(n for status, n in statuses.items() if status >= 400),
+        'statuses': {str(status): n for status, n in sorted(statuses.items())},
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.5) * 1e3, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1e3, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1e3, 3),
+        'max_ms': round(latencies[-1] * 1e3, 3) if latencies else 0.0,
+        'rss_mb': current,
+        'peak_rss_mb': peak,
+    }
+
+
+def wait_until(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError('сервис не загрузил индекс вовремя')
+        time.sleep(0.05)
+
+
+async def bench_dataset(api, records, scenarios, concurrency, count, seed):
+    rnd = random.Random(seed)
+    storage = api.get_storage()
+    # Хранилище и store очищаются от предыдущего набора
+    storage.delete_files([f['id'] for f in storage.list_all_logs()] + [d['id'] for d in storage.list_index_deltas()])
+    with api.lock:
+        api.store.reset([])
+    t0 = time.perf_counter()
+    seeded = seed_storage(storage, records, rnd)
+    seed_sec = time.perf_counter() - t0
+    # Полная загрузка индекса, как при первом старте сервиса
+    api.sync_state['reconciled'] = False
+    api.sync_state['index_cursor'] = None
+    t0 = time.perf_counter()
+    api.reconcile_index_with_drive()
+    load_sec = time.perf_counter() - t0
+    current, _ = rss_mb()
+    result = {'records': records, 'seed_sec': round(seed_sec, 3), 'load_sec': round(load_sec, 3),
+              'rss_after_load_mb': current, 'scenarios': {}}
+    print(f'n={records}: загрузка индекса {load_sec:.2f} сек, RSS {current} МБ')
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for scenario in scenarios:
+            requests = build_requests(scenario, count, seeded, rnd)
+            r = await run_scenario(client, requests, concurrency)
+            result['scenarios'][scenario] = r
+            print(f"  {scenario:<11} {r['throughput_rps']:>9.1f} rps  p50 {r['p50_ms']:.2f} мс  "
+                  f"p95 {r['p95_ms']:.2f} мс  p99 {r['p99_ms']:.2f} мс  ошибок {r['errors']}  RSS {r['rss_mb']} МБ")
+    # Принятые логи дошли до хранилища, прежде чем переходить к следующему набору
+    api.ingest_queue.join()
+    api.index_writer.flush()
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {d['records']: d for d in json.load(f)['datasets']}
+    print(f'Сравнение с {baseline_path} (новое / старое):')
+    for dataset in results['datasets']:
+        old = baseline.get(dataset['records'])
+        if old is None:
+            continue
+        for scenario, r in dataset['scenarios'].items():
+            o = old['scenarios'].get(scenario)
+            if not o:
+                continue
+            ratios = [f"{key} {r[key] / o[key]:.2f}x" for key in ('p50_ms', 'p99_ms', 'throughput_rps') if o[key]]
+            print(f"  n={dataset['records']} {scenario:<11} " + '  '.join(ratios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--concurrency', type=int, default=16, help='одновременных запросов')
+    parser.add_argument('--requests', type=int, default=1000, help='запросов на сценарий')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default=None, help='куда сохранить JSON (по умолчанию benchmarks/results/)')
+    parser.add_argument('--compare', default=None, help='JSON прошлого прогона для сравнения')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='api_benchmark_')
+    # Константы подменяются до импорта сервиса: модули берут их через from .constants import *
+    constants.STORAGE_BACKEND = 'memory'
+    constants.WAL_DIR = os.path.join(workdir, 'wal')
+    constants.TEXT_CACHE_DIR = os.path.join(workdir, 'texts')
+    constants.STORE_SNAPSHOT_PATH = os.path.join(workdir, 'store.snapshot')
+    constants.SEARCH_INDEX_PATH = os.path.join(workdir, 'search.index')
+    constants.INGEST_QUEUE_MAXSIZE = max(constants.INGEST_QUEUE_MAXSIZE, args.requests)
+    try:
+        from app import api
+        wait_until(lambda: api.sync_state['reconciled'], timeout=30)
+        results = {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'started_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'datasets': [],
+        }
+        for records in args.records:
+            results['datasets'].append(asyncio.run(
+                bench_dataset(api, records, args.scenarios, args.concurrency, args.requests, args.seed)
+            ))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    out = args.out or os.path.join('benchmarks', 'results', f"api_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f'Результат сохранён в {out}')
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
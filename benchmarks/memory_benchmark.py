@@ -0,0 +1,107 @@
+"""
+Память и скорость колоночного LogStore в сравнении с прежними списками словарей
+(log_files + log_stats), где /stats, /histogram и /summary пересчитывались по строкам received_at
+на каждый запрос.
+
+Запуск из корня проекта:
+    python -m benchmarks.memory_benchmark --sizes 10000 100000 1000000
+Агрегаты LogStore при загрузке считаются обычным циклом, а через numpy — только если он установлен отдельно.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from app.log_store import LogStore
+from app.aggregates import np
+from benchmarks.store_benchmark import make_entries
+
+
+def measure(build):
+    """
+    Возвращает (секунды на build() без трассировки, байты памяти, которую удерживает результат build()).
+    """
+    gc.collect()
+    t0 = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, size
+
+
+def build_lists(raw):
+    # Как было в api.py: записи индекса целиком и отдельный список для статистики
+    log_files = json.loads(raw)
+    log_stats = [{'received_at': l['received_at'], 'filename': l['filename'], 'file_id': l['file_id']}
+                 for l in log_files]
+    return log_files, log_stats
+
+
+def build_store(raw):
+    store = LogStore()
+    store.reset(json.loads(raw))
+    return store
+
+
+def aggregate_lists(lists):
+    log_files, log_stats = lists
+    per_minute, per_day = {}, {}
+    for s in log_stats:
+        minute = s['received_at'][:16]
+        per_minute[minute] = per_minute.get(minute, 0) + 1
+        day = s['received_at'][:10]
+        per_day[day] = per_day.get(day, 0) + 1
+    totals = (len(log_files), sum(l['duration'] for l in log_files), sum(l['size'] for l in log_files))
+    return per_minute, per_day, totals
+
+
+def bench(n):
+    entries = make_entries(n)
+    for e in entries:
+        e.pop('text')
+    # Обе структуры строятся из JSON индекс-файла, как при старте сервиса
+    raw = json.dumps(entries)
+    del entries
+    lists_build, lists_bytes = measure(lambda: build_lists(raw))
+    store_build, store_bytes = measure(lambda: build_store(raw))
+    lists = build_lists(raw)
+    t0 = time.perf_counter()
+    aggregate_lists(lists)
+    lists_agg = time.perf_counter() - t0
+    del lists
+    store = build_store(raw)
+    t0 = time.perf_counter()
+    store.aggregates.reset(store._ts, store._duration, store._size, store._alive)
+    store_recount = time.perf_counter() - t0
+    # Запрос /stats + /histogram + /summary: счётчики уже готовы, остаётся сформировать ответ
+    t0 = time.perf_counter()
+    store.aggregates.per_minute(), store.aggregates.per_day(), store.aggregates.totals()
+    store_agg = time.perf_counter() - t0
+    return {
+        'lists_bytes': lists_bytes, 'lists_build': lists_build, 'lists_agg': lists_agg,
+        'store_bytes': store_bytes, 'store_build': store_build, 'store_agg': store_agg,
+        'store_recount': store_recount,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    print(f"numpy: {'есть' if np is not None else 'нет'}")
+    for n in args.sizes:
+        r = bench(n)
+        print(f"n={n:>9}: списки {r['lists_bytes'] / n:.0f} Б/запись, сборка {r['lists_build']:.2f} сек, "
+              f"агрегаты {r['lists_agg'] * 1e3:.0f} мс | "
+              f"LogStore {r['store_bytes'] / n:.0f} Б/запись, сборка {r['store_build']:.2f} сек, "
+              f"пересчёт агрегатов {r['store_recount'] * 1e3:.0f} мс, ответ {r['store_agg'] * 1e3:.0f} мс")
+
+
+if __name__ == '__main__':
+    main()
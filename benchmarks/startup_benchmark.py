@@ -0,0 +1,65 @@
+"""
+Время до первой успешной выгрузки лога на Google Drive и средняя задержка последующих.
+
+"До": на каждую выгрузку создаётся новый GDriveLogger (как раньше делал /runpod_status).
+"После": один GDriveLogger на процесс (get_logger) с кэшем id папок и keep-alive соединением.
+
+Запуск из корня проекта (нужны client_secret.json и token.pickle):
+    python -m benchmarks.startup_benchmark --uploads 10
+Созданные тестовые файлы удаляются в конце.
+"""
+import argparse
+import statistics
+import time
+from app.gdrive_logger import GDriveLogger, get_logger
+
+
+def make_entry(i):
+    return {
+        'filename': f'bench_{i}.txt',
+        'duration': 1.0,
+        'size': 1,
+        'received_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'queue_time': 0.0,
+        'process_time': 0.0,
+        'text': 'startup benchmark',
+    }
+
+
+def run(uploads, new_logger):
+    created = []
+    timings = []
+    start = time.perf_counter()
+    first = None
+    logger = None
+    for i in range(uploads):
+        t0 = time.perf_counter()
+        logger = new_logger()
+        file_id = logger.log_and_return_id(make_entry(i))
+        timings.append(time.perf_counter() - t0)
+        if file_id:
+            created.append(file_id)
+            if first is None:
+                first = time.perf_counter() - start
+    for file_id in created:
+        logger.delete_log_file(file_id)
+    return {
+        'first_upload_sec': first,
+        'mean_upload_sec': statistics.mean(timings[1:]) if len(timings) > 1 else None,
+        'ok': len(created),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=10)
+    args = parser.parse_args()
+    before = run(args.uploads, GDriveLogger)
+    after = run(args.uploads, get_logger)
+    for name, result in (('до', before), ('после', after)):
+        print(f"{name:>6}: первая выгрузка {result['first_upload_sec'] or 0:.3f} сек, "
+              f"средняя последующая {result['mean_upload_sec'] or 0:.3f} сек, успешно {result['ok']}/{args.uploads}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Микробенчмарк LogStore: поиск по (filename, received_at) как в /log_text и удаление по file_id
+как в DELETE /log, в сравнении с прежними списками словарей (линейный проход и пересборка списков).
+
+Запуск из корня проекта:
+    python -m benchmarks.store_benchmark --sizes 10000 100000 1000000 --ops 1000
+Для списков при больших размерах делается не больше --list-ops операций, иначе замер идёт минутами.
+"""
+import argparse
+import random
+import time
+from app.log_store import LogStore
+
+
+def make_entries(n):
+    base = 1_735_000_000
+    return [{
+        'filename': f'audio_{i}.mp3',
+        'duration': 10.0,
+        'size': 1000,
+        'received_at': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(base + i * 7)),
+        'queue_time': 0.1,
+        'process_time': 0.2,
+        'text': '',
+        'local_id': f'l{i}',
+        'file_id': f'f{i}',
+    } for i in range(n)]
+
+
+def per_op_us(fn, ops):
+    t0 = time.perf_counter()
+    for op in ops:
+        fn(op)
+    return (time.perf_counter() - t0) / max(len(ops), 1) * 1e6
+
+
+def bench_store(entries, lookups, deletes):
+    store = LogStore()
+    t0 = time.perf_counter()
+    store.reset(entries)
+    load = time.perf_counter() - t0
+    lookup = per_op_us(lambda e: store.get_by_name(e['filename'], e['received_at']), lookups)
+    delete = per_op_us(lambda e: store.remove_by_file_id(e['file_id']), deletes)
+    # Первый запрос страницы после удалений вычищает tombstone
+    page = per_op_us(lambda _: store.query(limit=50, descending=True), [None] * 10)
+    return {'load_sec': load, 'lookup_us': lookup, 'delete_us': delete, 'page_us': page}
+
+
+def bench_lists(entries, lookups, deletes):
+    log_files = list(entries)
+    log_stats = [{'received_at': e['received_at'], 'filename': e['filename'], 'file_id': e['file_id']} for e in entries]
+
+    def lookup(e):
+        for l in log_files:
+            if l['filename'] == e['filename'] and l['received_at'] == e['received_at']:
+                return l
+
+    def delete(e):
+        log_files[:] = [l for l in log_files if l.get('file_id') != e['file_id']]
+        log_stats[:] = [s for s in log_stats if s.get('file_id') != e['file_id']]
+
+    return {'lookup_us': per_op_us(lookup, lookups), 'delete_us': per_op_us(delete, deletes)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--ops', type=int, default=1000)
+    parser.add_argument('--list-ops', type=int, default=20)
+    args = parser.parse_args()
+    rnd = random.Random(42)
+    for n in args.sizes:
+        entries = make_entries(n)
+        sample = rnd.sample(entries, min(args.ops * 2, n))
+        lookups, deletes = sample[:len(sample) // 2], sample[len(sample) // 2:]
+        store = bench_store(entries, lookups, deletes)
+        lists = bench_lists(entries, lookups[:args.list_ops], deletes[:args.list_ops])
+        print(f"n={n:>9}: LogStore загрузка {store['load_sec']:.2f} сек, поиск {store['lookup_us']:.2f} мкс, "
+              f"удаление {store['delete_us']:.2f} мкс, страница {store['page_us']:.0f} мкс | "
+              f"списки: поиск {lists['lookup_us']:.0f} мкс, удаление {lists['delete_us']:.0f} мкс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import asyncio
+import atexit
+import os
+import shutil
+import tempfile
+import time
+
+import httpx
+import pytest
+
+from app import constants
+
+# Как в benchmarks/api_benchmark.py: константы подменяются до импорта сервиса (модули берут их через
+# from .constants import *), чтобы app.api работал с хранилищем в памяти и не трогал data/ в рабочем каталоге
+_WORKDIR = tempfile.mkdtemp(prefix='logerapi_tests_')
+atexit.register(shutil.rmtree, _WORKDIR, ignore_errors=True)
+constants.STORAGE_BACKEND = 'memory'
+for _name, _path in (('LOCAL_STORAGE_DIR', 'storage'), ('WAL_DIR', 'wal'), ('TEXT_CACHE_DIR', 'texts'),
+                     ('STORE_SNAPSHOT_PATH', 'store.snapshot'), ('REBUILD_STATE_PATH', 'index_rebuild.jsonl'),
+                     ('SEARCH_INDEX_PATH', 'search.index'), ('WRITER_LOCK_PATH', 'writer.lock'),
+                     ('WRITER_SOCKET_PATH', 'writer.sock'), ('REPLICA_SNAPSHOT_PATH', 'replica.snapshot')):
+    setattr(constants, _name, os.path.join(_WORKDIR, _path))
+
+
+def _asgi_request(app, method, url, **kwargs):
+    """
+    Один запрос к ASGI-приложению в том же процессе (как в benchmarks/api_benchmark.py), без сети.
+    """
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.request(method, url, **kwargs)
+    return asyncio.run(send())
+
+
+@pytest.fixture
+def asgi_request():
+    return _asgi_request
+
+
+@pytest.fixture(scope='session')
+def api():
+    """
+    Модуль app.api с запущенным писателем (хранилище в памяти) после первой сверки с хранилищем.
+    """
+    from app import api
+    deadline = time.monotonic() + 30
+    while not api.sync_state['reconciled']:
+        assert time.monotonic() < deadline, 'сервис не запустился'
+        time.sleep(0.05)
+    return api
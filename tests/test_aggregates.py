@@ -0,0 +1,114 @@
+from array import array
+
+import pytest
+
+from app.aggregates import NO_TS, TimeBucketAggregates, bucket_labels, parse_received_at, prefix_range
+
+_BASE = parse_received_at('2024-05-01 10:00:00')[0]
+
+
+def _columns(rows):
+    """
+    (секунды, duration, size, жива ли строка) -> колонки в формате LogStore.
+    """
+    ts = array('q', (row[0] for row in rows))
+    duration = array('d', (row[1] for row in rows))
+    size = array('q', (row[2] for row in rows))
+    alive = bytearray(row[3] for row in rows)
+    return ts, duration, size, alive
+
+
+def _snapshot(agg):
+    return agg.per_minute(), agg.per_day(), agg.totals(), agg.minutes, agg.days
+
+
+_ROWS = [
+    (_BASE, 1.5, 100, 1),
+    (_BASE + 30, 2.0, 200, 1),
+    (_BASE + 61, 4.0, 400, 1),
+    (_BASE + 86400, 8.0, 800, 1),
+    (_BASE + 120, 16.0, 1600, 0),
+    (NO_TS, 32.0, 3200, 1),
+]
+
+
+def test_parse_received_at():
+    assert parse_received_at('1970-01-01 00:01:00') == (60, True)
+    assert parse_received_at('1970-01-01T00:01:00') == (60, False)
+    assert parse_received_at('1970-01-01T03:01:00+03:00') == (60, False)
+    assert parse_received_at('не дата') == (NO_TS, False)
+    assert parse_received_at(None) == (NO_TS, False)
+
+
+def test_prefix_range():
+    day = parse_received_at('2024-05-01 00:00:00')[0]
+    assert prefix_range('2024-05-01') == (day, day + 86400)
+    assert prefix_range('2024-05-01 10:00') == (_BASE, _BASE + 60)
+    assert prefix_range('2024-12') == (parse_received_at('2024-12-01 00:00:00')[0],
+                                       parse_received_at('2025-01-01 00:00:00')[0])
+    assert prefix_range('2024') == (parse_received_at('2024-01-01 00:00:00')[0],
+                                    parse_received_at('2025-01-01 00:00:00')[0])
+    assert prefix_range('2024-05-0') is None
+    assert prefix_range('мусор') is None
+
+
+def test_bucket_labels():
+    assert bucket_labels('2024-05-01 10:00:59') == ('2024-05-01 10:00', '2024-05-01')
+    assert bucket_labels(None) == (None, None)
+
+
+def test_reset_counts_only_live_rows():
+    agg = TimeBucketAggregates()
+    agg.reset(*_columns(_ROWS))
+    assert agg.totals() == {'total_files': 5, 'total_duration': 47.5, 'total_size': 4700}
+    assert agg.per_minute() == {'2024-05-01 10:00': 2, '2024-05-01 10:01': 1, '2024-05-02 10:00': 1}
+    assert agg.per_day() == {'2024-05-01': 3, '2024-05-02': 1}
+
+
+def test_add_matches_reset():
+    live = [row for row in _ROWS if row[3]]
+    incremental = TimeBucketAggregates()
+    for ts, duration, size, _ in live:
+        incremental.add(ts, duration, size)
+    full = TimeBucketAggregates()
+    full.reset(*_columns(_ROWS))
+    assert _snapshot(incremental) == _snapshot(full)
+
+
+def test_remove_undoes_add_and_drops_empty_buckets():
+    agg = TimeBucketAggregates()
+    agg.reset(*_columns(_ROWS))
+    agg.add(_BASE + 600, 1.0, 10)
+    agg.remove(_BASE + 600, 1.0, 10)
+    agg.remove(_BASE + 86400, 8.0, 800)
+    expected = TimeBucketAggregates()
+    expected.reset(*_columns([row for row in _ROWS if row[0] != _BASE + 86400]))
+    assert _snapshot(agg) == _snapshot(expected)
+    assert '2024-05-02' not in agg.per_day()
+    assert agg._minute_keys == sorted(agg.minutes)
+
+
+def test_export_load_round_trip():
+    agg = TimeBucketAggregates()
+    agg.reset(*_columns(_ROWS))
+    loaded = TimeBucketAggregates()
+    loaded.load(agg.export())
+    assert _snapshot(loaded) == _snapshot(agg)
+    # После загрузки дельты применяются как обычно
+    loaded.add(_BASE + 59, 1.0, 1)
+    assert loaded.per_minute()['2024-05-01 10:00'] == 3
+
+
+def test_per_minute_range_is_inclusive():
+    agg = TimeBucketAggregates()
+    agg.reset(*_columns(_ROWS))
+    assert agg.per_minute('2024-05-01 10:01', '2024-05-01') == {'2024-05-01 10:01': 1}
+    assert agg.per_minute(start='2024-05-02') == {'2024-05-02 10:00': 1}
+    assert agg.per_minute(end='2024-05-01 10:00') == {'2024-05-01 10:00': 2}
+    assert agg.per_minute('2024-06-01') == {}
+
+
+@pytest.mark.parametrize('start, end', [('вчера', None), (None, '2024-05-01 1'), ('2024-13', None)])
+def test_per_minute_rejects_unparseable_bounds(start, end):
+    with pytest.raises(ValueError):
+        TimeBucketAggregates().per_minute(start, end)
@@ -0,0 +1,159 @@
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from app import drive_scheduler
+from app.drive_scheduler import DriveScheduler, TokenBucket, is_retryable
+
+
+class _Clock:
+    """
+    Подмена time.monotonic/time.sleep в drive_scheduler: sleep только сдвигает часы и запоминает паузы.
+    """
+    def __init__(self, monkeypatch):
+        self.now = 1000.0
+        self.sleeps = []
+        monkeypatch.setattr(drive_scheduler.time, 'monotonic', lambda: self.now)
+        monkeypatch.setattr(drive_scheduler.time, 'sleep', self.sleep)
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _http_error(status, content=b'', retry_after=None):
+    headers = {'status': str(status)}
+    if retry_after is not None:
+        headers['retry-after'] = str(retry_after)
+    return HttpError(httplib2.Response(headers), content)
+
+
+def _flaky(errors, result='ok'):
+    calls = []
+
+    def action():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return action, calls
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    return _Clock(monkeypatch)
+
+
+def test_is_retryable():
+    assert is_retryable(_http_error(429))
+    assert is_retryable(_http_error(503))
+    assert is_retryable(_http_error(403, b'{"reason": "userRateLimitExceeded"}'))
+    assert not is_retryable(_http_error(403, b'{"reason": "forbidden"}'))
+    assert not is_retryable(_http_error(404))
+    assert is_retryable(ConnectionResetError())
+    assert is_retryable(httplib2.ServerNotFoundError())
+    assert not is_retryable(ValueError())
+
+
+def test_token_bucket_allows_burst_then_waits(clock):
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    waited = bucket.acquire()
+    assert waited == pytest.approx(0.1)
+    assert clock.sleeps == [pytest.approx(0.1)]
+    # За секунду простоя запас восстанавливается не больше чем до burst
+    clock.now += 1
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() > 0
+
+
+def test_call_retries_with_backoff(clock, monkeypatch):
+    monkeypatch.setattr(drive_scheduler.random, 'uniform', lambda lo, hi: hi)
+    scheduler = DriveScheduler(rate=1000, burst=1000, max_retries=5, backoff_base=0.5, backoff_max=1.5)
+    action, calls = _flaky([_http_error(500), _http_error(429), OSError(), _http_error(502)])
+    assert scheduler.call('list', action) == 'ok'
+    assert len(calls) == 5
+    # Экспоненциальный рост до backoff_max
+    assert clock.sleeps == [0.5, 1.0, 1.5, 1.5]
+    stats = scheduler.stats()['list']
+    assert stats['calls'] == 1 and stats['retries'] == 4 and stats['errors'] == 0
+
+
+def test_retry_after_is_respected(clock, monkeypatch):
+    monkeypatch.setattr(drive_scheduler.random, 'uniform', lambda lo, hi: 0.0)
+    scheduler = DriveScheduler(rate=1000, burst=1000)
+    action, _ = _flaky([_http_error(429, retry_after=7)])
+    scheduler.call('create', action)
+    assert clock.sleeps == [7.0]
+
+
+def test_non_retryable_error_is_raised_at_once(clock):
+    scheduler = DriveScheduler(rate=1000, burst=1000)
+    action, calls = _flaky([_http_error(404)])
+    with pytest.raises(HttpError):
+        scheduler.call('get', action)
+    assert len(calls) == 1 and clock.sleeps == []
+    assert scheduler.stats()['get']['errors'] == 1
+
+
+def test_retries_are_limited(clock):
+    scheduler = DriveScheduler(rate=1000, burst=1000, max_retries=2)
+    action, calls = _flaky([_http_error(503)] * 10)
+    with pytest.raises(HttpError):
+        scheduler.call('list', action)
+    assert len(calls) == 3
+    stats = scheduler.stats()['list']
+    assert stats['retries'] == 2 and stats['errors'] == 1
+
+
+def test_calls_are_throttled_by_bucket(clock):
+    scheduler = DriveScheduler(rate=2, burst=1)
+    for _ in range(3):
+        scheduler.call('list', lambda: None)
+    assert sum(clock.sleeps) == pytest.approx(1.0)
+    assert scheduler.stats()['list']['throttled_sec'] == pytest.approx(1.0)
+
+
+class _FakeBatch:
+    """
+    BatchHttpRequest: запросы — функции, возвращающие ответ или бросающие исключение.
+    """
+    executed = []
+
+    def __init__(self):
+        self._requests = []
+
+    def add(self, request, callback, request_id):
+        self._requests.append((request, callback, request_id))
+
+    def execute(self):
+        _FakeBatch.executed.append(len(self._requests))
+        for request, callback, request_id in self._requests:
+            try:
+                callback(request_id, request(), None)
+            except Exception as e:
+                callback(request_id, None, e)
+
+
+def test_batch_splits_and_retries_failed_requests(clock):
+    _FakeBatch.executed = []
+    attempts = {}
+
+    def request(key):
+        def run():
+            attempts[key] = attempts.get(key, 0) + 1
+            if key == 'flaky' and attempts[key] == 1:
+                raise _http_error(503)
+            if key == 'missing':
+                raise _http_error(404)
+            return {'id': key}
+        return lambda: run
+
+    keys = [f'k{i}' for i in range(4)] + ['flaky', 'missing']
+    scheduler = DriveScheduler(rate=1000, burst=1000, batch_size=4)
+    results = scheduler.batch('delete', _FakeBatch, {key: request(key) for key in keys})
+    assert _FakeBatch.executed == [4, 2, 1]
+    assert results['flaky'] == ({'id': 'flaky'}, None)
+    assert results['k0'] == ({'id': 'k0'}, None)
+    assert results['missing'][0] is None and isinstance(results['missing'][1], HttpError)
+    assert attempts['missing'] == 1
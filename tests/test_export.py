@@ -0,0 +1,56 @@
+import csv
+import gzip
+import io
+import json
+
+from app.export import EXPORT_FIELDS, encode_export, format_available, gzip_chunks, pq
+
+_ROWS = [
+    {'filename': 'a.txt', 'received_at': '2024-05-01 10:00:00', 'duration': 1.5, 'size': 10,
+     'queue_time': 0.1, 'process_time': 0.2, 'local_id': 'L1', 'file_id': None},
+    {'filename': 'б,"кавычки".txt', 'received_at': '2024-05-01 10:00:01', 'duration': 2.0, 'size': 20,
+     'queue_time': 0.3, 'process_time': 0.4, 'local_id': None, 'file_id': 'F2', 'note': 'старое поле'},
+]
+_PAGES = [_ROWS[:1], [], _ROWS[1:]]
+
+
+def _body(fmt, pages=_PAGES, fields=EXPORT_FIELDS):
+    return b''.join(encode_export(iter(pages), fmt, fields))
+
+
+def test_ndjson_keeps_whole_records():
+    lines = _body('ndjson').decode('utf-8').splitlines()
+    assert [json.loads(line) for line in lines] == _ROWS
+
+
+def test_csv_has_header_and_empty_none():
+    rows = list(csv.reader(io.StringIO(_body('csv').decode('utf-8'))))
+    assert rows[0] == list(EXPORT_FIELDS)
+    assert rows[1] == ['a.txt', '2024-05-01 10:00:00', '1.5', '10', '0.1', '0.2', 'L1', '']
+    assert rows[2][0] == 'б,"кавычки".txt' and rows[2][6] == ''
+    assert len(rows) == 3
+
+
+def test_csv_header_without_rows():
+    assert _body('csv', pages=[]).decode('utf-8').splitlines() == [','.join(EXPORT_FIELDS)]
+
+
+def test_columns_one_line_per_page():
+    lines = [json.loads(line) for line in _body('columns', fields=('filename', 'size')).splitlines()]
+    assert lines == [{'filename': ['a.txt'], 'size': [10]}, {'filename': ['б,"кавычки".txt'], 'size': [20]}]
+
+
+def test_gzip_chunks_round_trip():
+    chunks = list(encode_export(iter(_PAGES), 'ndjson'))
+    compressed = list(gzip_chunks(iter(chunks), level=1))
+    # После каждого куска — sync flush, поэтому сжатые данные идут по мере поступления
+    assert len(compressed) >= len(chunks)
+    assert gzip.decompress(b''.join(compressed)) == b''.join(chunks)
+    assert gzip.decompress(b''.join(gzip_chunks(iter([])))) == b''
+
+
+def test_format_available():
+    for fmt in ('ndjson', 'csv', 'columns'):
+        assert format_available(fmt)
+    assert not format_available('xml')
+    assert format_available('parquet') == (pq is not None)
@@ -0,0 +1,99 @@
+import pytest
+
+from app.storage_backend import IndexLoadError, MemoryBackend, apply_index_ops
+
+
+def _add(file_id, **extra):
+    return {'op': 'add', 'entry': dict({'file_id': file_id}, **extra)}
+
+
+def _remove(file_id):
+    return {'op': 'remove', 'file_id': file_id}
+
+
+def _ids(index):
+    return [e.get('file_id') for e in index]
+
+
+def test_apply_index_ops_is_idempotent():
+    index = apply_index_ops([{'file_id': 'F1'}], [_add('F1'), _add('F2'), _add('F2')])
+    assert _ids(index) == ['F1', 'F2']
+
+
+def test_apply_index_ops_add_after_remove_in_one_batch():
+    index = apply_index_ops([{'file_id': 'F1', 'v': 0}, {'file_id': 'F2'}], [_remove('F1'), _add('F1', v=1)])
+    assert index == [{'file_id': 'F2'}, {'file_id': 'F1', 'v': 1}]
+    index = apply_index_ops([], [_add('F3'), _remove('F3'), _add('F3', v=2), _remove('F3')])
+    assert index == []
+
+
+def test_load_index_with_cursor_covers_base_and_deltas():
+    backend = MemoryBackend()
+    base_time = backend.save_index([{'file_id': 'F0'}])
+    backend.append_index_delta([_add('F1')])
+    backend.append_index_delta([_remove('F0')])
+    index, cursor, segments = backend.load_index_with_cursor()
+    assert _ids(index) == ['F1']
+    assert segments == 2
+    assert cursor > base_time
+    assert cursor == backend.list_index_deltas()[-1]['modifiedTime']
+
+
+def test_list_index_changes_after_cursor():
+    backend = MemoryBackend()
+    backend.save_index([])
+    _, cursor, _ = backend.load_index_with_cursor()
+    changes = backend.list_index_changes(cursor)
+    assert changes == {'base_changed': False, 'segments': [], 'cursor': cursor}
+
+    segment = backend.append_index_delta([_add('F1')])
+    changes = backend.list_index_changes(cursor)
+    assert [s['id'] for s in changes['segments']] == [segment]
+    assert not changes['base_changed'] and changes['cursor'] > cursor
+    assert backend.load_index_delta(segment) == [_add('F1')]
+
+    cursor = changes['cursor']
+    backend.compact_index()
+    changes = backend.list_index_changes(cursor)
+    assert changes['base_changed'] and changes['segments'] == []
+    assert changes['cursor'] > cursor
+
+
+def test_first_change_check_reads_base():
+    backend = MemoryBackend()
+    assert backend.list_index_changes(None)['base_changed']
+
+
+def test_cursor_is_strictly_increasing():
+    backend = MemoryBackend()
+    times = [backend.save_index([]) for _ in range(50)]
+    assert times == sorted(set(times))
+    assert backend.index_cursor == times[-1]
+
+
+def test_corrupt_base_is_rebuilt(monkeypatch):
+    backend = MemoryBackend()
+    backend._write('logs_index.json', b'{"not": "a list"}')
+    monkeypatch.setattr(backend, 'rebuild_index', lambda: [{'file_id': 'R1'}])
+    index, _, _ = backend.load_index_with_cursor()
+    assert _ids(index) == ['R1']
+
+
+def test_failed_rebuild_raises_index_load_error(monkeypatch):
+    backend = MemoryBackend()
+    backend._write('logs_index.json', b'broken')
+
+    def fail():
+        raise OSError('нет доступа')
+
+    monkeypatch.setattr(backend, 'rebuild_index', fail)
+    with pytest.raises(IndexLoadError):
+        backend.load_index_with_cursor()
+
+
+def test_unreadable_delta_is_an_error():
+    backend = MemoryBackend()
+    segment = backend.append_index_delta([])
+    backend._write(segment, b'{"op": "add"}')
+    with pytest.raises(ValueError):
+        backend.load_index_delta(segment)
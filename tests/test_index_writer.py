@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from app.index_writer import IndexWriter
+from app.storage_backend import MemoryBackend
+
+
+def _entry(i, **extra):
+    entry = {'filename': f'file_{i}.txt', 'received_at': f'2024-05-01 10:00:{i:02d}', 'file_id': f'F{i}'}
+    entry.update(extra)
+    return entry
+
+
+class _FailingBackend(MemoryBackend):
+    def __init__(self):
+        super().__init__()
+        self.fail = True
+
+    def append_index_delta(self, ops):
+        if self.fail:
+            raise OSError('хранилище недоступно')
+        return super().append_index_delta(ops)
+
+
+def test_flush_writes_one_delta_segment():
+    backend = MemoryBackend()
+    flushed = []
+    writer = IndexWriter(lambda: backend, compact_after=100, on_flush=flushed.append)
+    writer.add(_entry(1))
+    writer.add(_entry(2))
+    writer.remove('F1')
+    assert writer.pending_count() == 3
+    assert writer.flush() == 3
+    assert writer.pending_count() == 0
+    assert writer.flush() == 0
+    assert len(backend.list_index_deltas()) == 1
+    assert [op['op'] for op in flushed[0]] == ['add', 'add', 'remove']
+    assert [e['file_id'] for e in backend.load_index()] == ['F2']
+
+
+def test_failed_flush_keeps_ops_in_order():
+    backend = _FailingBackend()
+    writer = IndexWriter(lambda: backend, compact_after=100)
+    writer.add(_entry(1))
+    assert writer.flush() == 0
+    writer.add(_entry(2))
+    assert writer.pending_count() == 2
+    backend.fail = False
+    assert writer.flush() == 2
+    assert [e['file_id'] for e in backend.load_index()] == ['F1', 'F2']
+
+
+def test_on_flush_error_does_not_lose_segment():
+    backend = MemoryBackend()
+
+    def broken(ops):
+        raise RuntimeError('ошибка обработчика')
+
+    writer = IndexWriter(lambda: backend, compact_after=100, on_flush=broken)
+    writer.add(_entry(1))
+    assert writer.flush() == 1
+    assert writer.pending_count() == 0
+    assert len(backend.load_index()) == 1
+
+
+def test_compaction_after_segments():
+    backend = MemoryBackend()
+    writer = IndexWriter(lambda: backend, compact_after=3)
+    for i in range(3):
+        writer.add(_entry(i, text='текст'))
+        writer.flush()
+    assert backend.list_index_deltas() == []
+    index = backend.load_index()
+    assert [e['file_id'] for e in index] == ['F0', 'F1', 'F2']
+    # В базовом снимке тексты остаются только у записей без file_id
+    assert all('text' not in e for e in index)
+
+
+def test_existing_segments_count_towards_compaction():
+    backend = MemoryBackend()
+    backend.append_index_delta([{'op': 'add', 'entry': _entry(1)}])
+    writer = IndexWriter(lambda: backend, compact_after=2)
+    writer.note_existing_segments(len(backend.list_index_deltas()))
+    writer.add(_entry(2))
+    writer.flush()
+    assert backend.list_index_deltas() == []
+    assert [e['file_id'] for e in backend.load_index()] == ['F1', 'F2']
+
+
+def test_full_batch_wakes_background_flush():
+    backend = MemoryBackend()
+    done = threading.Event()
+    writer = IndexWriter(lambda: backend, flush_interval=60, max_batch=5, compact_after=100,
+                         on_flush=lambda ops: done.set())
+    writer.start()
+    for i in range(5):
+        writer.add(_entry(i))
+    assert done.wait(5)
+    assert len(backend.load_index()) == 5
+
+
+def test_compaction_aborts_on_unreadable_segment():
+    backend = MemoryBackend()
+    backend.save_index([_entry(0)])
+    backend.append_index_delta([{'op': 'add', 'entry': _entry(1)}])
+    broken = backend.append_index_delta([])
+    backend._put(broken, b'{not json', time.time_ns())
+    with pytest.raises(ValueError):
+        backend.compact_index()
+    # Ни базовый снимок, ни сегменты не тронуты
+    assert len(backend.list_index_deltas()) == 2
+    assert backend._read_base_index() == [_entry(0)]
@@ -0,0 +1,100 @@
+import os
+
+from app.ingest_wal import IngestWAL
+
+
+def _segments(path):
+    return sorted(name for name in os.listdir(path) if name.startswith('wal-'))
+
+
+def _put(wal, i, text=None):
+    wal.append(f'L{i}', {'filename': f'file_{i}.txt'}, text if text is not None else f'текст {i}')
+
+
+def test_append_read_and_states(tmp_path):
+    wal = IngestWAL(str(tmp_path))
+    _put(wal, 1)
+    _put(wal, 2)
+    assert wal.read('L1') == ({'filename': 'file_1.txt'}, 'текст 1')
+    assert wal.mark_shipped('L1', 'F1')
+    assert wal.state('L1')['file_id'] == 'F1'
+    assert sorted(wal.pending_ids()) == ['L1', 'L2']
+    assert wal.pending_ids(shipped=True) == ['L1']
+    assert wal.pending_ids(shipped=False) == ['L2']
+    assert wal.stats()['unshipped'] == 1
+
+
+def test_done_and_drop_finish_logs(tmp_path):
+    wal = IngestWAL(str(tmp_path))
+    for i in range(3):
+        _put(wal, i)
+    wal.mark_done(['L0', 'missing'])
+    assert wal.drop('L1')['file_id'] is None
+    assert wal.drop('L1') is None
+    assert not wal.mark_shipped('L1', 'F1')
+    assert wal.pending_ids() == ['L2']
+    assert wal.read('L0') is None
+
+
+def test_replay_after_reopen(tmp_path):
+    wal = IngestWAL(str(tmp_path))
+    for i in range(4):
+        _put(wal, i)
+    wal.mark_shipped('L1', 'F1')
+    wal.mark_done(['L2'])
+    wal.drop('L3')
+    reopened = IngestWAL(str(tmp_path))
+    assert sorted(reopened.pending_ids()) == ['L0', 'L1']
+    assert reopened.state('L1')['file_id'] == 'F1'
+    assert reopened.read('L0') == ({'filename': 'file_0.txt'}, 'текст 0')
+    # Новые записи идут в новый сегмент
+    _put(reopened, 5)
+    assert len(_segments(tmp_path)) == 2
+
+
+def test_replay_skips_torn_tail(tmp_path):
+    wal = IngestWAL(str(tmp_path))
+    _put(wal, 1)
+    with open(os.path.join(tmp_path, _segments(tmp_path)[-1]), 'ab') as f:
+        f.write(b'{"op": "put", "id": "L2", "ent')
+    reopened = IngestWAL(str(tmp_path))
+    assert reopened.pending_ids() == ['L1']
+
+
+def test_rotation_removes_finished_segments(tmp_path):
+    wal = IngestWAL(str(tmp_path), segment_bytes=200, compact_segments=100)
+    for i in range(10):
+        _put(wal, i, 'x' * 150)
+    assert len(_segments(tmp_path)) == 10
+    wal.mark_done([f'L{i}' for i in range(5)])
+    # Завершённые сегменты удаляются только с начала журнала
+    assert len(_segments(tmp_path)) == 5
+    wal.mark_done(['L7'])
+    assert len(_segments(tmp_path)) == 5
+    reopened = IngestWAL(str(tmp_path), segment_bytes=200, compact_segments=100)
+    assert sorted(reopened.pending_ids()) == ['L5', 'L6', 'L8', 'L9']
+
+
+def test_compaction_moves_pending_logs_forward(tmp_path):
+    wal = IngestWAL(str(tmp_path), segment_bytes=200, compact_segments=2)
+    _put(wal, 0, 'долгий')
+    wal.mark_shipped('L0', 'F0')
+    for i in range(1, 8):
+        _put(wal, i, 'x' * 150)
+        wal.mark_done([f'L{i}'])
+    # Незавершённый L0 не держит старые сегменты: он переписан вперёд вместе с file_id
+    assert len(_segments(tmp_path)) <= 3
+    assert wal.read('L0') == ({'filename': 'file_0.txt'}, 'долгий')
+    reopened = IngestWAL(str(tmp_path), segment_bytes=200, compact_segments=2)
+    assert reopened.pending_ids() == ['L0']
+    assert reopened.state('L0')['file_id'] == 'F0'
+    assert reopened.read('L0') == ({'filename': 'file_0.txt'}, 'долгий')
+
+
+def test_batch_operations(tmp_path):
+    wal = IngestWAL(str(tmp_path))
+    wal.append_many([(f'L{i}', {'i': i}, str(i)) for i in range(3)])
+    assert wal.mark_shipped_many([('L0', 'F0'), ('missing', 'F')]) == [True, False]
+    states = wal.drop_many(['L0', 'missing'])
+    assert states[0]['file_id'] == 'F0' and states[1] is None
+    assert sorted(wal.pending_ids()) == ['L1', 'L2']
@@ -0,0 +1,103 @@
+import gzip
+import json
+
+from app.log_bundle import (
+    BundleWriter, bundle_ref, iter_bundle, pack_bundle, parse_bundle_ref, read_bundle_record, source_file_id,
+)
+from app.storage_backend import MemoryBackend
+
+
+def _records(n, text='текст'):
+    return [({'filename': f'file_{i}.txt', 'local_id': f'L{i}', 'file_id': None}, f'{text} {i}') for i in range(n)]
+
+
+def test_bundle_ref_round_trip():
+    ref = bundle_ref('2024-05-01/abc_bundle.ndjson.gz', 120, 45)
+    assert parse_bundle_ref(ref) == ('2024-05-01/abc_bundle.ndjson.gz', 120, 45)
+    assert source_file_id(ref) == '2024-05-01/abc_bundle.ndjson.gz'
+    assert parse_bundle_ref('plain_file_id') is None
+    assert parse_bundle_ref('id#bad+span') is None
+    assert parse_bundle_ref(None) is None
+    assert source_file_id('plain_file_id') == 'plain_file_id'
+
+
+def test_each_record_is_readable_by_its_range():
+    records = _records(5)
+    data, spans = pack_bundle(records)
+    for (entry, text), (offset, length) in zip(records, spans):
+        record = read_bundle_record(data[offset:offset + length])
+        assert record['text'] == text
+        assert record['local_id'] == entry['local_id']
+        assert 'file_id' not in record
+    # Вся пачка — корректный gzip из нескольких членов
+    lines = gzip.decompress(data).decode('utf-8').splitlines()
+    assert len(lines) == 6
+
+
+def test_offset_table_is_the_last_member():
+    records = _records(3)
+    data, spans = pack_bundle(records)
+    table_start = spans[-1][0] + spans[-1][1]
+    table = json.loads(gzip.decompress(data[table_start:]))
+    assert table == {'bundle_index': [[f'L{i}', o, n] for i, (o, n) in enumerate(spans)]}
+
+
+def test_iter_bundle_skips_offset_table():
+    records = _records(4)
+    data, spans = pack_bundle(records)
+    items = iter_bundle(data)
+    assert [(o, n) for o, n, _ in items] == spans
+    assert [r['text'] for _, _, r in items] == [text for _, text in records]
+
+
+def test_backend_reads_record_by_range():
+    backend = MemoryBackend()
+    records = _records(3)
+    data, spans = pack_bundle(records)
+    bundle_id = backend.upload_bundle('bundle.ndjson.gz', data)
+    for (_, text), (offset, length) in zip(records, spans):
+        assert backend.load_log_text(bundle_ref(bundle_id, offset, length)) == text
+
+
+def test_writer_flush_ships_refs():
+    backend = MemoryBackend()
+    shipped = []
+    writer = BundleWriter(lambda: backend, shipped.extend, max_records=2)
+    for entry, text in _records(3):
+        assert writer.add(entry, text)
+    assert writer.contains('L0')
+    assert writer.flush() == 3
+    assert not writer.contains('L0')
+    assert writer.stats() == {'buffered': 0, 'bytes': 0, 'age': 0.0}
+    # max_records=2: две пачки
+    assert len({source_file_id(ref) for _, ref in shipped}) == 2
+    for entry, ref in shipped:
+        assert backend.load_log_text(ref) == f"текст {entry['local_id'][1:]}"
+
+
+def test_writer_keeps_records_after_failed_upload():
+    class Broken(MemoryBackend):
+        def upload_bundle(self, name, data):
+            raise OSError('нет сети')
+
+    backend = Broken()
+    shipped = []
+    writer = BundleWriter(lambda: backend, shipped.extend)
+    entry, text = _records(1)[0]
+    writer.add(entry, text)
+    assert writer.flush() == 0
+    assert writer.contains('L0') and shipped == []
+    # Повторное добавление того же лога не дублирует его
+    assert writer.add(entry, text)
+    assert writer.stats()['buffered'] == 1
+
+
+def test_writer_buffer_limits():
+    writer = BundleWriter(lambda: MemoryBackend(), lambda refs: None, max_buffered=2, max_bytes=100)
+    records = _records(3)
+    assert writer.add(*records[0]) and writer.add(*records[1])
+    assert not writer.add(*records[2])
+    writer = BundleWriter(lambda: MemoryBackend(), lambda refs: None, max_bytes=10)
+    # Одиночный лог больше предела принимается, следующий — уже нет
+    assert writer.add(*_records(1, 'x' * 50)[0])
+    assert not writer.add({'local_id': 'other'}, 'y')
@@ -0,0 +1,191 @@
+from app.aggregates import parse_received_at
+from app.log_store import LogStore, compact_columns, decode_cursor, encode_cursor
+
+
+def _entry(i, day='2024-05-01', **extra):
+    entry = {
+        'filename': f'file_{i:03d}.txt',
+        'duration': float(i),
+        'size': 1000 - i,
+        'received_at': f'{day} 10:{i // 60:02d}:{i % 60:02d}',
+        'queue_time': 0.5,
+        'process_time': 0.25,
+        'local_id': f'L{i}',
+        'file_id': f'F{i}',
+    }
+    entry.update(extra)
+    return entry
+
+
+def _store(n=10, day='2024-05-01'):
+    store = LogStore()
+    store.reset([_entry(i, day) for i in range(n)])
+    return store
+
+
+def _names(rows):
+    return [row['filename'] for row in rows]
+
+
+def test_reset_and_add_keep_received_at_order():
+    store = LogStore()
+    store.reset([_entry(5), _entry(1), _entry(3)])
+    store.add(_entry(2))
+    assert len(store) == 4
+    assert _names(store.entries()) == ['file_001.txt', 'file_002.txt', 'file_003.txt', 'file_005.txt']
+    assert store.get_by_local_id('L2')['file_id'] == 'F2'
+    assert store.get_by_name('file_003.txt', '2024-05-01 10:00:03')['local_id'] == 'L3'
+    assert store.aggregates.totals()['total_files'] == 4
+
+
+def test_extra_fields_and_raw_received_at_survive_round_trip():
+    store = LogStore()
+    store.reset([_entry(1, note='x'), _entry(2, received_at='вчера')])
+    rows = {row['local_id']: row for row in store.entries()}
+    assert rows['L1']['note'] == 'x'
+    assert rows['L2']['received_at'] == 'вчера'
+
+
+def test_export_and_load_columns_round_trip():
+    store = _store(20)
+    store.add(_entry(30, note='extra'))
+    store.remove_by_file_id('F4')
+    columns = compact_columns(store.export_columns())
+    loaded = LogStore()
+    loaded.load_columns(columns)
+    assert loaded.entries() == store.entries()
+    assert len(loaded) == 20
+    assert loaded.get_by_file_id('F30')['note'] == 'extra'
+    assert loaded.get_by_file_id('F4') is None
+    assert loaded.aggregates.totals() == store.aggregates.totals()
+    # После загрузки store продолжает принимать записи
+    loaded.add(_entry(31))
+    assert loaded.get_by_local_id('L31') is not None
+
+
+def test_remove_leaves_tombstone_until_day_is_read():
+    store = _store(5)
+    removed = store.remove_by_local_id('L2')
+    assert removed['filename'] == 'file_002.txt'
+    assert store.remove_by_local_id('L2') is None
+    assert len(store) == 4
+    assert not store.has(local_id='L2', file_id='F2')
+    assert store._day_dead
+    assert 'file_002.txt' not in _names(store.entries())
+    assert not any(store._day_dead.values())
+
+
+def test_removing_whole_day_drops_it_from_index():
+    store = LogStore()
+    store.reset([_entry(1, '2024-05-01'), _entry(2, '2024-05-02')])
+    store.remove_by_local_id('L1')
+    rows, _, total = store.query(date='2024-05')
+    assert total == 1 and _names(rows) == ['file_002.txt']
+    assert len(store._days) == 1
+
+
+def test_set_file_id_and_stale_file_ids():
+    store = LogStore()
+    store.reset([_entry(1, file_id=None)])
+    seq = store.add(_entry(2))
+    assert store.set_file_id('L1', 'NEW')['file_id'] == 'NEW'
+    assert store.get_by_file_id('NEW')['local_id'] == 'L1'
+    assert store.set_file_id('missing', 'X') is None
+    assert store.stale_file_ids({'NEW'}, seq) == []
+    assert store.stale_file_ids({'NEW'}, seq + 1) == ['F2']
+
+
+def test_cursor_pagination_ascending_covers_all_rows_once():
+    store = _store(25)
+    seen, cursor = [], None
+    while True:
+        rows, cursor, total = store.query(cursor=cursor, limit=10)
+        assert total == 25
+        seen.extend(_names(rows))
+        if cursor is None:
+            break
+    assert seen == _names(store.entries())
+
+
+def test_cursor_pagination_descending():
+    store = LogStore()
+    store.reset([_entry(i, '2024-05-01') for i in range(5)] + [_entry(i, '2024-05-02') for i in range(5, 10)])
+    seen, cursor = [], None
+    while True:
+        rows, cursor, _ = store.query(cursor=cursor, limit=3, descending=True)
+        seen.extend(_names(rows))
+        if cursor is None:
+            break
+    assert seen == _names(store.entries())[::-1]
+
+
+def test_cursor_stays_valid_after_removal():
+    store = _store(10)
+    rows, cursor, _ = store.query(limit=4)
+    store.remove_by_local_id('L5')
+    rows, cursor, total = store.query(cursor=cursor, limit=4)
+    assert total == 9
+    assert _names(rows) == ['file_004.txt', 'file_006.txt', 'file_007.txt', 'file_008.txt']
+
+
+def test_encode_decode_cursor():
+    assert decode_cursor(encode_cursor((1714557600, 7))) == (1714557600, 7)
+
+
+def test_offset_and_filters():
+    store = LogStore()
+    store.reset([_entry(i, '2024-05-01') for i in range(5)] + [_entry(i, '2024-05-02') for i in range(5, 10)])
+    rows, cursor, total = store.query(offset=3, limit=4)
+    assert _names(rows) == [f'file_{i:03d}.txt' for i in range(3, 7)]
+    assert total == 10 and cursor is not None
+    rows, _, total = store.query(date='2024-05-02')
+    assert total == 5 and _names(rows)[0] == 'file_005.txt'
+    rows, _, total = store.query(filename='file_00', date='2024-05-01')
+    assert total == 5
+    rows, cursor, total = store.query(filename='_007')
+    assert _names(rows) == ['file_007.txt'] and total == 1 and cursor is None
+    # Подстрока короче триграммы проверяется по всем именам
+    rows, _, total = store.query(filename='9')
+    assert _names(rows) == ['file_009.txt']
+
+
+def test_filename_filter_sees_added_and_removed_rows():
+    store = _store(3)
+    assert store.query(filename='file_')[2] == 3
+    store.add(_entry(50))
+    store.remove_by_local_id('L0')
+    rows, _, total = store.query(filename='file_')
+    assert total == 3 and 'file_000.txt' not in _names(rows)
+
+
+def test_scan_pages_by_key():
+    store = _store(10)
+    rows, after = store.scan(limit=4)
+    assert len(rows) == 4 and after is not None
+    rest, after = store.scan(after=after, limit=100)
+    assert after is None
+    assert _names(rows + rest) == _names(store.entries())
+    rows, _ = store.scan(filename='_00', limit=100)
+    assert len(rows) == 10
+
+
+def test_scan_respects_time_bounds():
+    store = _store(10)
+    lo = store.query(offset=2, limit=1)[0][0]['received_at']
+    hi = store.query(offset=6, limit=1)[0][0]['received_at']
+    rows, after = store.scan(lo=parse_received_at(lo)[0], hi=parse_received_at(hi)[0])
+    assert _names(rows) == [f'file_{i:03d}.txt' for i in range(2, 6)] and after is None
+
+
+def test_sorted_page():
+    store = LogStore()
+    store.reset([_entry(1, filename='b.txt', size=30), _entry(2, filename='A.txt', size=10),
+                 _entry(3, filename='c.txt', size=20)])
+    rows, total = store.sorted_page('filename')
+    assert _names(rows) == ['A.txt', 'b.txt', 'c.txt'] and total == 3
+    rows, _ = store.sorted_page('size', descending=True, limit=2)
+    assert [row['size'] for row in rows] == [30, 20]
+    rows, _ = store.sorted_page('size', offset=1, limit=5)
+    assert [row['size'] for row in rows] == [20, 30]
+    rows, total = store.sorted_page('duration', filename='c')
+    assert _names(rows) == ['c.txt'] and total == 1
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+
+def _item(i, **overrides):
+    item = {'filename': f'batch_{i}.txt', 'duration': 1.5, 'size': 100, 'received_at': f'2024-05-01 12:00:{i:02d}',
+            'queue_time': 0.1, 'process_time': 0.2, 'text': f'текст пачки {i}'}
+    item.update(overrides)
+    return item
+
+
+def _ndjson(lines):
+    return '\n'.join(line if isinstance(line, str) else json.dumps(line, ensure_ascii=False) for line in lines)
+
+
+@pytest.fixture
+def post(api, asgi_request):
+    def send(body, content_type='application/json'):
+        content = body if isinstance(body, (str, bytes)) else json.dumps(body, ensure_ascii=False)
+        return asgi_request(api.app, 'POST', '/logs/batch', content=content, headers={'Content-Type': content_type})
+    return send
+
+
+def test_json_array_with_invalid_items(api, post):
+    resp = post([_item(0), {'filename': 'no_fields.txt'}, 'строка', _item(3, size='много')])
+    assert resp.status_code == 202
+    body = resp.json()
+    assert (body['accepted'], body['invalid'], body['rejected']) == (1, 3, 0)
+    assert [r['index'] for r in body['results']] == [0, 1, 2, 3]
+    assert [r['status'] for r in body['results']] == ['accepted', 'invalid', 'invalid', 'invalid']
+    assert 'duration' in body['results'][1]['error']
+    assert 'size' in body['results'][3]['error']
+    entry = api.store.get_by_local_id(body['results'][0]['local_id'])
+    assert entry['filename'] == 'batch_0.txt'
+
+
+def test_ndjson_with_broken_lines(api, post):
+    body = _ndjson([_item(10), '{не json', '', _item(12), ['список']]) + '\n'
+    resp = post(body, 'application/x-ndjson')
+    assert resp.status_code == 202
+    results = resp.json()['results']
+    # Пустые строки пропускаются и не получают номера
+    assert [(r['index'], r['status']) for r in results] == [
+        (0, 'accepted'), (1, 'invalid'), (2, 'accepted'), (3, 'invalid')]
+    assert 'некорректный JSON' in results[1]['error']
+    for r in results:
+        if r['status'] == 'accepted':
+            assert api.store.get_by_local_id(r['local_id']) is not None
+
+
+def test_ndjson_streamed_in_chunks(api, post, monkeypatch):
+    monkeypatch.setattr(api, 'LOGS_BATCH_CHUNK', 2)
+    resp = post(_ndjson([_item(20 + i) for i in range(5)]), 'application/x-ndjson')
+    assert resp.status_code == 202 and resp.json()['accepted'] == 5
+
+
+def test_all_invalid_is_400(post):
+    resp = post([{'filename': 'x'}])
+    assert resp.status_code == 400 and resp.json()['invalid'] == 1
+
+
+@pytest.mark.parametrize('body, status', [('{не json', 400), ({'filename': 'x'}, 400)])
+def test_malformed_body(post, body, status):
+    assert post(body).status_code == status
+
+
+def test_too_many_items_for_json(api, post, monkeypatch):
+    monkeypatch.setattr(api, 'LOGS_BATCH_MAX_ITEMS', 2)
+    assert post([_item(i) for i in range(3)]).status_code == 413
+
+
+def test_full_queue_rejects_items(api, post, monkeypatch):
+    async def accept(items):
+        return [i == 0 for i in range(len(items))]
+
+    monkeypatch.setattr(api, 'accept_log_entries', accept)
+    resp = post([_item(30), _item(31)])
+    assert resp.status_code == 202
+    assert [r['status'] for r in resp.json()['results']] == ['accepted', 'rejected']
+
+    async def reject_all(items):
+        return [False] * len(items)
+
+    monkeypatch.setattr(api, 'accept_log_entries', reject_all)
+    resp = post([_item(32)])
+    assert resp.status_code == 503 and resp.headers['retry-after']
+
+
+def test_wal_error_reports_accepted_part(api, post, monkeypatch):
+    monkeypatch.setattr(api, 'LOGS_BATCH_CHUNK', 2)
+    calls = []
+
+    async def accept(items):
+        calls.append(len(items))
+        if len(calls) > 1:
+            raise OSError('диск заполнен')
+        return [True] * len(items)
+
+    monkeypatch.setattr(api, 'accept_log_entries', accept)
+    resp = post([_item(40 + i) for i in range(4)])
+    assert resp.status_code == 500
+    body = resp.json()
+    assert 'диск заполнен' in body['error']
+    assert [r['index'] for r in body['results']] == [0, 1]
@@ -0,0 +1,100 @@
+import os
+import threading
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app import replica
+from app.replica import ReplicaFollower, WriterElection, WriterProxyMiddleware, iter_sse
+
+
+def _close(election):
+    # Завершение процесса-писателя: ОС снимает flock вместе с дескриптором
+    os.close(election._fd)
+    election._fd = None
+
+
+def test_single_process_is_always_writer(tmp_path):
+    election = WriterElection(str(tmp_path / 'writer.lock'), enabled=False)
+    assert election.try_acquire()
+    assert election.is_writer
+
+
+def test_only_one_writer_per_lock(tmp_path):
+    path = str(tmp_path / 'writer.lock')
+    first, second = WriterElection(path, enabled=True), WriterElection(path, enabled=True)
+    assert first.try_acquire()
+    assert not second.try_acquire() and not second.is_writer
+    with open(path) as f:
+        assert f.read().strip() == str(os.getpid())
+    _close(first)
+    assert second.try_acquire() and second.is_writer
+
+
+def test_is_writer_set_after_start(tmp_path):
+    election = WriterElection(str(tmp_path / 'writer.lock'), enabled=True)
+    seen = []
+    assert election.try_acquire(lambda: seen.append(election.is_writer))
+    assert seen == [False] and election.is_writer
+    # Повторный вызов не запускает писателя ещё раз
+    assert election.try_acquire(lambda: seen.append('again'))
+    assert seen == [False]
+
+
+def test_reader_is_promoted_when_writer_exits(tmp_path, monkeypatch):
+    monkeypatch.setattr(replica, 'REPLICA_RETRY_SEC', 0.05)
+    path = str(tmp_path / 'writer.lock')
+    writer, reader = WriterElection(path, enabled=True), WriterElection(path, enabled=True)
+    assert writer.try_acquire()
+    promoted = threading.Event()
+    during_start = []
+
+    def on_promote():
+        during_start.append(reader.is_writer)
+        promoted.set()
+
+    # Сокета писателя нет: каждая попытка синхронизации — TransportError, затем попытка стать писателем
+    follower = ReplicaFollower(reader, load=None, apply=None, on_promote=on_promote,
+                               socket_path=str(tmp_path / 'missing.sock'))
+    follower.start()
+    assert not promoted.wait(0.3)
+    assert not reader.is_writer and not follower.synced
+    _close(writer)
+    assert promoted.wait(5)
+    follower._thread.join(5)
+    assert not follower._thread.is_alive()
+    assert during_start == [False] and reader.is_writer
+
+
+def test_iter_sse():
+    lines = [': keepalive', 'retry: 3000', '', 'id: 5', 'event: log_added', 'data: {"a": 1}', '',
+             'id: 6', 'data: {"b":', 'data: 2}', '', 'data: {"c": 3}']
+    assert list(iter_sse(lines)) == [('5', 'log_added', {'a': 1}), ('6', 'message', {'b': 2})]
+
+
+@pytest.fixture
+def proxied_app(tmp_path):
+    async def handler(request):
+        return PlainTextResponse('локально')
+
+    inner = Starlette(routes=[Route('/log', handler, methods=['POST']), Route('/logs', handler)])
+    election = WriterElection(str(tmp_path / 'writer.lock'), enabled=True)
+    app = WriterProxyMiddleware(inner, election, {('POST', '/log')}, socket_path=str(tmp_path / 'missing.sock'))
+    return app, election
+
+
+def test_proxy_answers_503_without_writer(proxied_app, asgi_request):
+    app, _ = proxied_app
+    resp = asgi_request(app, 'POST', '/log', content=b'{}')
+    assert resp.status_code == 503
+    assert resp.headers['retry-after'] == str(replica.REPLICA_RETRY_SEC)
+    # Маршруты чтения читатель обслуживает сам
+    assert asgi_request(app, 'GET', '/logs').text == 'локально'
+
+
+def test_proxy_passes_through_in_writer(proxied_app, asgi_request):
+    app, election = proxied_app
+    election.try_acquire()
+    assert asgi_request(app, 'POST', '/log', content=b'{}').text == 'локально'
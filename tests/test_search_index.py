@@ -0,0 +1,105 @@
+import pytest
+
+from app.search_index import SearchIndex, stem, tokenize
+
+_TEXTS = {
+    'a': 'Клиент позвонил по поводу доставки заказа',
+    'b': 'Доставка задерживается, клиенты звонят каждый день. Доставки нет!',
+    'c': 'Обсуждали оплату и возврат',
+    'd': 'Ёлка и елка',
+}
+
+
+def _index(texts=_TEXTS):
+    index = SearchIndex()
+    for key, text in texts.items():
+        index.add(key, text)
+    return index
+
+
+def _keys(results):
+    return [key for key, _ in results]
+
+
+def test_tokenize_normalizes_and_stems():
+    assert tokenize('Доставка ДОСТАВКИ доставкой') == ['доставк'] * 3
+    assert tokenize('Ёлка, елка; order-42') == ['елк', 'елк', 'order', '42']
+    assert tokenize(None) == []
+    # Короткие и нерусские слова не меняются
+    assert stem('дом') == 'дом'
+    assert stem('delivery') == 'delivery'
+    assert stem('звонятся') == stem('звонят')
+
+
+def test_bm25_ranks_by_term_frequency():
+    results, total = _index().search('доставка')
+    assert total == 2
+    assert _keys(results) == ['b', 'a']
+    assert results[0][1] > results[1][1] > 0
+    assert _index().search('самолёт') == ([], 0)
+    assert _index().search('') == ([], 0)
+
+
+def test_add_is_idempotent_and_remove_hides_document():
+    index = _index()
+    assert not index.add('a', 'другой текст')
+    assert not index.add('', 'текст') and not index.add('x', None)
+    assert index.remove('b')
+    assert not index.remove('b')
+    assert not index.has('b') and len(index) == 3
+    assert _keys(index.search('доставка')[0]) == ['a']
+
+
+def test_pagination_and_keep():
+    index = _index({f'k{i}': 'заказ ' * (i + 1) + 'слово ' * 10 for i in range(30)})
+    first, total = index.search('заказ', limit=10)
+    second, _ = index.search('заказ', offset=10, limit=10)
+    assert total == 30
+    assert len(first) == len(second) == 10
+    assert not set(_keys(first)) & set(_keys(second))
+    everything = _keys(index.search('заказ', limit=30)[0])
+    assert everything[:20] == _keys(first) + _keys(second)
+    # Отброшенные keep документы не занимают места на странице
+    odd = lambda key: int(key[1:]) % 2 == 1
+    page, _ = index.search('заказ', limit=10, keep=odd)
+    assert _keys(page) == [key for key in everything if odd(key)][:10]
+
+
+def test_keep_past_rank_window_still_fills_page():
+    # keep отбрасывает больше документов, чем запас SEARCH_RANK_SLACK
+    index = _index({f'k{i:03d}': 'заказ ' * (300 - i) + 'слово ' * 10 for i in range(300)})
+    page, _ = index.search('заказ', limit=5, keep=lambda key: int(key[1:]) >= 250)
+    assert _keys(page) == [f'k{i}' for i in range(250, 255)]
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / 'search.index')
+    index = _index()
+    assert index.save(path)
+    assert not index.save(path)
+    loaded = SearchIndex()
+    assert loaded.load(path) == 4
+    for query in ('доставка', 'клиент звонит', 'елка', 'возврат'):
+        assert loaded.search(query) == index.search(query)
+    loaded.add('e', 'новая доставка')
+    assert 'e' in _keys(loaded.search('доставка')[0])
+
+
+def test_save_compacts_removed_documents(tmp_path):
+    path = str(tmp_path / 'search.index')
+    index = _index()
+    index.remove('a')
+    index.remove('c')
+    assert index.save(path)
+    assert index.stats()['docs'] == 2 and len(index._keys) == 2
+    loaded = SearchIndex()
+    assert loaded.load(path) == 2
+    assert _keys(loaded.search('доставка')[0]) == ['b']
+    assert not loaded.has('a')
+
+
+def test_load_rejects_foreign_file(tmp_path):
+    path = tmp_path / 'search.index'
+    path.write_bytes(b'not an index')
+    with pytest.raises(ValueError):
+        SearchIndex().load(str(path))
@@ -0,0 +1,113 @@
+import gzip
+import os
+import time
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+from app import static_assets
+from app.static_assets import StaticAssets
+
+_CSS = 'body { color: black; }\n' * 50
+_HTML = '<html><head><link rel="stylesheet" href="/static/style.css"></head><body>{{BODY}}</body></html>'
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / 'style.css').write_text(_CSS)
+    (tmp_path / 'tiny.js').write_text('1;')
+    (tmp_path / 'index.html').write_text(_HTML)
+    return tmp_path
+
+
+@pytest.fixture
+def client(asgi_request):
+    """
+    client(assets) -> get(url, headers=None) к приложению с маршрутами страницы '/' и /static.
+    """
+    def make(assets):
+        async def page(request):
+            return assets.page_response(request, '/')
+
+        async def file(request):
+            return assets.file_response(request, request.path_params['path'])
+
+        app = Starlette(routes=[Route('/', page), Route('/static/{path:path}', file)])
+        return lambda url, headers=None: asgi_request(app, 'GET', url, headers=headers)
+    return make
+
+
+def test_page_links_carry_content_hash(static_dir, client):
+    assets = StaticAssets(str(static_dir))
+    assets.add_page('/', 'index.html', lambda html: html.replace('{{BODY}}', 'привет'))
+    resp = client(assets)('/', headers={'Accept-Encoding': 'identity'})
+    css_hash = assets._files['style.css'].hash
+    assert f'/static/style.css?v={css_hash}' in resp.text
+    assert 'привет' in resp.text
+    assert resp.headers['cache-control'] == 'no-cache'
+
+
+def test_versioned_link_is_immutable(static_dir, client):
+    assets = StaticAssets(str(static_dir))
+    get = client(assets)
+    css_hash = assets._files['style.css'].hash
+    resp = get(f'/static/style.css?v={css_hash}')
+    assert 'immutable' in resp.headers['cache-control']
+    assert get('/static/style.css?v=old').headers['cache-control'] == 'no-cache'
+    assert get('/static/missing.css').status_code == 404
+
+
+def test_encoding_negotiation(static_dir, client):
+    assets = StaticAssets(str(static_dir))
+    get = client(assets)
+    resp = get('/static/style.css', headers={'Accept-Encoding': 'gzip'})
+    assert resp.headers['content-encoding'] == 'gzip'
+    assert resp.headers['vary'] == 'Accept-Encoding'
+    assert resp.text == _CSS
+    assert gzip.decompress(assets._files['style.css'].variants['gzip']).decode() == _CSS
+    resp = get('/static/style.css', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+    assert 'content-encoding' not in resp.headers
+    # Маленькие файлы не сжимаются
+    resp = get('/static/tiny.js', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in resp.headers and resp.text == '1;'
+
+
+@pytest.mark.skipif(static_assets.brotli is None, reason='brotli не установлен')
+def test_brotli_preferred_when_available(static_dir, client):
+    resp = client(StaticAssets(str(static_dir)))('/static/style.css', headers={'Accept-Encoding': 'gzip, br'})
+    assert resp.headers['content-encoding'] == 'br'
+
+
+def test_etag_per_variant_and_304(static_dir, client):
+    assets = StaticAssets(str(static_dir))
+    get = client(assets)
+    plain = get('/static/style.css', headers={'Accept-Encoding': 'identity'})
+    packed = get('/static/style.css', headers={'Accept-Encoding': 'gzip'})
+    assert plain.headers['etag'] != packed.headers['etag']
+    # Любой вариант того же содержимого подтверждает кэш
+    for etag in (plain.headers['etag'], packed.headers['etag'], 'W/' + plain.headers['etag'], '*'):
+        resp = get('/static/style.css', headers={'If-None-Match': etag})
+        assert resp.status_code == 304 and resp.content == b''
+    assert get('/static/style.css', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_reload_picks_up_changed_files(static_dir, client):
+    assets = StaticAssets(str(static_dir), reload=True)
+    assets.add_page('/', 'index.html')
+    get = client(assets)
+    old_hash = assets._files['style.css'].hash
+    path = static_dir / 'style.css'
+    path.write_text('p { margin: 0; }\n' * 50)
+    later = time.time_ns() + 10 ** 9
+    os.utime(path, ns=(later, later))
+    assert get('/static/style.css').text.startswith('p {')
+    new_hash = assets._files['style.css'].hash
+    assert new_hash != old_hash
+    assert f'?v={new_hash}' in get('/').text
+
+
+def test_stats(static_dir):
+    stats = StaticAssets(str(static_dir)).stats()
+    assert stats['files'] == 3 and stats['bytes'] > len(_CSS)
+    assert stats['brotli'] == (static_assets.brotli is not None)
@@ -0,0 +1,98 @@
+import pytest
+
+from app.log_bundle import bundle_ref, pack_bundle, source_file_id
+from app.storage_backend import LocalBackend, MemoryBackend
+
+
+@pytest.fixture(params=['local', 'memory'])
+def backend(request, tmp_path):
+    if request.param == 'local':
+        return LocalBackend(str(tmp_path / 'storage'))
+    return MemoryBackend()
+
+
+def _log(i, text='первая строка\nвторая строка'):
+    return {'filename': f'file_{i}.txt', 'duration': 1.5, 'size': 100 + i,
+            'received_at': f'2024-05-01 10:00:{i:02d}', 'queue_time': 0.1, 'process_time': 0.2, 'text': text}
+
+
+def test_log_file_round_trip(backend):
+    file_id = backend.log_and_return_id(_log(1))
+    assert backend.load_log_text(file_id) == 'первая строка\nвторая строка'
+    parsed = backend.parse_log_text(backend.download_bytes(file_id).decode('utf-8'))
+    assert parsed['filename'] == 'file_1.txt' and parsed['size'] == 101 and parsed['duration'] == 1.5
+    body = backend.download_bytes(file_id)
+    assert backend.download_range(file_id, 10, 5) == body[10:15]
+
+
+def test_same_name_gets_distinct_ids(backend):
+    first = backend.log_and_return_id(_log(1, 'a'))
+    second = backend.log_and_return_id(_log(1, 'b'))
+    assert first != second
+    assert backend.load_log_text(first) == 'a' and backend.load_log_text(second) == 'b'
+
+
+def test_list_and_delete(backend):
+    ids = [backend.log_and_return_id(_log(i)) for i in range(3)]
+    logs = backend.list_all_logs()
+    assert sorted(f['id'] for f in logs) == sorted(ids)
+    assert all(f['date'] == ids[0].split('/')[0] for f in logs)
+    backend.delete_log_file(ids[0])
+    assert backend.delete_files([ids[1], 'missing/file.txt']) == []
+    assert [f['id'] for f in backend.list_all_logs()] == [ids[2]]
+    with pytest.raises(FileNotFoundError):
+        backend.download_bytes(ids[0])
+
+
+def test_index_base_and_deltas(backend):
+    assert backend.load_index() == []
+    backend.save_index([{'file_id': 'F0', 'filename': 'a'}])
+    backend.add_log_to_index({'file_id': 'F1', 'filename': 'b'})
+    backend.remove_log_from_index('F0')
+    assert [e['file_id'] for e in backend.load_index()] == ['F1']
+    assert backend.compact_index() == 2
+    assert backend.list_index_deltas() == []
+    assert [e['file_id'] for e in backend.load_index()] == ['F1']
+    assert backend.compact_index() == 0
+
+
+def test_bundle_records_and_tombstones(backend):
+    records = [({'local_id': f'L{i}', 'filename': f'f{i}'}, f'текст {i}') for i in range(2)]
+    data, spans = pack_bundle(records)
+    bundle_id = backend.upload_bundle('bundle.ndjson.gz', data)
+    refs = [bundle_ref(bundle_id, o, n) for o, n in spans]
+    assert backend.load_log_text(refs[1]) == 'текст 1'
+    backend.delete_log_file(refs[0])
+    backend.delete_log_file(refs[0])
+    # Пачка остаётся на месте, удалённая запись только помечается
+    assert backend.load_bundle_tombstones() == {refs[0]}
+    assert backend.load_log_text(refs[1]) == 'текст 1'
+    assert [f['id'] for f in backend.list_all_logs()] == [source_file_id(refs[0])]
+
+
+def test_rebuild_index_from_log_files(backend, tmp_path):
+    ids = [backend.log_and_return_id(_log(i)) for i in range(3)]
+    backend.add_log_to_index({'filename': 'unshipped', 'local_id': 'L9', 'file_id': None})
+    index = backend.rebuild_index(state_path=str(tmp_path / 'rebuild.jsonl'), progress_interval=1000)
+    shipped = sorted(e['file_id'] for e in index if e.get('file_id'))
+    assert shipped == sorted(ids)
+    assert any(e.get('local_id') == 'L9' for e in index)
+    assert backend.list_index_deltas() == []
+    assert len(backend.load_index()) == 4
+
+
+def test_local_backend_persists_and_rejects_escaping_ids(tmp_path):
+    path = str(tmp_path / 'storage')
+    backend = LocalBackend(path)
+    file_id = backend.log_and_return_id(_log(1))
+    backend.add_log_to_index({'file_id': file_id})
+    (tmp_path / 'storage' / 'leftover.json.1234.tmp').write_bytes(b'')
+    reopened = LocalBackend(path)
+    assert reopened.load_index() == [{'file_id': file_id}]
+    assert reopened.load_log_text(file_id) == 'первая строка\nвторая строка'
+    assert len(reopened.list_index_deltas()) == 1
+    for bad in ('../outside.txt', '/etc/passwd', ''):
+        with pytest.raises(FileNotFoundError):
+            reopened.download_bytes(bad)
+    # Некорректный id при удалении только печатается
+    reopened.delete_log_file('../outside.txt')